@@ -0,0 +1,7 @@
+"""
+Benchmarks for index builds, /recommend, /feedback and /refresh on synthetic
+catalogs of 1k to 1M restaurants. Run from the repo root:
+
+    python -m benchmarks.run --sizes 1000,10000,100000 --out bench_results.json
+    python -m benchmarks.run --sizes 1000,10000 --baseline bench_baseline.json
+"""
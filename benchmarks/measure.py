@@ -0,0 +1,113 @@
+# benchmarks/measure.py
+"""
+Timing, memory and baseline-comparison helpers shared by the benchmarks.
+"""
+import math
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+# (metric path, description) compared against a baseline; lower is better for all of them
+COMPARED_METRICS: List[Tuple[str, str]] = [
+    ("build_s", "index build"),
+    ("build_peak_rss_mb", "peak RSS after build"),
+    ("refresh_s", "/refresh rebuild"),
+    ("recommend_inprocess_ms.p50", "recommend() p50"),
+    ("recommend_inprocess_ms.p99", "recommend() p99"),
+    ("recommend_http_ms.p50", "POST /recommend p50"),
+    ("recommend_http_ms.p99", "POST /recommend p99"),
+    ("recommend_two_stage_ms.p50", "two-stage recommend() p50"),
+    ("recommend_two_stage_ms.p99", "two-stage recommend() p99"),
+    ("suggest_inprocess_ms.p50", "suggest() p50"),
+    ("suggest_inprocess_ms.p99", "suggest() p99"),
+    ("feedback_http_ms.p50", "POST /feedback p50"),
+    ("feedback_http_ms.p99", "POST /feedback p99"),
+]
+
+
+def peak_rss_mb() -> Optional[float]:
+    """Peak resident set size of this process so far, or None where unsupported."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return round(peak / (1024 * 1024 if peak > 1 << 32 else 1024), 1)
+
+
+def percentile(sorted_samples: List[float], q: float) -> float:
+    """Nearest-rank percentile of already sorted samples (q in 0..100)."""
+    rank = max(1, math.ceil(q / 100.0 * len(sorted_samples)))
+    return sorted_samples[rank - 1]
+
+
+def summarize(samples_ms: List[float]) -> Dict[str, Any]:
+    if not samples_ms:
+        return {"n": 0}
+    s = sorted(samples_ms)
+    return {
+        "n": len(s),
+        "mean": round(sum(s) / len(s), 3),
+        "p50": round(percentile(s, 50), 3),
+        "p90": round(percentile(s, 90), 3),
+        "p99": round(percentile(s, 99), 3),
+        "max": round(s[-1], 3),
+    }
+
+
+def time_each(fn: Callable[[Any], Any], items: Iterable[Any]) -> Dict[str, Any]:
+    """Latency summary (milliseconds) of fn(item) for every item."""
+    samples = []
+    for item in items:
+        start = time.perf_counter()
+        fn(item)
+        samples.append((time.perf_counter() - start) * 1000.0)
+    return summarize(samples)
+
+
+def recall_at_k(expected: List[List[Any]], got: List[List[Any]]) -> Optional[float]:
+    """
+    Mean share of each expected result list that also appears in the matching
+    got list (queries with no expected results are skipped); None if all are empty.
+    """
+    shares = [len(set(e) & set(g)) / len(e) for e, g in zip(expected, got) if e]
+    return round(sum(shares) / len(shares), 4) if shares else None
+
+
+def _lookup(result: Dict[str, Any], path: str) -> Optional[float]:
+    value: Any = result
+    for part in path.split("."):
+        if not isinstance(value, dict) or part not in value:
+            return None
+        value = value[part]
+    return value if isinstance(value, (int, float)) else None
+
+
+def compare(
+    current: Dict[str, Any], baseline: Dict[str, Any], tolerance: float = 0.2
+) -> Tuple[List[str], List[str]]:
+    """
+    Compare two result files size by size. Returns (report lines, regressions):
+    a metric regresses when it is more than tolerance (0.2 = 20%) above the baseline.
+    """
+    lines: List[str] = []
+    regressions: List[str] = []
+    for size, result in current.get("sizes", {}).items():
+        base = baseline.get("sizes", {}).get(size)
+        if base is None:
+            lines.append(f"{size}: not in baseline")
+            continue
+        for path, label in COMPARED_METRICS:
+            now, before = _lookup(result, path), _lookup(base, path)
+            if now is None or before is None:
+                continue
+            ratio = now / before if before else math.inf if now else 1.0
+            line = f"{size:>8} {label:<24} {before:>10.3f} -> {now:>10.3f} ({ratio:.2f}x)"
+            if ratio > 1.0 + tolerance:
+                line += "  REGRESSION"
+                regressions.append(f"{size} {label}")
+            lines.append(line)
+    return lines, regressions
@@ -0,0 +1,230 @@
+# benchmarks/run.py
+"""
+Benchmark the server on synthetic catalogs of several sizes.
+
+For each size, in a fresh process (so peak RSS belongs to that size alone):
+  - write the catalog as NDJSON and build the index the way startup does
+  - POST /feedback every synthetic user's click history
+  - rank the synthetic queries in-process (recommend()) and through TestClient,
+    with the result cache cleared before each one so every call is ranked
+  - rank them again in-process with two-stage ranking (--candidate-budget) and
+    report its recall@top_k against the exhaustive results
+  - type every query out one keystroke at a time against /suggest (in-process)
+  - change the data file and time POST /refresh?wait=true
+
+Results are written as JSON; with --baseline they are compared against a
+stored run and the exit status is 1 if any metric regressed.
+
+Usage (from the repo root):
+    python -m benchmarks.run --sizes 1000,10000,100000 --out bench_results.json
+    python -m benchmarks.run --sizes 1000,10000 --baseline bench_baseline.json --tolerance 0.25
+    python -m benchmarks.run --sizes 100k --candidate-budget 2000 --engine bm25
+"""
+import argparse
+import json
+import multiprocessing
+import platform
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Any, Dict
+
+from benchmarks.measure import compare, peak_rss_mb, recall_at_k, time_each
+from benchmarks.synthetic import generate_queries, generate_users, make_restaurant, write_catalog
+
+MAX_SIZE = 1_000_000
+DEFAULT_CANDIDATE_BUDGET = 1000
+
+
+def bench_size(
+    n: int,
+    seed: int,
+    n_queries: int,
+    n_users: int,
+    workdir: str,
+    candidate_budget: int = DEFAULT_CANDIDATE_BUDGET,
+    engine: str = "tfidf",
+) -> Dict[str, Any]:
+    """Run every benchmark against an n-row catalog. Expects a fresh process: it reconfigures server.app."""
+    from fastapi.testclient import TestClient
+
+    import server.app as appmod
+
+    workdir = Path(workdir)
+    out: Dict[str, Any] = {"rows": n}
+
+    start = time.perf_counter()
+    data_path = write_catalog(workdir / f"restaurants-{n}.ndjson", n, seed)
+    out["generate_s"] = round(time.perf_counter() - start, 3)
+    out["data_mb"] = round(data_path.stat().st_size / 1e6, 1)
+
+    # Build from the synthetic file only: no prebuilt artifacts, no state from data/
+    appmod.DATA_PATH = data_path
+    appmod.INDEX_DIR = None
+    appmod.SHARED_INDEX_DIR = None
+    appmod.QUERY_LOG_PATH = None
+    appmod.PROFILES_PATH = None
+    appmod.EVENT_LOG_DIR = workdir / "events"
+    appmod.CANDIDATE_BUDGET = 0
+    appmod.RANKING_ENGINE = engine
+
+    out["baseline_rss_mb"] = peak_rss_mb()
+    start = time.perf_counter()
+    appmod.index_manager.ensure_ready()
+    out["build_s"] = round(time.perf_counter() - start, 3)
+    out["build_peak_rss_mb"] = peak_rss_mb()
+    appmod.build_tfidf_index()  # the rest of startup: watcher, profiles, event log
+
+    client = TestClient(appmod.app)
+    try:
+        users = generate_users(n_users, n, seed)
+        clicks = [(u["user_id"], rid) for u in users for rid in u["clicks"]]
+        out["feedback_http_ms"] = time_each(
+            lambda c: client.post("/feedback", json={"user_id": c[0], "restaurant_id": c[1]}).raise_for_status(),
+            clicks,
+        )
+
+        queries = generate_queries(n_queries, seed, [u["user_id"] for u in users])
+
+        def ranked_in_process(body):
+            appmod.result_cache.clear()
+            appmod.recommend(appmod.RecommendRequest(**body))
+
+        def ranked_over_http(body):
+            appmod.result_cache.clear()
+            client.post("/recommend", json=body).raise_for_status()
+
+        out["recommend_inprocess_ms"] = time_each(ranked_in_process, queries)
+        out["recommend_http_ms"] = time_each(ranked_over_http, queries)
+
+        def result_ids(body):
+            appmod.result_cache.clear()
+            response = appmod.recommend(appmod.RecommendRequest(**body))
+            return [r["id"] for r in json.loads(response.body)]
+
+        if candidate_budget > 0:
+            exhaustive = [result_ids(body) for body in queries]
+            appmod.CANDIDATE_BUDGET = candidate_budget
+            start = time.perf_counter()
+            appmod.index_manager.current.candidates
+            out["candidate_index_s"] = round(time.perf_counter() - start, 3)
+            out["candidate_budget"] = candidate_budget
+            out["recommend_two_stage_ms"] = time_each(ranked_in_process, queries)
+            out["two_stage_recall"] = recall_at_k(exhaustive, [result_ids(body) for body in queries])
+            appmod.CANDIDATE_BUDGET = 0
+
+        typed = [body["query"] for body in queries if body.get("query")]
+        keystrokes = [text[:i] for text in typed for i in range(1, len(text) + 1)]
+        out["suggest_inprocess_ms"] = time_each(
+            lambda prefix: appmod.suggest(q=prefix, limit=appmod.DEFAULT_SUGGESTIONS), keystrokes
+        )
+
+        # One more row changes the file hash, so /refresh really rebuilds
+        with open(data_path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(make_restaurant(n, seed), ensure_ascii=False) + "\n")
+        start = time.perf_counter()
+        status = client.post("/refresh", params={"wait": True}).json()["status"]
+        out["refresh_s"] = round(time.perf_counter() - start, 3)
+        out["refresh_status"] = status
+
+        out["peak_rss_mb"] = peak_rss_mb()
+    finally:
+        appmod.stop_index_watcher()
+    return out
+
+
+def parse_sizes(text: str) -> list:
+    sizes = []
+    for part in text.split(","):
+        part = part.strip().lower().replace("_", "")
+        if not part:
+            continue
+        scale = 1
+        if part[-1] in "km":
+            scale = 1000 if part[-1] == "k" else 1_000_000
+            part = part[:-1]
+        n = int(float(part) * scale)
+        if not (1 <= n <= MAX_SIZE):
+            raise argparse.ArgumentTypeError(f"size must be 1..{MAX_SIZE}, got {n}")
+        sizes.append(n)
+    return sizes
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark index builds and request latency on synthetic catalogs.")
+    parser.add_argument("--sizes", type=parse_sizes, default=parse_sizes("1k,10k,100k"), help="e.g. 1k,10k,100k,1m")
+    parser.add_argument("--queries", type=int, default=200, help="/recommend requests per size")
+    parser.add_argument("--users", type=int, default=50, help="synthetic users (their clicks go to /feedback)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", default="bench_results.json", help="where to write the results JSON")
+    parser.add_argument("--baseline", help="results JSON of an earlier run to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed slowdown before it counts (0.2 = 20%%)")
+    parser.add_argument(
+        "--candidate-budget", type=int, default=DEFAULT_CANDIDATE_BUDGET,
+        help="also time two-stage ranking with this budget and report its recall (0 skips it)",
+    )
+    parser.add_argument("--engine", choices=("tfidf", "bm25"), default="tfidf", help="text relevance engine")
+    parser.add_argument("--in-process", action="store_true", help="run all sizes in this process (RSS is then cumulative)")
+    args = parser.parse_args()
+
+    results: Dict[str, Any] = {
+        "meta": {
+            "started_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "seed": args.seed,
+            "queries": args.queries,
+            "users": args.users,
+            "candidate_budget": args.candidate_budget,
+            "engine": args.engine,
+        },
+        "sizes": {},
+    }
+
+    with tempfile.TemporaryDirectory(prefix="recommender-bench-") as tmp:
+        for n in args.sizes:
+            workdir = Path(tmp) / str(n)
+            bench_args = (n, args.seed, args.queries, args.users, str(workdir), args.candidate_budget, args.engine)
+            if args.in_process:
+                result = bench_size(*bench_args)
+            else:
+                context = multiprocessing.get_context("spawn")
+                with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+                    result = pool.submit(bench_size, *bench_args).result()
+            results["sizes"][str(n)] = result
+            print(
+                f"{n:>8} rows: build {result['build_s']:.2f}s, peak RSS {result['peak_rss_mb']} MB, "
+                f"recommend p50 {result['recommend_inprocess_ms']['p50']:.2f}ms "
+                f"p99 {result['recommend_inprocess_ms']['p99']:.2f}ms, refresh {result['refresh_s']:.2f}s"
+            )
+            print(
+                f"{'':>8}       suggest p50 {result['suggest_inprocess_ms']['p50']:.3f}ms "
+                f"p99 {result['suggest_inprocess_ms']['p99']:.3f}ms"
+            )
+            if "recommend_two_stage_ms" in result:
+                print(
+                    f"{'':>8}       two-stage p50 {result['recommend_two_stage_ms']['p50']:.2f}ms "
+                    f"p99 {result['recommend_two_stage_ms']['p99']:.2f}ms, recall {result['two_stage_recall']}"
+                )
+
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to {args.out}")
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        lines, regressions = compare(results, baseline, args.tolerance)
+        for line in lines:
+            print(line)
+        if regressions:
+            print(f"ERROR: {len(regressions)} metric(s) regressed more than {args.tolerance:.0%}")
+            sys.exit(1)
+
+    sys.exit(0)
+
+
+if __name__ == "__main__":
+    main()
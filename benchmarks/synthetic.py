@@ -0,0 +1,178 @@
+# benchmarks/synthetic.py
+"""
+Deterministic synthetic data: restaurants that pass
+scripts/validate_restaurants.py, users with click histories, and
+/recommend request bodies.
+
+Row i only depends on (seed, i), so the first m rows of an n-row catalog are
+the m-row catalog, and catalogs of any size can be streamed to disk without
+holding them in memory.
+"""
+import gzip
+import json
+import random
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+
+from server.scoring import CAMPUS_LAT, CAMPUS_LNG
+
+# Cuisine -> dishes that go into menu_text (and synthetic queries)
+DISHES = {
+    "American": ["burgers", "fries", "milkshakes", "chicken wings", "mac and cheese", "bbq ribs", "hot dogs"],
+    "Mexican": ["tacos", "burritos", "quesadillas", "nachos", "enchiladas", "churros", "carne asada"],
+    "Italian": ["pizza", "pasta", "lasagna", "risotto", "tiramisu", "calzones", "garlic bread"],
+    "Japanese": ["sushi", "ramen", "udon", "tempura", "teriyaki bowls", "onigiri", "matcha"],
+    "Chinese": ["dumplings", "fried rice", "chow mein", "orange chicken", "bao", "hot and sour soup"],
+    "Korean": ["bibimbap", "korean bbq", "kimchi fried rice", "tteokbokki", "bulgogi", "fried chicken"],
+    "Taiwanese": ["boba", "beef noodle soup", "popcorn chicken", "scallion pancakes", "shaved ice"],
+    "Mediterranean": ["falafel", "hummus", "shawarma", "gyros", "tabbouleh", "pita wraps"],
+    "Middle Eastern": ["kebabs", "shawarma", "mandi", "baklava", "lentil soup", "kofta"],
+    "Indian": ["curry", "biryani", "naan", "tikka masala", "samosas", "dal", "mango lassi"],
+    "Vietnamese": ["pho", "banh mi", "spring rolls", "vermicelli bowls", "vietnamese coffee"],
+    "Thai": ["pad thai", "green curry", "tom yum", "papaya salad", "thai iced tea", "drunken noodles"],
+    "Hawaiian": ["poke bowls", "spam musubi", "acai bowls", "loco moco", "shave ice"],
+    "Cafe": ["coffee", "espresso", "pastries", "bagels", "sandwiches", "smoothies", "breakfast burritos"],
+    "Healthy": ["salads", "grain bowls", "smoothies", "wraps", "avocado toast", "cold pressed juice"],
+}
+CUISINES = sorted(DISHES)
+CATEGORIES = ["Cafe", "Fast Food", "Casual Dining", "Dessert", "Food Court", "Food Truck", "Bakery", "Bar"]
+DIETARY_TAGS = ["halal", "vegan", "pescatarian", "vegetarian", "gluten_free"]
+SOURCES = ["google", "yelp", "manual"]
+
+NAME_WORDS = ["Golden", "Lucky", "Sunny", "Blue", "Little", "Urban", "Happy", "Red", "Green", "Old Town", "Campus"]
+NAME_NOUNS = ["Lotus", "Spoon", "Table", "Garden", "Bowl", "Kitchen", "Grill", "Corner", "House", "Oven", "Noodle"]
+STREETS = ["Campus Dr", "University Dr", "Culver Dr", "Jamboree Rd", "Main St", "Michelson Dr", "Harvard Ave"]
+
+# All of these parse with server/hours.py
+HOURS = [
+    "Mon–Sun 11am–9pm",
+    "Mon–Sun 6am–6pm",
+    "Mon–Fri 7:30am-3pm",
+    "Mon–Sat 10am–10pm, Sun 11am–8pm",
+    "Sun-Thu 10:30am-1am, Fri-Sat 10:30am-1:30am",
+    "Tue–Sun 11am–2pm, 5pm–9:30pm; Mon Closed",
+    "Daily 8am-midnight",
+]
+
+# Roughly a 6-mile square around campus
+COORD_SPREAD_DEGREES = 0.04
+
+
+def restaurant_id(i: int) -> str:
+    return f"syn_{i:07d}"
+
+
+def _rng(seed: int, *salt: int) -> random.Random:
+    # string seeds are hashed the same way on every platform and Python version
+    return random.Random(":".join(map(str, (seed,) + salt)))
+
+
+def make_restaurant(i: int, seed: int = 0) -> Dict[str, Any]:
+    rng = _rng(seed, 0, i)
+
+    cuisines = rng.sample(CUISINES, rng.choice((1, 1, 1, 2)))
+    dishes = sorted({d for c in cuisines for d in DISHES[c]})
+    menu = rng.sample(dishes, min(len(dishes), rng.randint(4, 8)))
+    noun = rng.choice(NAME_NOUNS)
+
+    return {
+        "id": restaurant_id(i),
+        # the row number keeps names unique, as the validator requires
+        "name": f"{rng.choice(NAME_WORDS)} {noun} {cuisines[0]} {i}",
+        "dietary_tags": sorted(rng.sample(DIETARY_TAGS, rng.randint(1, 3))),
+        "rating": round(rng.uniform(2.5, 5.0), 1),
+        "price_level": rng.choice((1, 1, 2, 2, 2, 3, 4)),
+        "address": f"{rng.randint(100, 19999)} {rng.choice(STREETS)}, Irvine, CA 926{rng.randint(2, 20):02d}",
+        "lat": round(CAMPUS_LAT + rng.gauss(0.0, COORD_SPREAD_DEGREES), 6),
+        "lng": round(CAMPUS_LNG + rng.gauss(0.0, COORD_SPREAD_DEGREES), 6),
+        "hours_text": rng.choice(HOURS),
+        "source": rng.choice(SOURCES),
+        "review_count": int(rng.paretovariate(1.2) * 20),
+        "phone": f"(949) {rng.randint(200, 999)}-{rng.randint(0, 9999):04d}",
+        "menu_text": ", ".join(menu).capitalize() + f", and more from our {noun.lower()} menu",
+        "cuisines": cuisines,
+        "categories": rng.sample(CATEGORIES, rng.randint(1, 2)),
+    }
+
+
+def generate_restaurants(n: int, seed: int = 0) -> Iterator[Dict[str, Any]]:
+    for i in range(n):
+        yield make_restaurant(i, seed)
+
+
+def write_catalog(path: Path, n: int, seed: int = 0) -> Path:
+    """
+    Stream an n-row catalog to path: NDJSON, or a JSON array when the name ends
+    in .json (what scripts/validate_restaurants.py reads); gzipped with .gz.
+    """
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    as_array = path.name.endswith(".json") or path.name.endswith(".json.gz")
+    opener = gzip.open if path.suffix == ".gz" else open
+
+    with opener(path, "wt", encoding="utf-8") as f:
+        if as_array:
+            f.write("[\n")
+        for i, r in enumerate(generate_restaurants(n, seed)):
+            if as_array and i:
+                f.write(",\n")
+            f.write(json.dumps(r, ensure_ascii=False))
+            if not as_array:
+                f.write("\n")
+        if as_array:
+            f.write("\n]\n")
+    return path
+
+
+def generate_users(n_users: int, n_restaurants: int, seed: int = 0, max_clicks: int = 30) -> List[Dict[str, Any]]:
+    """
+    Users and their click histories (oldest first). Popularity is skewed:
+    low-numbered restaurants get most of the clicks, as in real logs.
+    """
+    users = []
+    for u in range(n_users):
+        rng = _rng(seed, 1, u)
+        clicks = [
+            restaurant_id(int(n_restaurants * rng.random() ** 3))
+            for _ in range(rng.randint(1, max_clicks))
+        ]
+        users.append({"user_id": f"user_{u:06d}", "clicks": clicks})
+    return users
+
+
+def generate_queries(
+    n: int, seed: int = 0, user_ids: Optional[List[str]] = None
+) -> List[Dict[str, Any]]:
+    """/recommend request bodies mixing free text, filters, locations and users."""
+    dishes = sorted({d for ds in DISHES.values() for d in ds})
+    queries = []
+    for q in range(n):
+        rng = _rng(seed, 2, q)
+        body: Dict[str, Any] = {"top_k": rng.choice((5, 5, 10, 20))}
+
+        words = rng.sample(dishes, rng.randint(0, 2))
+        if rng.random() < 0.3:
+            words.append(rng.choice(CUISINES).lower())
+        if rng.random() < 0.2:
+            words.append(rng.choice(("cheap", "open now", "near campus", "late night", "spicy")))
+        body["query"] = " ".join(words)
+
+        if rng.random() < 0.15:
+            body["halal"] = True
+        if rng.random() < 0.15:
+            body["dietary_required"] = [rng.choice(DIETARY_TAGS)]
+        if rng.random() < 0.2:
+            body["price_max"] = rng.randint(1, 3)
+        if rng.random() < 0.1:
+            body["cuisines_optional"] = rng.sample(CUISINES, 2)
+        if rng.random() < 0.25:
+            body["user_location"] = {
+                "lat": round(CAMPUS_LAT + rng.gauss(0.0, COORD_SPREAD_DEGREES), 6),
+                "lng": round(CAMPUS_LNG + rng.gauss(0.0, COORD_SPREAD_DEGREES), 6),
+            }
+            if rng.random() < 0.5:
+                body["max_distance_miles"] = rng.choice((1.0, 2.0, 5.0))
+        if user_ids and rng.random() < 0.5:
+            body["user_id"] = rng.choice(user_ids)
+        queries.append(body)
+    return queries
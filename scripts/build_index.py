@@ -0,0 +1,75 @@
+"""
+Offline TF-IDF index build.
+
+Writes a versioned artifact (vocabulary, IDF weights, CSR arrays, id map and
+signal columns, plus LSA vectors with --lsa-dims) keyed by the sha256 of the
+catalog file. The server memory-maps it at startup and only refits when the
+data hash changes (or its LSA_DIMENSIONS / LSA_QUANTIZE differ).
+
+Usage: python scripts/build_index.py [path/to/restaurants.json or .ndjson(.gz)] [--out data/index] [--lsa-dims 128]
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(REPO_ROOT))
+
+from server.indexing.index_store import (
+    artifact_dir,
+    data_file_hash,
+    ensure_semantic,
+    fit_index,
+    load_index,
+    save_index,
+)
+from server.indexing.loader import iter_restaurants
+from server.indexing.semantic import semantic_matches
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Build the persisted TF-IDF index artifact.")
+    parser.add_argument("data", nargs="?", default=str(REPO_ROOT / "data" / "restaurants.json"))
+    parser.add_argument("--out", default=str(REPO_ROOT / "data" / "index"), help="artifact directory")
+    parser.add_argument("--force", action="store_true", help="rebuild even if an artifact for this hash exists")
+    parser.add_argument("--lsa-dims", type=int, default=0, help="also fit LSA vectors with this many dimensions")
+    parser.add_argument("--lsa-quantize", action="store_true", help="store the LSA vectors as int8")
+    args = parser.parse_args()
+
+    data_path = Path(args.data)
+    out_dir = Path(args.out)
+
+    try:
+        data_hash = data_file_hash(data_path)
+    except OSError as e:
+        print(f"ERROR: {e}")
+        sys.exit(1)
+
+    existing = None if args.force else load_index(out_dir, data_hash)
+    if existing is not None and (
+        args.lsa_dims <= 0 and existing.semantic is None
+        or semantic_matches(existing.semantic, args.lsa_dims, args.lsa_quantize, existing.tfidf_matrix.shape)
+    ):
+        print(f"OK: index for {data_hash[:16]} already at {artifact_dir(out_dir, data_hash)}")
+        sys.exit(0)
+
+    start = time.perf_counter()
+    try:
+        # the catalog is parsed while it is being indexed (NDJSON never exists as a whole)
+        index = fit_index(iter_restaurants(data_path), data_hash)
+        ensure_semantic(index, args.lsa_dims, args.lsa_quantize)
+    except RuntimeError as e:
+        print(f"ERROR: {e}")
+        sys.exit(1)
+    path = save_index(index, out_dir)
+    elapsed = time.perf_counter() - start
+
+    rows, terms = index.tfidf_matrix.shape
+    lsa = f", {index.semantic.dims} LSA dims" if index.semantic is not None else ""
+    print(f"OK: {rows} documents, {terms} terms{lsa} -> {path} ({elapsed:.2f}s)")
+    sys.exit(0)
+
+
+if __name__ == "__main__":
+    main()
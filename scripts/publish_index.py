@@ -0,0 +1,70 @@
+"""
+Builder process for the shared read-only index.
+
+Builds the index and columnar catalog from the data file and publishes them
+as a new version in the shared directory (see server/indexing/shared.py).
+Server workers started with SHARED_INDEX_DIR pointing there memory-map it
+and switch to each new version as it is published.
+
+Usage: python scripts/publish_index.py [path/to/restaurants.json] --shared /dev/shm/recommender [--watch]
+
+    SHARED_INDEX_DIR=/dev/shm/recommender uvicorn server.app:app --workers 8
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(REPO_ROOT))
+
+from server.indexing.index_store import data_file_hash
+from server.indexing.shared import publish_shared
+from server.indexing.snapshot import build_snapshot
+
+
+def publish(data_path: Path, shared_dir: Path, index_dir: Path, lsa_dims: int = 0, lsa_quantize: bool = False) -> str:
+    start = time.perf_counter()
+    snap = build_snapshot(data_path, index_dir, version=0, lsa_dims=lsa_dims, lsa_quantize=lsa_quantize)
+    header = publish_shared(snap.index, snap.restaurants, shared_dir)
+    elapsed = time.perf_counter() - start
+    print(f"OK: published v{header['version']} ({header['count']} restaurants) to {shared_dir} ({elapsed:.2f}s)")
+    return snap.data_hash
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Publish the index for worker processes to share.")
+    parser.add_argument("data", nargs="?", default=str(REPO_ROOT / "data" / "restaurants.json"))
+    parser.add_argument("--shared", required=True, help="shared directory (ideally on tmpfs, e.g. /dev/shm/...)")
+    parser.add_argument("--index-dir", default=str(REPO_ROOT / "data" / "index"), help="prebuilt artifacts to reuse")
+    parser.add_argument("--watch", action="store_true", help="republish whenever the data file changes")
+    parser.add_argument("--interval", type=float, default=2.0, help="seconds between checks with --watch")
+    parser.add_argument("--lsa-dims", type=int, default=0, help="also publish LSA vectors with this many dimensions")
+    parser.add_argument("--lsa-quantize", action="store_true", help="store the LSA vectors as int8")
+    args = parser.parse_args()
+
+    data_path = Path(args.data)
+    shared_dir = Path(args.shared)
+    index_dir = Path(args.index_dir)
+    lsa = (args.lsa_dims, args.lsa_quantize)
+
+    try:
+        published = publish(data_path, shared_dir, index_dir, *lsa)
+    except (OSError, RuntimeError) as e:
+        print(f"ERROR: {e}")
+        sys.exit(1)
+
+    while args.watch:
+        time.sleep(args.interval)
+        try:
+            if data_file_hash(data_path) != published:
+                published = publish(data_path, shared_dir, index_dir, *lsa)
+        except (OSError, RuntimeError) as e:
+            # keep the last good version published and try again later
+            print(f"ERROR: {e}")
+
+    sys.exit(0)
+
+
+if __name__ == "__main__":
+    main()
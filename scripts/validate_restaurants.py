@@ -1,7 +1,12 @@
 import json
 import sys
+from pathlib import Path
 from typing import Any, Dict, List, Optional, Set, Tuple
 
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from server.hours import HoursParseError, parse_hours
+
 ALLOWED_DIETARY_TAGS = {"halal", "vegan", "pescatarian", "vegetarian", "gluten_free"}
 MIN_MENU_TEXT_LEN = 30
 
@@ -49,6 +54,17 @@ def validate_lat_lng(lat: Any, lng: Any) -> Optional[str]:
         return f"lng out of range (-180..180): {lng}"
     return None
 
+def hours_warning(obj: Dict[str, Any], idx: int) -> Optional[str]:
+    """hours_text that the server cannot compile into a schedule (it falls back to a heuristic)."""
+    hours = obj.get("hours_text")
+    if not is_non_empty_string(hours):
+        return None
+    try:
+        parse_hours(hours)
+    except HoursParseError as e:
+        return f"restaurants[{idx}].hours_text: cannot parse '{hours}' ({e})"
+    return None
+
 def validate_restaurant(
     obj: Dict[str, Any],
     idx: int,
@@ -219,6 +235,7 @@ def main() -> None:
         fail([f"Top-level must be a list OR an object with 'restaurants' list. Got {type(restaurants).__name__}"])
 
     errors: List[str] = []
+    warnings: List[str] = []
     seen_ids: Set[str] = set()
     seen_names: Set[str] = set()
 
@@ -227,6 +244,13 @@ def main() -> None:
             errors.append(f"restaurants[{i}]: expected object, got {type(item).__name__}")
             continue
         errors.extend(validate_restaurant(item, i, seen_ids, seen_names))
+        warning = hours_warning(item, i)
+        if warning:
+            warnings.append(warning)
+
+    # Unparseable hours are allowed (open-now falls back to a heuristic) but reported
+    for w in warnings:
+        print(f"WARNING: {w}")
 
     if errors:
         fail(errors)
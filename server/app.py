@@ -1,20 +1,109 @@
 # server/app.py
-import json
-import math
-import re
 from pathlib import Path
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, List, Literal, Optional, Tuple
 
-from fastapi import FastAPI, HTTPException
-from pydantic import BaseModel, Field
-from sklearn.feature_extraction.text import TfidfVectorizer
+import os
+import threading
+import time
+
+import numpy as np
+from fastapi import FastAPI, HTTPException, Query, Response
+from pydantic import BaseModel, ConfigDict, Field
 from collections import Counter
 from datetime import datetime
 
 try:
-    from server.query_processing import expand_query
+    from server.event_log import EventLog
+    from server.feedback_queue import FeedbackEvent, FeedbackQueue
+    from server.hours import SLOT_MINUTES, week_minute
+    from server.indexing.incremental import (
+        compact,
+        consistency_report,
+        delete_restaurant,
+        needs_compaction,
+        upsert_restaurant,
+    )
+    from server.indexing.candidates import merge_scores
+    from server.indexing.catalog import COMPACT_FIELDS, FIELDS, RestaurantCatalog, payload_members
+    from server.indexing.facets import sorted_contains
+    from server.indexing.index_store import TfidfIndex
+    from server.indexing.snapshot import IndexManager, IndexSnapshot
+    from server.indexing.suggest import MAX_SUGGESTIONS
+    from server.indexing.text_builder import build_doc_text
+    from server.json_encoding import dumps, dumps_members
+    from server.metrics import (
+        BUILD_BUCKETS,
+        COUNT_BUCKETS,
+        LATENCY_BUCKETS,
+        MetricsRegistry,
+        StageTimer,
+        counter,
+        gauge,
+    )
+    from server.profiling import DEFAULT_SAMPLE_INTERVAL, RequestProfiler
+    from server.query_processing import SYNONYMS, PhraseMatcher, expand_query, format_corrections, load_synonyms
+    from server.query_vectors import QueryBatcher, QueryVectorCache
+    from server.result_cache import ResultCache, normalize_query, read_query_log
+    from server.scoring import (
+        CAMPUS_LAT,
+        CAMPUS_LNG,
+        BatchColumns,
+        candidate_rows,
+        distance_scores,
+        get_number,
+        haversine_miles,
+        haversine_miles_array,
+        score_all,
+        top_k_indices,
+        usable_mask,
+    )
+    from server.user_profile import DEFAULT_USER_ID, ProfileStore, UserProfile
 except ImportError:
-    from query_processing import expand_query
+    from event_log import EventLog
+    from feedback_queue import FeedbackEvent, FeedbackQueue
+    from hours import SLOT_MINUTES, week_minute
+    from indexing.incremental import (
+        compact,
+        consistency_report,
+        delete_restaurant,
+        needs_compaction,
+        upsert_restaurant,
+    )
+    from indexing.candidates import merge_scores
+    from indexing.catalog import COMPACT_FIELDS, FIELDS, RestaurantCatalog, payload_members
+    from indexing.facets import sorted_contains
+    from indexing.index_store import TfidfIndex
+    from indexing.snapshot import IndexManager, IndexSnapshot
+    from indexing.suggest import MAX_SUGGESTIONS
+    from indexing.text_builder import build_doc_text
+    from json_encoding import dumps, dumps_members
+    from metrics import (
+        BUILD_BUCKETS,
+        COUNT_BUCKETS,
+        LATENCY_BUCKETS,
+        MetricsRegistry,
+        StageTimer,
+        counter,
+        gauge,
+    )
+    from profiling import DEFAULT_SAMPLE_INTERVAL, RequestProfiler
+    from query_processing import SYNONYMS, PhraseMatcher, expand_query, format_corrections, load_synonyms
+    from query_vectors import QueryBatcher, QueryVectorCache
+    from result_cache import ResultCache, normalize_query, read_query_log
+    from scoring import (
+        CAMPUS_LAT,
+        CAMPUS_LNG,
+        BatchColumns,
+        candidate_rows,
+        distance_scores,
+        get_number,
+        haversine_miles,
+        haversine_miles_array,
+        score_all,
+        top_k_indices,
+        usable_mask,
+    )
+    from user_profile import DEFAULT_USER_ID, ProfileStore, UserProfile
 
 # ----------------------------
 # FastAPI app
@@ -26,219 +115,182 @@ app = FastAPI(title="Project36 Restaurant Recommender", version="0.1.0")
 # ----------------------------
 REPO_ROOT = Path(__file__).resolve().parent.parent
 DATA_PATH = REPO_ROOT / "data" / "restaurants.json"
-
-
-def load_restaurants(path: Path) -> List[Dict[str, Any]]:
-    """Loads restaurant data from JSON.
-    Accepts either:
-      1) [ {restaurant}, ... ]
-      2) { "restaurants": [ {restaurant}, ... ] }
-    """
-    try:
-        with open(path, "r", encoding="utf-8-sig") as f:
-            data = json.load(f)
-    except FileNotFoundError as e:
-        raise RuntimeError(f"restaurants.json not found at: {path}") from e
-    except json.JSONDecodeError as e:
-        raise RuntimeError(f"Invalid JSON in: {path} ({e})") from e
-
-    if isinstance(data, dict) and "restaurants" in data:
-        restaurants = data["restaurants"]
-    else:
-        restaurants = data
-
-    if not isinstance(restaurants, list):
-        raise RuntimeError(
-            "restaurants.json must be a list OR an object with a 'restaurants' list."
-        )
-
-    cleaned: List[Dict[str, Any]] = []
-    for i, r in enumerate(restaurants):
-        if isinstance(r, dict):
-            cleaned.append(r)
-        else:
-            raise RuntimeError(f"restaurants[{i}] is not an object")
-
-    return cleaned
-
-
-# Global cache (reloaded on refresh)
-RESTAURANTS: List[Dict[str, Any]] = load_restaurants(DATA_PATH)
+# Prebuilt TF-IDF artifacts (scripts/build_index.py); None disables loading them
+INDEX_DIR: Optional[Path] = REPO_ROOT / "data" / "index"
+# Recorded /recommend bodies (JSONL) used to pre-warm the result cache at startup
+QUERY_LOG_PATH: Optional[Path] = REPO_ROOT / "data" / "query_log.jsonl"
+WARMUP_MAX_QUERIES = 200
+# Snapshot of every user profile (None disables persistence)
+PROFILES_PATH: Optional[Path] = REPO_ROOT / "data" / "profiles.json"
+# Append-only log of feedback events since that snapshot (None disables it)
+EVENT_LOG_DIR: Optional[Path] = REPO_ROOT / "data" / "events"
+EVENT_LOG_FSYNC = True
+# Attach to the index scripts/publish_index.py publishes there instead of building one,
+# so all worker processes share a single memory-mapped copy (edits are then disabled)
+SHARED_INDEX_DIR: Optional[Path] = (
+    Path(os.environ["SHARED_INDEX_DIR"]) if os.environ.get("SHARED_INDEX_DIR") else None
+)
+# LSA dimensions fitted at index time for semantic matching ("noodles" ~ "ramen");
+# 0 disables it. Quantized vectors are int8: 4x less memory, a little less exact and slower.
+LSA_DIMENSIONS = int(os.environ.get("LSA_DIMENSIONS", "0"))
+LSA_QUANTIZE = os.environ.get("LSA_QUANTIZE", "") not in ("", "0")
+# similarity = (1 - w) * tfidf + w * LSA cosine, the latter for the top N rows only
+SEMANTIC_WEIGHT = 0.3
+SEMANTIC_TOP_N = 200
+# Two-stage ranking: score only the CANDIDATE_BUDGET most promising rows matching a
+# query term (read from the matrix columns of those terms) plus the POPULAR_CANDIDATES
+# best rows near campus, instead of every row. 0 ranks exhaustively
+# (benchmarks/run.py reports the recall of the two against each other).
+CANDIDATE_BUDGET = int(os.environ.get("CANDIDATE_BUDGET", "0"))
+POPULAR_CANDIDATES = 100
+# Text relevance: "tfidf" (cosine, sparse matmul) or "bm25" (native inverted index with
+# field boosts, see indexing.inverted; top-k by MaxScore when ranking two-stage)
+RANKING_ENGINES = ("tfidf", "bm25")
+RANKING_ENGINE = os.environ.get("RANKING_ENGINE", "tfidf")
+if RANKING_ENGINE not in RANKING_ENGINES:
+    raise ValueError(f"RANKING_ENGINE must be one of {RANKING_ENGINES}, got {RANKING_ENGINE!r}")
+# Synonym phrases expanded into queries ("bubble tea" also searches "boba"), a JSON object
+# of phrase -> expansions; query_processing.SYNONYMS when missing or None
+SYNONYMS_PATH: Optional[Path] = REPO_ROOT / "data" / "synonyms.json"
+# Correct misspelled query words to the nearest indexed term ("piza" -> "pizza");
+# corrections are reported in the X-Query-Corrections header (/recommend/batch: "corrections")
+SPELL_CORRECTION = os.environ.get("SPELL_CORRECTION", "1") not in ("", "0")
+# Add a Server-Timing header (per-stage durations) to /recommend responses
+SERVER_TIMING = os.environ.get("SERVER_TIMING", "") not in ("", "0")
 
 # ----------------------------
-# TF-IDF index globals
+# Metrics
 # ----------------------------
-vectorizer: Optional[TfidfVectorizer] = None
-tfidf_matrix = None  # scipy sparse matrix
-id_to_index: Dict[str, int] = {}
+# Histograms are fed on the hot path (see metrics.StageTimer); everything
+# else on /metrics is read from the live objects at scrape time.
+metrics = MetricsRegistry()
+STAGE_SECONDS = metrics.histogram(
+    "recommender_stage_seconds", "Time spent in each request stage.", LATENCY_BUCKETS, ("endpoint", "stage")
+)
+CANDIDATE_ROWS = metrics.histogram(
+    "recommender_candidates", "Rows left to score after the hard filters, per ranked query.", COUNT_BUCKETS
+)
+INDEX_BUILD_SECONDS = metrics.histogram(
+    "recommender_index_build_seconds", "Index builds and shared-index attaches.", BUILD_BUCKETS, ("status",)
+)
+# Armed by POST /debug/profile for the next N /recommend and feedback calls
+profiler = RequestProfiler()
 
 # ----------------------------
-# User Profile (single-user prototype)
+# Query processing
 # ----------------------------
-class UserProfile:
-    def __init__(self):
-        self.dietary_required: List[str] = []
-        self.preferred_cuisines: List[str] = []
-        self.disliked_cuisines: List[str] = []
-        self.price_preference: int = 2
-        self.click_history: List[str] = []
-
-    def record_click(self, restaurant_id: str):
-        self.click_history.append(restaurant_id)
-
-    def cuisine_click_counts(self, restaurant_lookup: Dict[str, Dict[str, Any]]) -> Counter:
-        counter = Counter()
-        for rid in self.click_history:
-            r = restaurant_lookup.get(rid)
-            if not r:
-                continue
-            for c in r.get("cuisines", []) or []:
-                counter[c.lower()] += 1
-        return counter
-
-
-user_profile = UserProfile()
+synonym_phrases = PhraseMatcher(
+    load_synonyms(SYNONYMS_PATH) if SYNONYMS_PATH is not None and SYNONYMS_PATH.exists() else SYNONYMS
+)
 
 # ----------------------------
-# TF-IDF document text builder
+# Index snapshot
 # ----------------------------
-_PUNCT_RE = re.compile(r"[^a-z0-9\s]")
-_WS_RE = re.compile(r"\s+")
-
-
-def _as_str_list(x: Any) -> List[str]:
-    if x is None:
-        return []
-    if isinstance(x, list):
-        return [str(v) for v in x if v is not None]
-    return [str(x)]
-
-
-def _clean(s: str) -> str:
-    s = s.lower()
-    s = _PUNCT_RE.sub(" ", s)
-    s = _WS_RE.sub(" ", s).strip()
-    return s
+# The catalog, TF-IDF matrix and signal columns live in one immutable
+# IndexSnapshot. Requests read index_manager.current once; rebuilds and
+# edits publish a replacement with a single reference swap.
+index_manager = IndexManager(
+    data_path=lambda: DATA_PATH,
+    index_dir=lambda: INDEX_DIR,
+    shared_dir=lambda: SHARED_INDEX_DIR,
+    on_build=lambda seconds, status: INDEX_BUILD_SECONDS.observe(seconds, status),
+    lsa_dims=lambda: LSA_DIMENSIONS,
+    lsa_quantize=lambda: LSA_QUANTIZE,
+    prepare=lambda snap: prepare_snapshot(snap),
+)
 
+# ----------------------------
+# Result cache
+# ----------------------------
+# Keyed on every request field (normalized), the time-of-day bucket, the
+# opening-hours slot and the profile version, and tied to the snapshot
+# version, so /refresh and /feedback invalidate it.
+result_cache = ResultCache()
 
-def _expand_tags(tags: List[str]) -> List[str]:
-    """Include both underscore and space forms, e.g., gluten_free + gluten free."""
-    expanded: List[str] = []
-    for t in tags:
-        expanded.append(t)
-        if "_" in t:
-            expanded.append(t.replace("_", " "))
-    return expanded
-
-
-def build_doc_text(r: Dict[str, Any]) -> str:
-    name = r.get("name", "") or ""
-    cuisines = _as_str_list(r.get("cuisines"))
-    categories = _as_str_list(r.get("categories"))
-    menu_text = r.get("menu_text") or ""
-    dietary_tags = _as_str_list(r.get("dietary_tags"))
-    dietary_expanded = _expand_tags(dietary_tags)
-
-    # Price token helps "cheap" vibes indirectly ($, $$, $$$, $$$$)
-    price_token = ""
-    pl = r.get("price_level")
-    if isinstance(pl, int) and 1 <= pl <= 4:
-        price_token = "$" * pl
-
-    parts: List[str] = []
-    parts.append(name)
-    parts.extend(cuisines)
-    parts.extend(categories)
-    parts.append(menu_text)
-    parts.append(price_token)
-
-    # Upweight dietary tags by repeating (expanded)
-    parts.extend(dietary_expanded)
-    parts.extend(dietary_expanded)
-
-    return _clean(" ".join(p for p in parts if p))
-
+# Expanded query text -> TF-IDF query vector (reset whenever the vectorizer changes),
+# plus micro-batching of concurrent similarity lookups into one sparse matmul.
+query_vector_cache = QueryVectorCache()
+query_batcher = QueryBatcher(query_vector_cache)
 
 # ----------------------------
-# Helpers (numbers, distance, etc.)
+# User profiles
 # ----------------------------
-def get_number(x: Any, default: float = 0.0) -> float:
-    try:
-        if x is None:
-            return default
-        if isinstance(x, bool):
-            return default
-        return float(x)
-    except (TypeError, ValueError):
-        return default
+# Per-user profiles keyed by user_id (requests without one use DEFAULT_USER_ID).
+# Every applied feedback event is appended to the event log (opened at startup);
+# profiles are snapshotted periodically and at shutdown, which also drops the
+# log segments the snapshot covers. Startup replays snapshot + log tail.
+# Users evicted past the cap are spilled to disk and reloaded on their next
+# request; snapshots include them.
+USER_PROFILES = ProfileStore()
+# Stands in for users without a profile yet (reads never create one)
+NO_PROFILE = UserProfile()
 
+click_log: Optional[EventLog] = None
+# Serializes applying + logging events against snapshots, so a snapshot and
+# the log sequence number it records always agree.
+_feedback_lock = threading.Lock()
 
-# Campus center (approx) - simple demo reference point
-CAMPUS_LAT = 33.6405
-CAMPUS_LNG = -117.8443
-MAX_DISTANCE_MILES = 2.0  # beyond this distance_score becomes 0
 
+def profile_for(user_id: Optional[str]) -> UserProfile:
+    return USER_PROFILES.get(user_id or DEFAULT_USER_ID) or NO_PROFILE
 
-def haversine_miles(lat1: float, lng1: float, lat2: float, lng2: float) -> float:
-    R = 3958.8
-    phi1, phi2 = math.radians(lat1), math.radians(lat2)
-    dphi = math.radians(lat2 - lat1)
-    dlambda = math.radians(lng2 - lng1)
 
-    a = (math.sin(dphi / 2) ** 2 +
-         math.cos(phi1) * math.cos(phi2) * (math.sin(dlambda / 2) ** 2))
-    return 2 * R * math.asin(math.sqrt(a))
+def _apply_event(user_id: str, kind: str, restaurant_id: str, cuisines: List[str]) -> UserProfile:
+    if kind == "click":
+        return USER_PROFILES.record_click(user_id, restaurant_id, cuisines)
+    profile = USER_PROFILES.get_or_create(user_id)
+    profile.record_impression()
+    return profile
 
 
-def distance_score(r: Dict[str, Any]) -> float:
-    lat = get_number(r.get("lat"), None)  # type: ignore[arg-type]
-    lng = get_number(r.get("lng"), None)  # type: ignore[arg-type]
-    if lat is None or lng is None:
-        return 0.0
+def apply_feedback(events: List[FeedbackEvent]) -> None:
+    with _feedback_lock:
+        for e in events:
+            _apply_event(e.user_id, e.kind, e.restaurant_id, e.cuisines)
+        if click_log is not None:
+            # buffered for the next group commit; never waits for the disk
+            click_log.append([(e.user_id, e.kind, e.restaurant_id, list(e.cuisines)) for e in events])
 
-    d = haversine_miles(CAMPUS_LAT, CAMPUS_LNG, float(lat), float(lng))
-    if d >= MAX_DISTANCE_MILES:
-        return 0.0
 
-    return max(0.0, 1.0 - (d / MAX_DISTANCE_MILES))
+def replay_click_log(log: EventLog, after_seq: int = 0) -> int:
+    """Apply every logged event after after_seq to USER_PROFILES. Returns how many."""
+    return USER_PROFILES.replay(record[1:] for record in log.replay(after_seq))
 
 
-def open_score(r: Dict[str, Any]) -> float:
+def snapshot_profiles() -> None:
     """
-    Simple heuristic:
-    - if hours_text contains 'closed' => 0
-    - if it contains am/pm => 1
-    - otherwise => 0.5
+    Save every profile, then drop the event log segments the snapshot covers.
+    Only copying the profiles holds up /click and /feedback; the log commit
+    and the file write happen after.
     """
-    hours = (r.get("hours_text") or "").lower()
-    if "closed" in hours:
-        return 0.0
-    if "am" in hours or "pm" in hours:
-        return 1.0
-    return 0.5
-
-
-def rating_score(r: Dict[str, Any]) -> float:
-    rating = get_number(r.get("rating"), 0.0)
-    return min(max(rating / 5.0, 0.0), 1.0)
+    if PROFILES_PATH is None:
+        return
+    with _feedback_lock:
+        seq = click_log.last_seq if click_log is not None else None
+        profiles = USER_PROFILES.export()
+    if click_log is not None:
+        # closes the segments holding seq and earlier, so they can be dropped
+        click_log.checkpoint()
+    USER_PROFILES.save(PROFILES_PATH, meta={"event_seq": seq}, profiles=profiles)
+    if click_log is not None:
+        click_log.drop_through(seq)
 
-def price_score(r: Dict[str, Any]) -> float:
-    restaurant_price = r.get("price_level")
-    if not isinstance(restaurant_price, int):
-        return 0.5  # neutral if unknown
 
-    diff = abs(user_profile.price_preference - restaurant_price)
-    return max(0.0, 1.0 - (diff / 4.0))
+# POST /feedback/batch queues validated events; a background consumer applies them
+feedback_queue = FeedbackQueue(apply_feedback)
 
 
-def miles_away(r: Dict[str, Any]) -> Optional[float]:
-    """Actual distance in miles (for explanations)."""
+# ----------------------------
+# Helpers (numbers, distance, etc.)
+# ----------------------------
+def miles_away(r: Dict[str, Any], origin: Tuple[float, float] = (CAMPUS_LAT, CAMPUS_LNG)) -> Optional[float]:
+    """Actual distance in miles from origin (for explanations)."""
     lat = r.get("lat")
     lng = r.get("lng")
     if lat is None or lng is None:
         return None
     try:
-        return haversine_miles(CAMPUS_LAT, CAMPUS_LNG, float(lat), float(lng))
+        return haversine_miles(origin[0], origin[1], float(lat), float(lng))
     except Exception:
         return None
 
@@ -279,6 +331,8 @@ def build_why(
     dist_miles: Optional[float],
     opn: float,
     rate_norm: float,
+    hours_known: bool = False,
+    closing_soon: bool = False,
 ) -> List[str]:
     """
     Return 3–5 concise explanation bullets grounded in scoring signals.
@@ -288,8 +342,9 @@ def build_why(
     dietary_tags = r.get("dietary_tags") or []
 
     # 1) Dietary constraint
-    if req.halal and "halal" in dietary_tags:
-        why.append("matches halal")
+    required = req.required_dietary()
+    if required and all(t in dietary_tags for t in required):
+        why.append(f"matches {', '.join(required)}")
 
     # 2) Query term match (specific)
     doc = build_doc_text(r)
@@ -307,9 +362,15 @@ def build_why(
         if dist_miles <= 0.8:
             why.append("walkable distance")
 
-    # 4) Open / closing soon (simple heuristic)
-    hours = (r.get("hours_text") or "").lower()
-    if "closed" in hours:
+    # 4) Open / closing soon (compiled schedule; heuristic when hours_text didn't parse)
+    if hours_known:
+        if closing_soon:
+            why.append("closing soon")
+        elif opn > 0.0:
+            why.append("open now")
+        else:
+            why.append("closed now")
+    elif opn == 0.0:
         why.append("may be closed")
     else:
         why.append("open now")
@@ -328,56 +389,176 @@ def build_why(
 # ----------------------------
 # API Models
 # ----------------------------
+class Location(BaseModel):
+    lat: float = Field(ge=-90, le=90)
+    lng: float = Field(ge=-180, le=180)
+
+
+# Result object fields: the restaurant's (pre-serialized per row) and the per-request ones
+SCORE_FIELDS = ("score", "score_components", "why")
+RESULT_FIELDS = FIELDS + SCORE_FIELDS
+COMPACT_RESULT_FIELDS = COMPACT_FIELDS + ("score", "why")
+
+
 class RecommendRequest(BaseModel):
+    user_id: Optional[str] = None
     halal: bool = False
     top_k: int = Field(default=5, ge=1, le=50)
     query: Optional[str] = None
+    # Distances are measured from user_location when given, else from the campus center
+    user_location: Optional[Location] = None
+    use_campus_center: bool = False
+    # Hard radius filter; rows without coordinates are dropped when it is set
+    max_distance_miles: Optional[float] = Field(default=None, gt=0)
+    # Hard filters: every listed dietary tag (halal=true adds "halal"), price_level <= price_max
+    dietary_required: List[str] = Field(default_factory=list)
+    price_max: Optional[int] = Field(default=None, ge=1, le=4)
+    # Soft preference: boosted like the profile's preferred cuisines
+    cuisines_optional: List[str] = Field(default_factory=list)
+    # Response shape: "compact" drops the heavy fields (menu_text, hours_text, ...);
+    # fields, when given, lists exactly the result fields to return (view is then ignored)
+    view: Literal["full", "compact"] = "full"
+    fields: Optional[List[Literal[RESULT_FIELDS]]] = Field(default=None, min_length=1)
+
+    def required_dietary(self) -> List[str]:
+        tags = {t.strip().lower() for t in self.dietary_required if t.strip()}
+        if self.halal:
+            tags.add("halal")
+        return sorted(tags)
+
+    def optional_cuisines(self) -> List[str]:
+        return sorted({c.strip().lower() for c in self.cuisines_optional if c.strip()})
+
+    def result_fields(self) -> Tuple[str, ...]:
+        if self.fields is not None:
+            return tuple(dict.fromkeys(self.fields))
+        return COMPACT_RESULT_FIELDS if self.view == "compact" else RESULT_FIELDS
+
+    def origin(self) -> Tuple[float, float]:
+        if self.user_location is not None:
+            return (self.user_location.lat, self.user_location.lng)
+        return (CAMPUS_LAT, CAMPUS_LNG)
+
+
+class RestaurantDocument(BaseModel):
+    """Restaurant schema (README). Unknown fields are kept as-is."""
+    model_config = ConfigDict(extra="allow")
+
+    id: Optional[str] = None  # taken from the URL; must match if given
+    name: str = Field(min_length=1)
+    dietary_tags: List[str]
+    rating: float = Field(ge=0, le=5)
+    price_level: int = Field(ge=1, le=4)
+    address: str
+    lat: float = Field(ge=-90, le=90)
+    lng: float = Field(ge=-180, le=180)
+    hours_text: str
+    source: str
+    review_count: Optional[int] = None
+    phone: Optional[str] = None
+    menu_text: Optional[str] = None
+    cuisines: Optional[List[str]] = None
+    categories: Optional[List[str]] = None
 
 
 # ----------------------------
 # Build TF-IDF at startup
 # ----------------------------
-@app.on_event("startup")
-def build_tfidf_index() -> None:
-    global vectorizer, tfidf_matrix, id_to_index, RESTAURANTS
+def _edited_snapshot(index: TfidfIndex, restaurants: RestaurantCatalog, previous: IndexSnapshot) -> IndexSnapshot:
+    """
+    Snapshot of an index edited from previous: compacted (and rebuilt) when
+    needs_compaction says so, else carrying previous's derived structures over.
+    """
+    if needs_compaction(index):
+        index, restaurants = compact(index, restaurants)
+        return IndexSnapshot(index, restaurants, source="compaction")
+    return IndexSnapshot(index, restaurants, source="edit", previous=previous)
 
-    RESTAURANTS = load_restaurants(DATA_PATH)
 
-    corpus: List[str] = []
-    id_to_index = {}
+@app.on_event("startup")
+def build_tfidf_index() -> None:
+    snap = index_manager.ensure_ready()
+    index_manager.start_watcher()
+    print(f"TF-IDF ready: {snap.tfidf_matrix.shape[0]} documents")
+
+    load_profiles()
+    USER_PROFILES.start_snapshots(snapshot_profiles)
+
+    if QUERY_LOG_PATH is not None and QUERY_LOG_PATH.exists():
+        warmed = warm_result_cache(QUERY_LOG_PATH)
+        print(f"Result cache warmed: {warmed} queries from {QUERY_LOG_PATH}")
+
+
+def prepare_snapshot(snap: IndexSnapshot) -> None:
+    """Build what the first request on a new snapshot would otherwise wait for."""
+    if CANDIDATE_BUDGET > 0 and RANKING_ENGINE == "tfidf":
+        snap.candidates.postings
+    if RANKING_ENGINE == "bm25":
+        snap.bm25
+    if SPELL_CORRECTION:
+        snap.spelling
+    snap.suggest
+
+
+def load_profiles() -> None:
+    """Profile snapshot plus every event logged after it."""
+    global click_log
+
+    after_seq = 0
+    if PROFILES_PATH is not None and PROFILES_PATH.exists():
+        try:
+            loaded = USER_PROFILES.load(PROFILES_PATH)
+            after_seq = USER_PROFILES.snapshot_meta.get("event_seq") or 0
+            print(f"User profiles loaded: {loaded} from {PROFILES_PATH}")
+        except (OSError, ValueError) as e:
+            print(f"Ignoring unreadable profile snapshot {PROFILES_PATH}: {e}")
+
+    if EVENT_LOG_DIR is not None and click_log is None:
+        click_log = EventLog(EVENT_LOG_DIR, fsync=EVENT_LOG_FSYNC)
+        started = time.perf_counter()
+        replayed = replay_click_log(click_log, after_seq)
+        print(f"Event log replayed: {replayed} events in {time.perf_counter() - started:.2f}s")
+
+
+def warm_result_cache(path: Path, limit: int = WARMUP_MAX_QUERIES) -> int:
+    """Run the most frequent logged requests once so their results are cached."""
+    warmed = 0
+    for body in read_query_log(path, limit, key=logged_request_key):
+        try:
+            req = RecommendRequest(**body)
+        except ValueError:
+            continue
+        recommend(req)
+        warmed += 1
+    return warmed
 
-    for idx, r in enumerate(RESTAURANTS):
-        corpus.append(build_doc_text(r))
-        rid = r.get("id")
-        if isinstance(rid, str):
-            id_to_index[rid] = idx
 
-    vectorizer = TfidfVectorizer(stop_words="english")
-    tfidf_matrix = vectorizer.fit_transform(corpus)
+def logged_request_key(body: Dict[str, Any]) -> tuple:
+    """Query log bodies that would share a result cache entry (for the same user) count as one."""
+    req = RecommendRequest(**body)
+    return (req.user_id,) + request_cache_key(req)
 
-    print(f"TF-IDF ready: {tfidf_matrix.shape[0]} documents")
 
-def ensure_index_ready():
-    global vectorizer, tfidf_matrix, id_to_index, RESTAURANTS
+@app.on_event("shutdown")
+def stop_index_watcher() -> None:
+    global click_log
 
-    if vectorizer is not None and tfidf_matrix is not None:
-        return
+    index_manager.stop_watcher()
+    USER_PROFILES.stop_snapshots()
+    feedback_queue.join()
+    snapshot_profiles()
+    if click_log is not None:
+        click_log.close()
+        click_log = None
 
-    # Load data if needed
-    if not RESTAURANTS:
-        RESTAURANTS = load_restaurants(DATA_PATH)
 
-    corpus = []
-    id_to_index = {}
+def ensure_index_ready() -> IndexSnapshot:
+    return index_manager.ensure_ready()
 
-    for idx, r in enumerate(RESTAURANTS):
-        corpus.append(build_doc_text(r))
-        rid = r.get("id")
-        if isinstance(rid, str):
-            id_to_index[rid] = idx
 
-    vectorizer = TfidfVectorizer(stop_words="english")
-    tfidf_matrix = vectorizer.fit_transform(corpus)
+def require_writable_index() -> None:
+    if index_manager.shared:
+        raise HTTPException(status_code=409, detail="Index is read-only: it is published by another process")
 
 
 # ----------------------------
@@ -385,7 +566,10 @@ def ensure_index_ready():
 # ----------------------------
 @app.get("/health")
 def health():
-    return {"ok": True, "count": len(RESTAURANTS)}
+    snap = index_manager.current
+    if snap is None:
+        return {"ok": True, "count": 0, "index_version": None}
+    return {"ok": True, "count": snap.live_count, "index_version": snap.version}
 
 def get_time_of_day():
     hour = datetime.now().hour
@@ -396,194 +580,686 @@ def get_time_of_day():
         return "lunch"
     else:
         return "dinner"
-    
-def time_context_boost(restaurant, time_of_day):
-    tags = restaurant.get("tags") or []
-    cuisines = restaurant.get("cuisines") or []
-
-    boost = 0.0
-
-    if time_of_day == "morning":
-        if "cafe" in tags or "coffee" in tags or "breakfast" in cuisines:
-            boost = 0.15
 
-    elif time_of_day == "lunch":
-        if "fast food" in cuisines or "sandwich" in cuisines:
-            boost = 0.12
 
-    elif time_of_day == "dinner":
-        if "restaurant" in tags or "dinner" in cuisines:
-            boost = 0.10
-
-    return boost
+def get_minute_of_week() -> int:
+    now = datetime.now()
+    return week_minute(now.weekday(), now.hour, now.minute)
 
 @app.post("/recommend")
+@profiler.profiled
 def recommend(req: RecommendRequest):
     #if not RESTAURANTS:
         #raise HTTPException(status_code=500, detail="No restaurant data loaded.")
     #if vectorizer is None or tfidf_matrix is None:
         #raise HTTPException(status_code=500, detail="TF-IDF index not initialized.")
-    ensure_index_ready()
+    snap = ensure_index_ready()
+    timer = StageTimer()
     time_of_day = get_time_of_day()
-    
+    minute_of_week = get_minute_of_week()
+    profile = profile_for(req.user_id)
+
+    key = recommend_cache_key(req, time_of_day, minute_of_week, profile)
+    # (response body, spelling corrections): a hit does no query processing
+    cached = result_cache.get(key, snap.version)
+    timer.lap("cache")
+    if cached is None:
+        query_text, corrections = build_query_text(snap, req)
+        timer.lap("expand")
+        results = rank_restaurants(
+            snap, req, time_of_day, minute_of_week, profile, query_text=query_text, timer=timer
+        )
+        body = json_array(results)
+        result_cache.put(key, snap.version, (body, corrections))
+        timer.lap("serialize")
+    else:
+        body, corrections = cached
+    headers = {"X-Query-Corrections": format_corrections(corrections)} if corrections else None
+    return timed_response(body, timer, "recommend", headers)
 
-    candidates = list(RESTAURANTS)
 
-    # Hard filter: halal
-    if req.halal:
-        candidates = [
-            r for r in candidates
-            if "halal" in (r.get("dietary_tags") or [])
-        ]
+def json_array(items: List[bytes]) -> bytes:
+    return b"[" + b",".join(items) + b"]"
+
+
+def timed_response(
+    body: bytes, timer: StageTimer, endpoint: str, headers: Optional[Dict[str, str]] = None
+) -> Response:
+    timer.finish(STAGE_SECONDS, endpoint)
+    if SERVER_TIMING:
+        headers = {**(headers or {}), "Server-Timing": timer.server_timing()}
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
+MAX_RECOMMEND_BATCH = 100
+# queries per sparse multiply: bounds the dense (queries x rows) score matrix
+RECOMMEND_MATMUL_CHUNK = 32
 
-    # Build query text
-    query_text = expand_query((req.query or "").strip())
+
+class RecommendBatchRequest(BaseModel):
+    requests: List[RecommendRequest] = Field(min_length=1, max_length=MAX_RECOMMEND_BATCH)
+
+
+@app.post("/recommend/batch")
+@profiler.profiled
+def recommend_batch(batch: RecommendBatchRequest):
+    """
+    Rank many requests at once (e.g. several home screen carousels). Results
+    are the same as calling /recommend for each request, in order, but every
+    query is vectorized together, scored with one sparse multiply per chunk,
+    and the query-independent columns are computed once for the whole batch.
+    "corrections" holds each request's spelling corrections, in order.
+    """
+    snap = ensure_index_ready()
+    timer = StageTimer()
+    time_of_day = get_time_of_day()
+    minute_of_week = get_minute_of_week()
+
+    # one JSON array body per request, exactly what /recommend would return
+    results: List[Optional[bytes]] = [None] * len(batch.requests)
+    corrections: List[Optional[Dict[str, str]]] = [None] * len(batch.requests)
+    # cache key -> (request, profile, positions in results); duplicates are ranked once
+    pending: Dict[tuple, Tuple[RecommendRequest, UserProfile, List[int]]] = {}
+    for i, req in enumerate(batch.requests):
+        profile = profile_for(req.user_id)
+        key = recommend_cache_key(req, time_of_day, minute_of_week, profile)
+        if key in pending:
+            pending[key][2].append(i)
+            continue
+        cached = result_cache.get(key, snap.version)
+        if cached is not None:
+            results[i], corrections[i] = cached
+        else:
+            pending[key] = (req, profile, [i])
+
+    timer.lap("cache")
+
+    shared = BatchColumns(snap.signals, time_of_day=time_of_day, minute_of_week=minute_of_week)
+    timer.lap("shared_columns")
+    items = list(pending.items())
+    for start in range(0, len(items), RECOMMEND_MATMUL_CHUNK):
+        chunk = items[start:start + RECOMMEND_MATMUL_CHUNK]
+        queries = [build_query_text(snap, req) for _, (req, _, _) in chunk]
+        timer.lap("expand")
+        S = None
+        if CANDIDATE_BUDGET <= 0 and RANKING_ENGINE == "tfidf":
+            Q = query_vector_cache.vectors(snap.vectorizer, [text for text, _ in queries])
+            timer.lap("vectorize")
+            # column j of tfidf_matrix @ Q.T is exactly tfidf_matrix @ q_j.T
+            S = (snap.tfidf_matrix @ Q.T).T.toarray()
+            timer.lap("matmul")
+        for j, (key, (req, profile, positions)) in enumerate(chunk):
+            # two-stage ranking and BM25 score each request on its own instead
+            query_text, fixed = queries[j]
+            body = json_array(rank_restaurants(
+                snap, req, time_of_day, minute_of_week, profile, query_text=query_text,
+                similarity_scores=None if S is None else S[j], shared=shared, timer=timer,
+            ))
+            result_cache.put(key, snap.version, (body, fixed))
+            for i in positions:
+                results[i], corrections[i] = body, fixed
+            timer.lap("serialize")
+
+    body = b'{"results":' + json_array(results) + b',"corrections":' + dumps(corrections) + b"}"
+    timer.lap("serialize")
+    return timed_response(body, timer, "recommend_batch")
+
+
+DEFAULT_SUGGESTIONS = 8
+MAX_SUGGEST_QUERY_LENGTH = 100
+
+
+@app.get("/suggest")
+def suggest(
+    q: str = Query(default="", max_length=MAX_SUGGEST_QUERY_LENGTH),
+    limit: int = Query(default=DEFAULT_SUGGESTIONS, ge=1, le=MAX_SUGGESTIONS),
+):
+    """
+    Search-box completions for the prefix q (restaurant names, cuisines,
+    categories and frequent terms), most popular first. Answered from the
+    snapshot's prefix index, which is built with the index and on /refresh.
+    """
+    snap = ensure_index_ready()
+    timer = StageTimer()
+    body = dumps(snap.suggest.suggest(q, limit))
+    timer.lap("suggest")
+    return timed_response(body, timer, "suggest")
+
+
+def recommend_cache_key(
+    req: RecommendRequest, time_of_day: str, minute_of_week: int, profile: UserProfile
+) -> tuple:
+    return request_cache_key(req) + (
+        time_of_day,
+        # open/closing-soon only change at schedule slot boundaries
+        minute_of_week // SLOT_MINUTES,
+        profile.version,
+    )
+
+
+def request_cache_key(req: RecommendRequest) -> tuple:
+    """The part of the result cache key that comes from the request body alone."""
+    return (
+        normalize_query(req.query),
+        req.halal,
+        req.top_k,
+        req.origin(),
+        req.max_distance_miles,
+        tuple(req.required_dietary()),
+        req.price_max,
+        tuple(req.optional_cuisines()),
+        req.result_fields(),
+    )
+
+
+def build_query_text(snap: IndexSnapshot, req: RecommendRequest) -> Tuple[str, Dict[str, str]]:
+    """(query text to rank with, {misspelled word: correction})."""
+    query_text, corrections = expand_query(
+        (req.query or "").strip(), synonym_phrases, snap.spelling if SPELL_CORRECTION else None
+    )
     if req.halal:
         query_text = (query_text + " halal").strip()
     if query_text == "":
         query_text = "food"
+    return query_text, corrections
+
+
+def filter_candidates(
+    snap: IndexSnapshot, req: RecommendRequest, facet_rows: Optional[np.ndarray]
+) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+    """(rows passing the hard filters, distance scores aligned with them or None for the campus signal)."""
+    origin = req.origin()
+    # Location: the spatial grid prunes to the radius before anything is scored,
+    # and exact distances are computed for the survivors only. The campus
+    # center's distance signal is precomputed in the index.
+    distance = None
+    if req.max_distance_miles is not None:
+        rows, miles = snap.spatial.within(origin[0], origin[1], req.max_distance_miles)
+        keep = usable_mask(snap.signals, rows)
+        if facet_rows is not None:
+            keep &= sorted_contains(rows, facet_rows)
+        candidates = rows[keep]
+        if req.user_location is not None:
+            distance = distance_scores(miles[keep])
+    else:
+        if facet_rows is None:
+            candidates = candidate_rows(snap.signals)
+        else:
+            candidates = facet_rows[usable_mask(snap.signals, facet_rows)]
+        if req.user_location is not None:
+            miles = haversine_miles_array(
+                origin[0], origin[1], snap.signals.lat[candidates], snap.signals.lng[candidates]
+            )
+            distance = distance_scores(miles)
+    return candidates, distance
+
+
+def retrieve_candidates(
+    snap: IndexSnapshot,
+    req: RecommendRequest,
+    query_text: str,
+    facet_rows: Optional[np.ndarray],
+    timer: StageTimer,
+) -> Tuple[np.ndarray, Optional[np.ndarray], np.ndarray]:
+    """
+    Stage one of two-stage ranking: (candidates, distance, similarity_scores)
+    like the exhaustive path produces, for the retrieved rows only: the rows
+    matching a query term (plus the LSA neighbours when semantic matching is
+    on) that pass the hard filters, cut to CANDIDATE_BUDGET, plus the popular
+    rows that pass them. With the bm25 engine the matching rows are its own
+    top CANDIDATE_BUDGET. Similarity outside the candidates is 0 (never read).
+    """
+    retrieval = snap.candidates
+    semantic = snap.index.semantic if SEMANTIC_WEIGHT > 0 else None
+    query_vec = None
+    if RANKING_ENGINE == "bm25":
+        # the engine's own top-k (MaxScore), before the hard filters
+        rows, scores = snap.bm25.top(query_text, CANDIDATE_BUDGET)
+    else:
+        query_vec = query_vector_cache.vectors(snap.vectorizer, [query_text])
+        timer.lap("vectorize")
+        rows, scores = retrieval.lexical(query_vec)
+    timer.lap("retrieve")
+
+    lexical_weight = 1.0
+    if semantic is not None:
+        if query_vec is None:
+            query_vec = query_vector_cache.vectors(snap.vectorizer, [query_text])
+        near, near_scores = semantic.nearest(query_vec, SEMANTIC_TOP_N)
+        lexical_weight = 1.0 - SEMANTIC_WEIGHT
+        rows, scores = merge_scores(rows, lexical_weight * scores, near, SEMANTIC_WEIGHT * near_scores)
+        timer.lap("semantic")
+
+    # the hard filters of filter_candidates, on the retrieved rows only
+    origin = req.origin()
+
+    def passing(rows: np.ndarray) -> np.ndarray:
+        keep = usable_mask(snap.signals, rows)
+        if facet_rows is not None:
+            keep &= sorted_contains(rows, facet_rows)
+        if req.max_distance_miles is not None:
+            miles = haversine_miles_array(origin[0], origin[1], snap.signals.lat[rows], snap.signals.lng[rows])
+            keep &= miles <= req.max_distance_miles
+        return keep
+
+    keep = passing(rows)
+    rows, scores = rows[keep], scores[keep]
+    selected = rows[retrieval.select(rows, scores, CANDIDATE_BUDGET)]
+    popular = retrieval.popular(POPULAR_CANDIDATES)
+    candidates = np.union1d(selected, popular[passing(popular)])
+    # popular rows cut by the budget still keep their lexical score
+    matched = sorted_contains(candidates, rows)
+    similarity = np.zeros(len(candidates), dtype=np.float64)
+    similarity[matched] = scores[np.searchsorted(rows, candidates[matched])]
+    if RANKING_ENGINE == "bm25":
+        # rows holds the BM25 top-k only: score the other popular rows directly
+        unmatched = ~matched
+        similarity[unmatched] = lexical_weight * snap.bm25.score_rows(query_text, candidates[unmatched])
+
+    distance = None
+    if req.user_location is not None:
+        miles = haversine_miles_array(
+            origin[0], origin[1], snap.signals.lat[candidates], snap.signals.lng[candidates]
+        )
+        distance = distance_scores(miles)
+
+    similarity_scores = np.zeros(snap.tfidf_matrix.shape[0], dtype=np.float64)
+    similarity_scores[candidates] = similarity
+    timer.lap("filter")
+    return candidates, distance, similarity_scores
+
+
+def rank_restaurants(
+    snap: IndexSnapshot,
+    req: RecommendRequest,
+    time_of_day: str,
+    minute_of_week: int,
+    profile: UserProfile,
+    query_text: Optional[str] = None,
+    similarity_scores: Optional[np.ndarray] = None,
+    shared: Optional[BatchColumns] = None,
+    timer: Optional[StageTimer] = None,
+) -> List[bytes]:
+    """
+    One JSON object per result, best first. Stage times go to timer when given.
+    query_text is the build_query_text text, computed here when not given.
+    With CANDIDATE_BUDGET > 0 (and no precomputed similarity_scores) only the
+    stage-one candidates are filtered and scored; otherwise every row is.
+    Text similarity comes from RANKING_ENGINE unless similarity_scores is given.
+    """
+    if timer is None:
+        timer = StageTimer()
+    if query_text is None:
+        query_text = build_query_text(snap, req)[0]
+        timer.lap("expand")
+    # Hard filters: facet posting lists are intersected shortest-first, so the
+    # cost follows the number of matches (None: no facet filter was given).
+    facet_rows = snap.facets.match(dietary_required=req.required_dietary(), price_max=req.price_max)
+    origin = req.origin()
+
+    if similarity_scores is None and CANDIDATE_BUDGET > 0:
+        timer.lap("filter")
+        candidates, distance, similarity_scores = retrieve_candidates(snap, req, query_text, facet_rows, timer)
+    else:
+        candidates, distance = filter_candidates(snap, req, facet_rows)
+        timer.lap("filter")
+
+        if similarity_scores is None and RANKING_ENGINE == "bm25":
+            similarity_scores = snap.bm25.similarity(query_text)
+            timer.lap("bm25")
+        elif similarity_scores is None:
+            similarity_scores = query_batcher.similarity(snap.tfidf_matrix, snap.vectorizer, query_text, timer=timer)
+
+        semantic = snap.index.semantic
+        if semantic is not None and SEMANTIC_WEIGHT > 0:
+            # the query vector is cached by now (the similarity lookup put it there)
+            query_vec = query_vector_cache.vectors(snap.vectorizer, [query_text])
+            similarity_scores = semantic.blend(similarity_scores, query_vec, SEMANTIC_WEIGHT, SEMANTIC_TOP_N)
+            timer.lap("semantic")
+    CANDIDATE_ROWS.observe(len(candidates))
+
+    cuisine_counts = profile.cuisine_click_counts()
+
+    # One vectorized pass over the candidates, then a partial top-k selection
+    scored = score_all(
+        snap.signals,
+        similarity_scores,
+        time_of_day=time_of_day,
+        price_preference=profile.price_preference,
+        cuisine_counts=cuisine_counts,
+        preferred_cuisines=list(profile.preferred_cuisines) + req.optional_cuisines(),
+        disliked_cuisines=profile.disliked_cuisines,
+        rows=candidates,
+        distance=distance,
+        minute_of_week=minute_of_week,
+        shared=shared,
+    )
+    timer.lap("score")
+    top = top_k_indices(scored.final, np.arange(len(candidates)), req.top_k)
+    timer.lap("top_k")
+
+    # Each result is stitched from the row's pre-serialized restaurant JSON and
+    # the per-request score fields; "why" (the costliest) only when requested.
+    fields = req.result_fields()
+    if fields == RESULT_FIELDS:
+        parts: Optional[Tuple[str, ...]] = ("compact", "detail")
+    elif fields == COMPACT_RESULT_FIELDS:
+        parts = ("compact",)
+    else:
+        parts = None
+        restaurant_fields = [f for f in fields if f not in SCORE_FIELDS]
 
-    query_vec = vectorizer.transform([query_text])
-    similarity_scores = (tfidf_matrix @ query_vec.T).toarray().flatten()
+    output: List[bytes] = []
 
-    restaurant_lookup = {r["id"]: r for r in RESTAURANTS if isinstance(r.get("id"), str)}
-    cuisine_counts = user_profile.cuisine_click_counts(restaurant_lookup)
+    for pos in top:
+        row = candidates[pos]
+        r = snap.restaurants[row]
 
-    scored_results: List[tuple] = []
+        if parts is not None:
+            members = [snap.restaurants.payload(row, part) for part in parts]
+        elif restaurant_fields:
+            members = [payload_members(r, restaurant_fields)]
+        else:
+            members = []
+
+        dynamic: Dict[str, Any] = {}
+        if "score" in fields:
+            dynamic["score"] = round(float(scored.final[pos]), 4)
+        if "score_components" in fields:
+            dynamic["score_components"] = scored.components(pos)
+        if "why" in fields:
+            timer.lap("serialize")
+            dynamic["why"] = build_why(
+                req=req,
+                r=r,
+                query_text=query_text,
+                tfidf=float(scored.tfidf[pos]),
+                dist_miles=miles_away(r, origin),
+                opn=float(scored.opn[pos]),
+                rate_norm=float(scored.rate[pos]),
+                hours_known=bool(scored.hours_known[pos]),
+                closing_soon=bool(scored.closing_soon[pos]),
+            )
+            timer.lap("why")
+        if dynamic:
+            members.append(dumps_members(dynamic))
+
+        output.append(b"{" + b",".join(members) + b"}")
+
+    timer.lap("serialize")
+    return output
 
-    for r in candidates:
-        rid = r.get("id")
-        if not isinstance(rid, str):
-            continue
-        idx = id_to_index.get(rid)
-        if idx is None:
-            continue
+class FeedbackRequest(BaseModel):
+    restaurant_id: str
+    user_id: Optional[str] = None
 
-        tfidf = float(similarity_scores[idx])
-        dist = distance_score(r)
-        opn = open_score(r)
-        rate = rating_score(r)
-        # Price preference score
-        price = price_score(r)
-        time_boost = time_context_boost(r, time_of_day)
-
-        # Personal boost
-        personal_boost = 0.0
-        for cuisine in r.get("cuisines", []) or []:
-            cuisine_lower = cuisine.lower()
-
-            # Boost clicked cuisines
-            if cuisine_lower in cuisine_counts:
-                personal_boost += 0.05 * cuisine_counts[cuisine_lower]
-
-            # Boost explicitly preferred cuisines
-            if cuisine_lower in user_profile.preferred_cuisines:
-                personal_boost += 0.05
-
-            # Penalty for disliked cuisines
-            if cuisine_lower in user_profile.disliked_cuisines:
-                personal_boost -= 0.05
-
-        # Clamp to safe range
-        personal_boost = max(-0.2, min(personal_boost, 0.4))
-
-        final_score = (
-            0.40 * tfidf +
-            0.15 * dist +
-            0.15 * opn +
-            0.10 * rate +
-            0.10 * price +
-            0.10 * personal_boost +
-            0.10 * time_boost
-        )
 
-        scored_results.append((final_score, tfidf, dist, opn, rate, price, personal_boost, r))
+class ClickRequest(BaseModel):
+    user_id: str
+    restaurant_id: str
+
 
-    scored_results.sort(key=lambda x: x[0], reverse=True)
+def _record_click(user_id: str, rid: str, endpoint: str) -> Dict[str, Any]:
+    snap = ensure_index_ready()
+    timer = StageTimer()
+    r = snap.restaurant_lookup.get(rid)
+    if r is None:
+        raise HTTPException(status_code=400, detail="Invalid restaurant_id")
+    timer.lap("validate")
 
-    output: List[Dict[str, Any]] = []
+    apply_feedback([FeedbackEvent(user_id, "click", rid, r.get("cuisines", []) or [])])
+    profile = USER_PROFILES.get(user_id) or NO_PROFILE
+    timer.lap("apply")
+    timer.finish(STAGE_SECONDS, endpoint)
+    return {"status": "recorded", "user_id": user_id, "click_history_count": len(profile.click_history)}
 
-    for final_score, tfidf, dist, opn, rate, price, personal_boost, r in scored_results[: req.top_k]:
-        dietary_tags = r.get("dietary_tags") or []
-        dist_miles = miles_away(r)
 
-        why = build_why(
-            req=req,
-            r=r,
-            query_text=query_text,
-            tfidf=tfidf,
-            dist_miles=dist_miles,
-            opn=opn,
-            rate_norm=rate,
-        )
+@app.post("/feedback")
+@profiler.profiled
+def record_feedback(feedback: FeedbackRequest):
+    return _record_click(feedback.user_id or DEFAULT_USER_ID, feedback.restaurant_id, "feedback")
 
-        output.append({
-            # Restaurant fields
-            "id": r.get("id"),
-            "name": r.get("name"),
-            "dietary_tags": dietary_tags,
-            "rating": get_number(r.get("rating"), 0.0),
-            "price_level": r.get("price_level"),
-            "address": r.get("address"),
-            "lat": r.get("lat"),
-            "lng": r.get("lng"),
-            "hours_text": r.get("hours_text"),
-            "source": r.get("source"),
-            "review_count": r.get("review_count"),
-            "phone": r.get("phone"),
-            "menu_text": r.get("menu_text"),
-            "cuisines": r.get("cuisines"),
-            "categories": r.get("categories"),
-
-            # Scoring outputs
-            "score": round(final_score, 4),
-            "score_components": {
-                "tfidf": round(tfidf, 4),
-                "distance": round(dist, 4),
-                "open": round(opn, 4),
-                "rating": round(rate, 4),
-                "price": round(price, 4),
-                "personal_boost": round(personal_boost, 4),
-                "time_boost": round(time_boost, 4),
-            },
-            "why": why
-        })
 
-    return output
+@app.post("/click")
+@profiler.profiled
+def record_user_click(click: ClickRequest):
+    return _record_click(click.user_id, click.restaurant_id, "click")
 
-class FeedbackRequest(BaseModel):
+
+MAX_FEEDBACK_BATCH = 1000
+
+
+class FeedbackEventIn(BaseModel):
     restaurant_id: str
+    type: Literal["click", "impression"] = "click"
+    user_id: Optional[str] = None  # defaults to the batch's user_id
 
 
-@app.post("/feedback")
-def record_feedback(feedback: FeedbackRequest):
-    rid = feedback.restaurant_id
+class FeedbackBatchRequest(BaseModel):
+    user_id: Optional[str] = None
+    events: List[FeedbackEventIn] = Field(max_length=MAX_FEEDBACK_BATCH)
 
-    if rid not in [r.get("id") for r in RESTAURANTS]:
-        raise HTTPException(status_code=400, detail="Invalid restaurant_id")
 
-    user_profile.record_click(rid)
+@app.post("/feedback/batch")
+@profiler.profiled
+def record_feedback_batch(batch: FeedbackBatchRequest):
+    """
+    Validate many events against the current snapshot's ids and queue them;
+    they are applied to profiles shortly after by the background consumer.
+    """
+    snap = ensure_index_ready()
+    timer = StageTimer()
+
+    events: List[FeedbackEvent] = []
+    rejected: List[Dict[str, Any]] = []
+    for i, e in enumerate(batch.events):
+        r = snap.restaurant_lookup.get(e.restaurant_id)
+        if r is None:
+            rejected.append({"index": i, "restaurant_id": e.restaurant_id, "error": "Invalid restaurant_id"})
+            continue
+        user_id = e.user_id or batch.user_id or DEFAULT_USER_ID
+        events.append(FeedbackEvent(user_id, e.type, e.restaurant_id, r.get("cuisines", []) or []))
+
+    timer.lap("validate")
+
+    accepted = feedback_queue.offer(events)
+    timer.lap("enqueue")
+    timer.finish(STAGE_SECONDS, "feedback_batch")
+    return {
+        "status": "queued",
+        "accepted": accepted,
+        "dropped": len(events) - accepted,
+        "rejected": rejected,
+        "queue_depth": feedback_queue.stats()["queue_depth"],
+    }
 
-    return {"status": "recorded", "click_history_count": len(user_profile.click_history)}
+
+@app.get("/feedback/stats")
+def feedback_stats():
+    out = feedback_queue.stats()
+    out["event_log"] = click_log.stats() if click_log is not None else None
+    return out
+
+
+@app.get("/cache/stats")
+def cache_stats():
+    snap = index_manager.current
+    return {
+        "results": result_cache.stats(),
+        "query_vectors": query_vector_cache.stats(),
+        "query_batching": query_batcher.stats(),
+        "profiles": USER_PROFILES.stats(),
+        "spelling": snap.spelling.stats() if snap is not None and SPELL_CORRECTION else None,
+    }
+
+
+@metrics.collector
+def _live_metrics():
+    snap = index_manager.current
+    if snap is not None:
+        yield gauge("recommender_index_version", "Version of the serving index snapshot.", snap.version)
+        yield gauge("recommender_index_documents", "Live restaurants in the serving index.", snap.live_count)
+        yield gauge("recommender_index_rows", "Rows in the TF-IDF matrix, tombstoned ones included.",
+                    snap.tfidf_matrix.shape[0])
+        yield gauge("recommender_index_vocabulary_size", "Terms in the TF-IDF vocabulary.",
+                    len(snap.vectorizer.vocabulary_))
+        yield gauge("recommender_index_nonzeros", "Stored entries in the TF-IDF matrix.", snap.tfidf_matrix.nnz)
+        yield gauge("recommender_catalog_bytes", "Bytes held by the columnar catalog.", snap.restaurants.nbytes)
+        yield gauge("recommender_index_age_seconds", "Seconds since the serving snapshot was built.",
+                    time.time() - snap.built_at)
+
+    for name, stats in (("results", result_cache.stats()), ("query_vectors", query_vector_cache.stats())):
+        labels = {"cache": name}
+        yield counter("recommender_cache_hits_total", "Cache lookups that hit.", stats["hits"], labels)
+        yield counter("recommender_cache_misses_total", "Cache lookups that missed.", stats["misses"], labels)
+        yield gauge("recommender_cache_hit_ratio", "Hits over lookups since start.", stats["hit_rate"], labels)
+        yield gauge("recommender_cache_entries", "Entries currently cached.", stats["size"], labels)
+
+    batching = query_batcher.stats()
+    yield counter("recommender_similarity_batches_total", "Similarity batches run.", batching["batches"])
+    yield gauge("recommender_similarity_batch_avg", "Average queries per similarity batch.", batching["avg_batch"])
+
+    profiles = USER_PROFILES.stats()
+    yield gauge("recommender_profiles", "User profiles held in memory.", profiles["profiles"])
+    yield counter("recommender_profile_evictions_total", "Profiles evicted to stay under the cap.",
+                  profiles["evictions"])
+    yield gauge("recommender_profiles_spilled", "Evicted user profiles held on disk.", profiles["spilled"])
+
+    queue = feedback_queue.stats()
+    yield gauge("recommender_feedback_queue_depth", "Feedback events waiting to be applied.", queue["queue_depth"])
+    yield counter("recommender_feedback_dropped_total", "Feedback events dropped by a full queue.", queue["dropped"])
+
+
+@app.get("/metrics")
+def metrics_endpoint():
+    """Prometheus text format: per-stage latency, candidate counts, index, cache and profile store metrics."""
+    return Response(content=metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
 
 
 @app.post("/refresh")
-def refresh():
-    """Reload restaurants.json and rebuild TF-IDF index (simple refresh mechanism for demo)."""
-    global RESTAURANTS, vectorizer, tfidf_matrix, id_to_index
+def refresh(wait: bool = False):
+    """
+    Rebuild the index from restaurants.json on a background thread and swap it
+    in atomically; returns a build id right away (wait=true blocks until done).
+    Edits made through PUT/DELETE /restaurants before the rebuild starts that are
+    not in the file are discarded; edits made while it runs are replayed onto it.
+    With a shared index, attaches the latest published version instead.
+    """
+    build = index_manager.request_rebuild("refresh")
+    if wait:
+        build = index_manager.wait(build["build_id"])
+
+    return {
+        "ok": build["status"] != "failed",
+        "build_id": build["build_id"],
+        "status": build["status"],
+        "status_url": f"/index/builds/{build['build_id']}",
+        "reloaded_from": str(SHARED_INDEX_DIR or DATA_PATH),
+        "count": build["count"],
+    }
 
-    RESTAURANTS = load_restaurants(DATA_PATH)
 
-    corpus: List[str] = []
-    id_to_index = {}
+@app.get("/index/builds/{build_id}")
+def index_build_status(build_id: str):
+    build = index_manager.build_status(build_id)
+    if build is None:
+        raise HTTPException(status_code=404, detail="Unknown build_id")
+    return build
 
-    for idx, r in enumerate(RESTAURANTS):
-        corpus.append(build_doc_text(r))
-        rid = r.get("id")
-        if isinstance(rid, str):
-            id_to_index[rid] = idx
 
-    vectorizer = TfidfVectorizer(stop_words="english")
-    tfidf_matrix = vectorizer.fit_transform(corpus)
+# ----------------------------
+# Incremental catalog edits
+# ----------------------------
+@app.put("/restaurants/{restaurant_id}")
+def put_restaurant(restaurant_id: str, doc: RestaurantDocument):
+    """Add or replace one restaurant without refitting the whole index."""
+    require_writable_index()
+    if doc.id is not None and doc.id != restaurant_id:
+        raise HTTPException(status_code=400, detail="Body id does not match URL id")
+
+    r = doc.model_dump()
+    r["id"] = restaurant_id
+
+    def change(snap: IndexSnapshot) -> IndexSnapshot:
+        return _edited_snapshot(*upsert_restaurant(snap.index, snap.restaurants, r), snap)
+
+    with index_manager.write_lock:
+        created = restaurant_id not in ensure_index_ready().id_to_index
+        snap = index_manager.edit(change)
+
+    return {
+        "ok": True, "id": restaurant_id, "created": created,
+        "compacted": snap.source == "compaction", "count": snap.live_count,
+    }
 
-    return {"ok": True, "count": len(RESTAURANTS), "reloaded_from": str(DATA_PATH)}
\ No newline at end of file
+
+@app.delete("/restaurants/{restaurant_id}")
+def remove_restaurant(restaurant_id: str):
+    require_writable_index()
+    def change(snap: IndexSnapshot) -> Optional[IndexSnapshot]:
+        # replayed onto a rebuild whose data file may not have it
+        if restaurant_id not in snap.id_to_index:
+            return None
+        return _edited_snapshot(*delete_restaurant(snap.index, snap.restaurants, restaurant_id), snap)
+
+    with index_manager.write_lock:
+        if restaurant_id not in ensure_index_ready().id_to_index:
+            raise HTTPException(status_code=404, detail="Unknown restaurant_id")
+        snap = index_manager.edit(change)
+
+    return {"ok": True, "id": restaurant_id, "compacted": snap.source == "compaction", "count": snap.live_count}
+
+
+@app.post("/index/compact")
+def compact_index(verify: bool = False):
+    """
+    Drop tombstones and re-weight with fresh IDF. With verify=true, also refit
+    the live catalog from scratch and report how far the index is from it.
+    """
+    require_writable_index()
+    snap = index_manager.edit(lambda snap: IndexSnapshot(*compact(snap.index, snap.restaurants), source="compaction"))
+
+    out: Dict[str, Any] = {"ok": True, "count": snap.live_count}
+    if verify:
+        out["consistency"] = consistency_report(snap.index, snap.restaurants)
+    return out
+
+
+MAX_PROFILE_REQUESTS = 10_000
+
+
+@app.post("/debug/profile")
+def debug_profile(
+    requests: int = Query(default=100, ge=1, le=MAX_PROFILE_REQUESTS),
+    mode: Literal["cprofile", "sample"] = "cprofile",
+    output: Literal["text", "pstats"] = "text",
+    timeout: float = Query(default=60.0, gt=0, le=600),
+    interval: float = Query(default=DEFAULT_SAMPLE_INTERVAL, ge=0.001, le=1.0),
+    sort: Literal["cumulative", "tottime", "calls"] = "cumulative",
+    limit: int = Query(default=50, ge=1, le=1000),
+):
+    """
+    Profile the next `requests` calls to /recommend, /recommend/batch and the
+    feedback endpoints, aggregated, and return the result once they are done
+    (or after timeout seconds with whatever was captured).
+
+    mode=cprofile: a pstats report (output=text), or the marshalled stats
+    pstats/snakeviz can open (output=pstats). mode=sample: collapsed stacks
+    sampled every interval seconds, ready for flamegraph.pl.
+    Other requests are served normally meanwhile; one session at a time.
+    """
+    try:
+        session = profiler.start(requests, mode, interval)
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    try:
+        session.done.wait(timeout)
+    finally:
+        profiler.finish(session)
+
+    headers = {f"X-Profile-{k.replace('_', '-').title()}": str(v) for k, v in session.summary().items()}
+    if mode == "sample":
+        return Response(content=session.collapsed(), media_type="text/plain", headers=headers)
+    if output == "pstats":
+        return Response(content=session.pstats_dump(), media_type="application/octet-stream", headers=headers)
+    return Response(content=session.pstats_text(sort, limit), media_type="text/plain", headers=headers)
@@ -0,0 +1,235 @@
+# server/event_log.py
+"""
+Append-only feedback event log.
+
+Records are compact JSON arrays, one per line, numbered with a global
+sequence number: [seq, user_id, kind, restaurant_id, cuisines]. append()
+only buffers; a writer thread commits everything buffered so far with one
+write (and one fsync), so concurrent appends share a commit and callers never
+wait for the disk. Segments are named after their first sequence number and
+roll over at max_segment_bytes. A profile snapshot that covers everything up
+to checkpoint() lets drop_through() delete the segments it made redundant.
+"""
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Any, Iterator, List, Optional, Sequence
+
+SEGMENT_PREFIX = "events-"
+SEGMENT_SUFFIX = ".log"
+DEFAULT_MAX_SEGMENT_BYTES = 64 * 1024 * 1024
+DEFAULT_COMMIT_INTERVAL_SECONDS = 0.01
+
+
+def _segment_name(first_seq: int) -> str:
+    return f"{SEGMENT_PREFIX}{first_seq:016d}{SEGMENT_SUFFIX}"
+
+
+def _encode(seq: int, record: Sequence[Any]) -> str:
+    return json.dumps([seq, *record], separators=(",", ":")) + "\n"
+
+
+class EventLog:
+    def __init__(
+        self,
+        directory: Path,
+        *,
+        fsync: bool = True,
+        commit_interval: float = DEFAULT_COMMIT_INTERVAL_SECONDS,
+        max_segment_bytes: int = DEFAULT_MAX_SEGMENT_BYTES,
+    ):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.fsync = fsync
+        self.commit_interval = commit_interval
+        self.max_segment_bytes = max_segment_bytes
+
+        self._lock = threading.Lock()
+        self._committed = threading.Condition(self._lock)
+        self._buffer: List[str] = []
+        self._last_seq = self._scan_last_seq()
+        self._durable_seq = self._last_seq
+        self.commits = 0
+        self.records_written = 0
+
+        # Start a fresh segment on every open rather than appending to the last one
+        self._io_lock = threading.Lock()
+        self._file = None
+        self._file_bytes = 0
+        # last sequence number written to a segment file (under _io_lock)
+        self._written_seq = self._last_seq
+        with self._io_lock:
+            self._open_segment_locked(self._last_seq + 1)
+
+        self._wake = threading.Event()
+        self._stop = False
+        self._writer = threading.Thread(target=self._write_loop, name="event-log-writer", daemon=True)
+        self._writer.start()
+
+    # ----------------------------
+    # Segments
+    # ----------------------------
+    def segments(self) -> List[Path]:
+        """Segment files in sequence order."""
+        return sorted(self.directory.glob(f"{SEGMENT_PREFIX}*{SEGMENT_SUFFIX}"))
+
+    @staticmethod
+    def _first_seq(path: Path) -> int:
+        return int(path.name[len(SEGMENT_PREFIX):-len(SEGMENT_SUFFIX)])
+
+    def _scan_last_seq(self) -> int:
+        for path in reversed(self.segments()):
+            records = self._read_segment(path)
+            if records:
+                return records[-1][0]
+        return 0
+
+    def _open_segment_locked(self, first_seq: int) -> None:
+        if self._file is not None:
+            self._file.close()
+        path = self.directory / _segment_name(first_seq)
+        self._file = open(path, "a", encoding="utf-8")
+        if self._file.tell():
+            # reopened after a crash: it may end in a torn line, never glue a record onto it
+            self._file.write("\n")
+            self._file.flush()
+        self._file_bytes = self._file.tell()
+
+    # ----------------------------
+    # Writing
+    # ----------------------------
+    @property
+    def last_seq(self) -> int:
+        return self._last_seq
+
+    def append(self, records: Sequence[Sequence[Any]]) -> int:
+        """Buffer records for the next group commit; returns the last sequence number assigned."""
+        with self._lock:
+            for record in records:
+                self._last_seq += 1
+                self._buffer.append(_encode(self._last_seq, record))
+            seq = self._last_seq
+        self._wake.set()
+        return seq
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Wait until everything appended so far is committed."""
+        with self._lock:
+            target = self._last_seq
+            self._wake.set()
+            return self._committed.wait_for(lambda: self._durable_seq >= target, timeout)
+
+    def _write_loop(self) -> None:
+        while True:
+            self._wake.wait()
+            self._wake.clear()
+            if self.commit_interval > 0 and not self._stop:
+                # let concurrent appends join this commit
+                time.sleep(self.commit_interval)
+
+            with self._lock:
+                lines, self._buffer = self._buffer, []
+                seq = self._last_seq
+                stop = self._stop
+            if lines:
+                self._commit(lines, seq)
+            if stop:
+                return
+
+    def _commit(self, lines: List[str], seq: int) -> None:
+        data = "".join(lines)
+        with self._io_lock:
+            self._file.write(data)
+            self._file.flush()
+            if self.fsync:
+                os.fsync(self._file.fileno())
+            self._file_bytes = self._file.tell()
+            self._written_seq = seq
+            if self._file_bytes >= self.max_segment_bytes:
+                self._open_segment_locked(seq + 1)
+
+        with self._lock:
+            self._durable_seq = seq
+            self.commits += 1
+            self.records_written += len(lines)
+            self._committed.notify_all()
+
+    def checkpoint(self) -> int:
+        """
+        Commit everything, start a new segment and return the last sequence
+        number in the closed ones. Appends may go on meanwhile: whatever is
+        not written yet goes to the new segment.
+        """
+        self.flush()
+        with self._io_lock:
+            seq = self._written_seq
+            self._open_segment_locked(seq + 1)
+        return seq
+
+    def drop_through(self, seq: int) -> int:
+        """Delete segments whose records all have sequence numbers <= seq. Returns how many."""
+        segments = self.segments()
+        dropped = 0
+        for path, nxt in zip(segments, segments[1:]):
+            if self._first_seq(nxt) - 1 <= seq:
+                path.unlink()
+                dropped += 1
+        return dropped
+
+    def close(self) -> None:
+        self.flush()
+        with self._lock:
+            self._stop = True
+        self._wake.set()
+        self._writer.join(timeout=5)
+        with self._io_lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    # ----------------------------
+    # Reading
+    # ----------------------------
+    @staticmethod
+    def _read_segment(path: Path) -> List[List[Any]]:
+        with open(path, "r", encoding="utf-8") as f:
+            lines = [line for line in f.read().split("\n") if line]
+        try:
+            # one parser call for the whole segment is much faster than one per line
+            return json.loads("[" + ",".join(lines) + "]")
+        except json.JSONDecodeError:
+            pass
+
+        records = []
+        for line in lines:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue  # torn tail from a crash mid-write
+            if isinstance(record, list) and record and isinstance(record[0], int):
+                records.append(record)
+        return records
+
+    def replay(self, after_seq: int = 0) -> Iterator[List[Any]]:
+        """Every committed record with seq > after_seq, in order: [seq, *record]."""
+        segments = self.segments()
+        for i, path in enumerate(segments):
+            if i + 1 < len(segments) and self._first_seq(segments[i + 1]) - 1 <= after_seq:
+                continue
+            for record in self._read_segment(path):
+                if record[0] > after_seq:
+                    yield record
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "last_seq": self._last_seq,
+                "durable_seq": self._durable_seq,
+                "buffered": len(self._buffer),
+                "commits": self.commits,
+                "records_written": self.records_written,
+                "segments": len(self.segments()),
+                "fsync": self.fsync,
+            }
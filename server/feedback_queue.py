@@ -0,0 +1,110 @@
+# server/feedback_queue.py
+import queue
+import threading
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+DEFAULT_MAX_QUEUE = 100_000
+DEFAULT_APPLY_BATCH = 512
+
+
+class FeedbackEvent:
+    """One validated click or impression, with the cuisines it counts for."""
+
+    __slots__ = ("user_id", "kind", "restaurant_id", "cuisines")
+
+    def __init__(self, user_id: str, kind: str, restaurant_id: str, cuisines: Sequence[str] = ()):
+        self.user_id = user_id
+        self.kind = kind
+        self.restaurant_id = restaurant_id
+        self.cuisines = cuisines
+
+
+class FeedbackQueue:
+    """
+    Bounded in-process write-behind queue for feedback events.
+
+    offer() never blocks: events that do not fit are dropped and counted.
+    A daemon consumer (started on first use) drains up to apply_batch events
+    at a time and hands them to apply() as one list.
+    """
+
+    def __init__(
+        self,
+        apply: Callable[[List[FeedbackEvent]], None],
+        max_size: int = DEFAULT_MAX_QUEUE,
+        apply_batch: int = DEFAULT_APPLY_BATCH,
+    ):
+        self._apply = apply
+        self.max_size = max_size
+        self.apply_batch = apply_batch
+
+        self._queue: "queue.Queue[FeedbackEvent]" = queue.Queue(maxsize=max_size)
+        self._lock = threading.Lock()
+        self._worker: Optional[threading.Thread] = None
+
+        self.accepted = 0
+        self.dropped = 0
+        self.applied = 0
+        self.batches = 0
+        self.failed = 0
+
+    def offer(self, events: Sequence[FeedbackEvent]) -> int:
+        """Queue as many events as fit; returns how many were accepted."""
+        self._ensure_worker()
+        accepted = 0
+        for event in events:
+            try:
+                self._queue.put_nowait(event)
+            except queue.Full:
+                break
+            accepted += 1
+
+        with self._lock:
+            self.accepted += accepted
+            self.dropped += len(events) - accepted
+        return accepted
+
+    def join(self) -> None:
+        """Block until every queued event has been applied."""
+        self._queue.join()
+
+    def _ensure_worker(self) -> None:
+        with self._lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._consume, name="feedback-consumer", daemon=True)
+                self._worker.start()
+
+    def _consume(self) -> None:
+        while True:
+            batch = [self._queue.get()]
+            while len(batch) < self.apply_batch:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            try:
+                self._apply(batch)
+                failed = 0
+            except Exception as e:  # keep consuming; the events are lost, not retried
+                print(f"Applying {len(batch)} feedback events failed: {type(e).__name__}: {e}")
+                failed = len(batch)
+
+            with self._lock:
+                self.batches += 1
+                self.applied += len(batch) - failed
+                self.failed += failed
+            for _ in batch:
+                self._queue.task_done()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "queue_depth": self._queue.qsize(),
+                "max_size": self.max_size,
+                "accepted": self.accepted,
+                "dropped": self.dropped,
+                "applied": self.applied,
+                "failed": self.failed,
+                "batches": self.batches,
+            }
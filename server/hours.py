@@ -0,0 +1,132 @@
+# server/hours.py
+"""
+Opening hours: parse free-form hours_text once and compile it into a weekly
+bitmap, so "is it open at minute m of the week" is a single bit lookup.
+
+    "Sun-Thu 10:30am-1am, Fri-Sat 10:30am-1:30am"
+    "Tue–Thu 11am–2pm, 5pm–12am; Fri–Sat 11am–3:30am; Mon Closed"
+
+Weeks start Monday 00:00 (datetime.weekday() order). Spans that end at or
+before their start run past midnight into the next day.
+Standard library only (scripts/validate_restaurants.py uses it too).
+"""
+import re
+from typing import List, Tuple
+
+SLOT_MINUTES = 15
+MINUTES_PER_DAY = 24 * 60
+MINUTES_PER_WEEK = 7 * MINUTES_PER_DAY
+SLOTS_PER_WEEK = MINUTES_PER_WEEK // SLOT_MINUTES
+SCHEDULE_BYTES = SLOTS_PER_WEEK // 8
+
+DAYS = ("mon", "tue", "wed", "thu", "fri", "sat", "sun")
+
+_DAY = r"(?:mon|tue|wed|thu|fri|sat|sun)[a-z]*\.?"
+_TIME = r"(?:\d{1,2}(?::\d{2})?\s*(?:am|pm)|noon|midnight)"
+_TOKEN = re.compile(
+    rf"(?P<days>{_DAY}(?:\s*-\s*{_DAY})?|daily|every\s*day)"
+    rf"|(?P<range>{_TIME}\s*-\s*{_TIME})"
+    r"|(?P<closed>closed)"
+    r"|(?P<sep>[\s,;&/]+|and\b)"
+)
+
+
+class HoursParseError(ValueError):
+    pass
+
+
+def _day_index(token: str) -> int:
+    return DAYS.index(token.strip()[:3])
+
+
+def _parse_days(spec: str) -> List[int]:
+    if spec.startswith("daily") or spec.startswith("every"):
+        return list(range(7))
+    parts = spec.split("-")
+    first = _day_index(parts[0])
+    if len(parts) == 1:
+        return [first]
+    last = _day_index(parts[1])
+    # ranges may wrap the week ("Sun-Thu")
+    return [(first + i) % 7 for i in range((last - first) % 7 + 1)]
+
+
+def _parse_time(text: str) -> int:
+    text = text.replace(" ", "")
+    if text == "noon":
+        return 12 * 60
+    if text == "midnight":
+        return 0
+    m = re.fullmatch(r"(\d{1,2})(?::(\d{2}))?(am|pm)", text)
+    hour, minute = int(m.group(1)), int(m.group(2) or 0)
+    if not (1 <= hour <= 12) or minute >= 60:
+        raise HoursParseError(f"invalid time '{text}'")
+    hour %= 12
+    if m.group(3) == "pm":
+        hour += 12
+    return hour * 60 + minute
+
+
+def parse_hours(hours_text: str) -> List[Tuple[int, int]]:
+    """
+    Weekly open intervals [start, end) in minutes since Monday 00:00.
+    An end past MINUTES_PER_WEEK wraps into Monday. Raises HoursParseError
+    on anything it does not understand (e.g. "Daily (varies)").
+    """
+    text = (hours_text or "").lower().replace("–", "-").replace("—", "-")
+    if not text.strip():
+        raise HoursParseError("empty hours_text")
+
+    intervals: List[Tuple[int, int]] = []
+    days: List[int] = []
+    days_used = True  # a day spec after ranges starts a new group
+    pos = 0
+    while pos < len(text):
+        m = _TOKEN.match(text, pos)
+        if m is None:
+            raise HoursParseError(f"unexpected text at '{text[pos:pos + 20]}'")
+        pos = m.end()
+
+        if m.group("days"):
+            if days_used:
+                days = []
+                days_used = False
+            days.extend(_parse_days(m.group("days")))
+        elif m.group("range"):
+            if not days:
+                raise HoursParseError(f"time range '{m.group('range')}' has no days")
+            start_text, end_text = re.split(r"\s*-\s*", m.group("range"), maxsplit=1)
+            start, end = _parse_time(start_text), _parse_time(end_text)
+            if end <= start:
+                end += MINUTES_PER_DAY
+            for d in days:
+                intervals.append((d * MINUTES_PER_DAY + start, d * MINUTES_PER_DAY + end))
+            days_used = True
+        elif m.group("closed"):
+            if not days:
+                raise HoursParseError("'closed' has no days")
+            days_used = True
+
+    if not intervals and not days:
+        raise HoursParseError("no days or times found")
+    if not days_used:
+        raise HoursParseError("days without hours at the end")
+    return intervals
+
+
+def compile_schedule(intervals: List[Tuple[int, int]]) -> bytes:
+    """
+    Bitmap of SLOTS_PER_WEEK bits (little-endian within each byte); slot s is
+    set when minute s * SLOT_MINUTES of the week falls inside an interval.
+    """
+    bits = 0
+    for start, end in intervals:
+        first = -(-start // SLOT_MINUTES)  # first slot starting at/after start
+        last = -(-end // SLOT_MINUTES)     # slots before this one start before end
+        for s in range(first, last):
+            bits |= 1 << (s % SLOTS_PER_WEEK)
+    return bits.to_bytes(SCHEDULE_BYTES, "little")
+
+
+def week_minute(weekday: int, hour: int, minute: int) -> int:
+    return weekday * MINUTES_PER_DAY + hour * 60 + minute
@@ -0,0 +1,142 @@
+"""
+Stage-one candidate retrieval for two-stage ranking.
+
+Exhaustive ranking multiplies the query into every row of the TF-IDF matrix
+and scores every row that passes the hard filters. Two-stage ranking reads
+only the posting lists (matrix columns, from a CSC copy) of the query's
+terms, keeps the `budget` matching rows with the best estimated score
+(lexical score plus the query-independent signals) and adds a fixed set of
+well-rated rows near campus, so queries with few or no matches still fill a
+page. Only those rows are scored in full, so the per-request cost follows
+how many rows the query's terms occur in, not the catalog size.
+
+The lexical scores are exactly tfidf_matrix @ q.T for the rows returned.
+
+The postings cover the matrix's built segment only; rows appended by
+incremental edits are scored straight from its delta segment, so an edit
+carries the postings over (appended()) instead of copying the matrix again.
+"""
+from typing import Any, Optional, Tuple
+
+import numpy as np
+from scipy import sparse
+
+try:
+    from server.indexing.segments import RowMatrix, SegmentedMatrix, append_rows
+    from server.scoring import W_DISTANCE, W_OPEN, W_RATING, W_TFIDF, SignalColumns, candidate_rows, top_k_indices, usable_mask
+except ImportError:
+    from indexing.segments import RowMatrix, SegmentedMatrix, append_rows
+    from scoring import W_DISTANCE, W_OPEN, W_RATING, W_TFIDF, SignalColumns, candidate_rows, top_k_indices, usable_mask
+
+
+def _prior(signals: SignalColumns, rows: Any = slice(None)) -> np.ndarray:
+    """The query-independent part of the final score (campus distance, heuristic open, rating) of rows."""
+    return W_DISTANCE * signals.distance[rows] + W_OPEN * signals.open[rows] + W_RATING * signals.rating[rows]
+
+
+class CandidateIndex:
+    def __init__(self, tfidf_matrix: RowMatrix, signals: SignalColumns):
+        self.tfidf_matrix = tfidf_matrix
+        self.signals = signals
+        self._set_segments(tfidf_matrix)
+        self._postings: Optional[sparse.csc_matrix] = None
+        self.prior = _prior(signals)
+        # rankable rows, best prior first; popular(n) takes a prefix
+        rows = candidate_rows(signals)
+        self.by_prior = rows[np.argsort(-self.prior[rows], kind="stable")]
+        # since appended(): how many by_prior rows may have been tombstoned,
+        # and the rankable rows appended, best prior first
+        self.dropped = 0
+        self.appended_by_prior = np.zeros(0, dtype=np.int64)
+
+    def _set_segments(self, tfidf_matrix: RowMatrix) -> None:
+        # the postings cover base (rows < n_indexed); delta holds the rest, or is None
+        if isinstance(tfidf_matrix, SegmentedMatrix):
+            self._base, self._delta = tfidf_matrix.base, tfidf_matrix.delta
+        else:
+            self._base, self._delta = tfidf_matrix, None
+        self.n_indexed = self._base.shape[0]
+
+    def appended(self, tfidf_matrix: RowMatrix, signals: SignalColumns, start: int, was_live: np.ndarray) -> "CandidateIndex":
+        """
+        This index after an edit that appended rows start.. and tombstoned
+        some earlier ones (was_live: the live flags before it). The postings
+        carry over while the matrix keeps its built segment; costs O(the new
+        rows) plus one pass over the live flags.
+        """
+        new = CandidateIndex.__new__(CandidateIndex)
+        new.__dict__.update(self.__dict__)
+        new.tfidf_matrix, new.signals = tfidf_matrix, signals
+        new._set_segments(tfidf_matrix)
+        if new._base is not self._base:
+            new._postings = None
+        rows = np.arange(start, len(signals.live))
+        new.prior = append_rows(self.prior, _prior(signals, rows))
+        live = np.asarray(signals.live, dtype=bool)
+        new.dropped = self.dropped + int(np.count_nonzero(np.asarray(was_live[:start], dtype=bool) & ~live[:start]))
+        added = np.concatenate([self.appended_by_prior, rows[usable_mask(signals, rows)]])
+        new.appended_by_prior = added[np.argsort(-new.prior[added], kind="stable")]
+        return new
+
+    @property
+    def postings(self) -> sparse.csc_matrix:
+        """term -> (rows, weights) of the built rows: one contiguous slice per column (copied on first use)."""
+        if self._postings is None:
+            self._postings = sparse.csc_matrix(self._base)
+        return self._postings
+
+    def popular(self, n: int) -> np.ndarray:
+        """The n rankable rows with the best prior, sorted by row."""
+        head = self.by_prior[:n + self.dropped]
+        head = head[usable_mask(self.signals, head)]
+        if len(self.appended_by_prior):
+            added = self.appended_by_prior[usable_mask(self.signals, self.appended_by_prior)][:n]
+            # appended rows come after every built row, so ties stay in row order
+            head = np.concatenate([head, added])
+            head = head[np.argsort(-self.prior[head], kind="stable")]
+        return np.sort(head[:n])
+
+    def lexical(self, query_vec: sparse.csr_matrix) -> Tuple[np.ndarray, np.ndarray]:
+        """(rows, scores): every row sharing a term with the 1 x V query_vec, rows sorted."""
+        q = sparse.csr_matrix(query_vec)
+        indptr, indices, data = self.postings.indptr, self.postings.indices, self.postings.data
+        row_parts, score_parts = [], []
+        for col, weight in zip(q.indices, q.data):
+            if col + 1 >= len(indptr):
+                continue
+            start, end = indptr[col], indptr[col + 1]
+            if start < end:
+                row_parts.append(indices[start:end])
+                score_parts.append(data[start:end] * weight)
+        if self._delta is not None and self._delta.shape[0]:
+            appended = (self._delta @ q[:, :self._delta.shape[1]].T).toarray().ravel()
+            hit = np.flatnonzero(appended)
+            row_parts.append(self.n_indexed + hit)
+            score_parts.append(appended[hit])
+        if not row_parts:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float64)
+
+        rows, inverse = np.unique(np.concatenate(row_parts), return_inverse=True)
+        scores = np.bincount(inverse, weights=np.concatenate(score_parts), minlength=len(rows))
+        return rows.astype(np.int64), scores
+
+    def select(self, rows: np.ndarray, similarity: np.ndarray, budget: int) -> np.ndarray:
+        """
+        Positions (sorted) of the budget rows with the best W_TFIDF * similarity
+        + prior, an estimate of the final score; ties in row order.
+        """
+        if len(rows) <= budget:
+            return np.arange(len(rows))
+        estimate = W_TFIDF * similarity + self.prior[rows]
+        return np.sort(top_k_indices(estimate, np.arange(len(rows)), budget))
+
+
+def merge_scores(
+    rows: np.ndarray, scores: np.ndarray, other_rows: np.ndarray, other_scores: np.ndarray
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Union of two sorted row sets; scores of rows in both are added."""
+    merged = np.union1d(rows, other_rows)
+    merged_scores = np.zeros(len(merged), dtype=np.float64)
+    merged_scores[np.searchsorted(merged, rows)] = scores
+    merged_scores[np.searchsorted(merged, other_rows)] += other_scores
+    return merged, merged_scores
@@ -0,0 +1,460 @@
+"""
+Columnar restaurant catalog.
+
+Instead of one dict per restaurant, every schema field is a column:
+
+    numbers   lat, lng, rating, price_level, review_count   float64
+    text      id, name, address, hours_text, ...             UTF-8 blob + offsets
+    lists     dietary_tags, cuisines, categories             interned ids + offsets
+
+plus one state byte per field and row (absent / null / value). Values that do
+not fit their column (a string lat, a non-string cuisine) and fields outside
+the schema are kept verbatim in a per-row extras dict, so a row always reads
+back exactly as it was loaded.
+
+Rows are read through RestaurantView, a two-slot, read-only Mapping created on
+demand; nothing per-row is stored. Catalogs are never mutated: appended() and
+take() return new ones.
+
+Each row's restaurant fields are also serialized to JSON once, when the row
+is added, in two parts (the compact view's fields and the rest), so responses
+are stitched from bytes instead of being re-encoded per request.
+"""
+from array import array
+from collections.abc import Mapping
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+try:
+    from server.indexing.segments import append_ragged, append_rows
+    from server.json_encoding import dumps_members
+    from server.scoring import get_number
+except ImportError:
+    from indexing.segments import append_ragged, append_rows
+    from json_encoding import dumps_members
+    from scoring import get_number
+
+NUMBER_FIELDS = ("rating", "price_level", "lat", "lng", "review_count")
+TEXT_FIELDS = ("id", "name", "address", "hours_text", "source", "phone", "menu_text")
+LIST_FIELDS = ("dietary_tags", "cuisines", "categories")
+# schema order (also the key order of RestaurantView)
+FIELDS = (
+    "id", "name", "dietary_tags", "rating", "price_level", "address", "lat", "lng",
+    "hours_text", "source", "review_count", "phone", "menu_text", "cuisines", "categories",
+)
+
+# Pre-serialized response parts: the compact view is "compact", the full view "compact" + "detail"
+COMPACT_FIELDS = ("id", "name", "dietary_tags", "rating", "price_level", "lat", "lng", "cuisines")
+DETAIL_FIELDS = tuple(f for f in FIELDS if f not in COMPACT_FIELDS)
+PAYLOAD_PARTS = {"compact": COMPACT_FIELDS, "detail": DETAIL_FIELDS}
+
+# state byte per (field, row); INT marks a number that was an int in the source
+ABSENT, NULL, FLOAT, INT = 0, 1, 2, 3
+VALUE = FLOAT  # text and list fields
+
+_NUMBER, _TEXT, _LIST = "number", "text", "list"
+_KIND = {
+    **{f: _NUMBER for f in NUMBER_FIELDS},
+    **{f: _TEXT for f in TEXT_FIELDS},
+    **{f: _LIST for f in LIST_FIELDS},
+}
+# ints beyond this lose precision in a float64 column, so they go to extras
+_MAX_EXACT_INT = 2 ** 53
+
+_MISSING = object()
+
+
+def response_value(r: Dict[str, Any], field: str) -> Any:
+    """A restaurant field as /recommend reports it."""
+    if field == "rating":
+        return get_number(r.get("rating"), 0.0)
+    if field == "dietary_tags":
+        return r.get("dietary_tags") or []
+    return r.get(field)
+
+
+def payload_members(r: Dict[str, Any], fields: Sequence[str]) -> bytes:
+    """JSON object members (no braces) for the given fields of r."""
+    return dumps_members({f: response_value(r, f) for f in fields})
+
+
+def _take_ragged(offsets: np.ndarray, data: np.ndarray, rows: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """offsets/data of the given rows of a ragged (offsets + data) column, in rows order."""
+    starts = offsets[rows]
+    lengths = offsets[rows + 1] - starts
+    new_offsets = np.zeros(len(rows) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=new_offsets[1:])
+    positions = np.repeat(starts - new_offsets[:-1], lengths) + np.arange(new_offsets[-1], dtype=np.int64)
+    return new_offsets, data[positions]
+
+
+class RestaurantView(Mapping):
+    """Read-only dict-like view of one catalog row."""
+
+    __slots__ = ("_catalog", "_row")
+
+    def __init__(self, catalog: "RestaurantCatalog", row: int):
+        self._catalog = catalog
+        self._row = row
+
+    def get(self, key: str, default: Any = None) -> Any:
+        return self._catalog.value(self._row, key, default)
+
+    def __getitem__(self, key: str) -> Any:
+        value = self._catalog.value(self._row, key, _MISSING)
+        if value is _MISSING:
+            raise KeyError(key)
+        return value
+
+    def __contains__(self, key: object) -> bool:
+        return self._catalog.value(self._row, key, _MISSING) is not _MISSING
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._catalog.keys(self._row))
+
+    def __len__(self) -> int:
+        return len(self._catalog.keys(self._row))
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {key: self[key] for key in self._catalog.keys(self._row)}
+
+    def __repr__(self) -> str:
+        return f"RestaurantView({self.to_dict()!r})"
+
+
+class CatalogBuilder:
+    """Accumulates rows one record at a time (typed arrays, no per-row objects)."""
+
+    def __init__(self):
+        self.size = 0
+        self._state = {f: array("b") for f in FIELDS}
+        self._numbers = {f: array("d") for f in NUMBER_FIELDS}
+        self._text_offsets = {f: array("q", [0]) for f in TEXT_FIELDS}
+        self._text_blobs = {f: bytearray() for f in TEXT_FIELDS}
+        self._list_offsets = {f: array("q", [0]) for f in LIST_FIELDS}
+        self._list_items = {f: array("i") for f in LIST_FIELDS}
+        self._string_ids: Dict[str, Dict[str, int]] = {f: {} for f in LIST_FIELDS}
+        self._extras: Dict[int, Dict[str, Any]] = {}
+        self._payload_offsets = {p: array("q", [0]) for p in PAYLOAD_PARTS}
+        self._payload_blobs = {p: bytearray() for p in PAYLOAD_PARTS}
+
+    def add(self, r: Dict[str, Any]) -> None:
+        row = self.size
+        extras: Dict[str, Any] = {}
+
+        for field in NUMBER_FIELDS:
+            value = r.get(field, _MISSING)
+            state = ABSENT
+            number = np.nan
+            if value is None:
+                state = NULL
+            elif type(value) is float:
+                state, number = FLOAT, value
+            elif type(value) is int and abs(value) <= _MAX_EXACT_INT:
+                state, number = INT, float(value)
+            elif value is not _MISSING:
+                extras[field] = value
+            self._state[field].append(state)
+            self._numbers[field].append(number)
+
+        for field in TEXT_FIELDS:
+            value = r.get(field, _MISSING)
+            state = ABSENT
+            if value is None:
+                state = NULL
+            elif isinstance(value, str):
+                state = VALUE
+                self._text_blobs[field] += value.encode("utf-8", "surrogatepass")
+            elif value is not _MISSING:
+                extras[field] = value
+            self._state[field].append(state)
+            self._text_offsets[field].append(len(self._text_blobs[field]))
+
+        for field in LIST_FIELDS:
+            value = r.get(field, _MISSING)
+            state = ABSENT
+            if value is None:
+                state = NULL
+            elif isinstance(value, list) and all(isinstance(v, str) for v in value):
+                state = VALUE
+                ids = self._string_ids[field]
+                self._list_items[field].extend(ids.setdefault(v, len(ids)) for v in value)
+            elif value is not _MISSING:
+                extras[field] = value
+            self._state[field].append(state)
+            self._list_offsets[field].append(len(self._list_items[field]))
+
+        for key, value in r.items():
+            if key not in _KIND:
+                extras[key] = value
+        if extras:
+            self._extras[row] = extras
+
+        for part, fields in PAYLOAD_PARTS.items():
+            self._payload_blobs[part] += payload_members(r, fields)
+            self._payload_offsets[part].append(len(self._payload_blobs[part]))
+        self.size += 1
+
+    def build(self) -> "RestaurantCatalog":
+        return RestaurantCatalog(
+            size=self.size,
+            state={f: np.array(col, dtype=np.int8) for f, col in self._state.items()},
+            numbers={f: np.array(col, dtype=np.float64) for f, col in self._numbers.items()},
+            text={
+                f: (np.array(self._text_offsets[f], dtype=np.int64), np.frombuffer(bytes(self._text_blobs[f]), dtype=np.uint8))
+                for f in TEXT_FIELDS
+            },
+            lists={
+                f: (np.array(self._list_offsets[f], dtype=np.int64), np.array(self._list_items[f], dtype=np.int32))
+                for f in LIST_FIELDS
+            },
+            strings={f: list(ids) for f, ids in self._string_ids.items()},
+            extras=dict(self._extras),
+            payloads={
+                p: (np.array(self._payload_offsets[p], dtype=np.int64), np.frombuffer(bytes(self._payload_blobs[p]), dtype=np.uint8))
+                for p in PAYLOAD_PARTS
+            },
+        )
+
+
+class RestaurantCatalog:
+    """The catalog as columns; indexable like a list of restaurant dicts. Never mutated."""
+
+    def __init__(
+        self,
+        *,
+        size: int,
+        state: Dict[str, np.ndarray],
+        numbers: Dict[str, np.ndarray],
+        text: Dict[str, Tuple[np.ndarray, np.ndarray]],
+        lists: Dict[str, Tuple[np.ndarray, np.ndarray]],
+        strings: Dict[str, List[str]],
+        extras: Dict[int, Dict[str, Any]],
+        payloads: Dict[str, Tuple[np.ndarray, np.ndarray]],
+        string_ids: Optional[Dict[str, Dict[str, int]]] = None,
+    ):
+        self.size = size
+        self._state = state
+        # NaN wherever the row has no number for the field
+        self._numbers = numbers
+        # field -> (offsets, utf-8 bytes) / (offsets, ids into strings[field])
+        self._text = text
+        self._lists = lists
+        self._strings = strings
+        self._extras = extras
+        # part -> (offsets, JSON members bytes), see PAYLOAD_PARTS
+        self._payloads = payloads
+        # field -> string -> id into strings[field], for appended()
+        self._string_ids = dict(string_ids or {})
+
+    @classmethod
+    def from_records(cls, records: Iterable[Dict[str, Any]]) -> "RestaurantCatalog":
+        builder = CatalogBuilder()
+        for r in records:
+            builder.add(r)
+        return builder.build()
+
+    # ----------------------------
+    # Row access
+    # ----------------------------
+    def __len__(self) -> int:
+        return self.size
+
+    def __getitem__(self, row: int) -> RestaurantView:
+        row = int(row)
+        if row < 0:
+            row += self.size
+        if not 0 <= row < self.size:
+            raise IndexError("restaurant row out of range")
+        return RestaurantView(self, row)
+
+    def __iter__(self) -> Iterator[RestaurantView]:
+        for row in range(self.size):
+            yield RestaurantView(self, row)
+
+    def value(self, row: int, field: str, default: Any = None) -> Any:
+        """One field of one row, as the original record had it (default when absent)."""
+        extras = self._extras.get(row)
+        if extras is not None and field in extras:
+            return extras[field]
+        kind = _KIND.get(field)
+        if kind is None:
+            return default
+
+        state = self._state[field][row]
+        if state == ABSENT:
+            return default
+        if state == NULL:
+            return None
+        if kind is _NUMBER:
+            number = self._numbers[field][row]
+            return int(number) if state == INT else float(number)
+        if kind is _TEXT:
+            offsets, blob = self._text[field]
+            return blob[offsets[row]:offsets[row + 1]].tobytes().decode("utf-8", "surrogatepass")
+        offsets, items = self._lists[field]
+        strings = self._strings[field]
+        return [strings[i] for i in items[offsets[row]:offsets[row + 1]]]
+
+    def payload(self, row: int, part: str) -> bytes:
+        """Pre-serialized JSON object members (no braces) of one PAYLOAD_PARTS part of a row."""
+        offsets, blob = self._payloads[part]
+        return blob[offsets[row]:offsets[row + 1]].tobytes()
+
+    def keys(self, row: int) -> List[str]:
+        keys = [f for f in FIELDS if self._state[f][row] != ABSENT]
+        extras = self._extras.get(row)
+        if extras:
+            keys.extend(k for k in extras if k not in keys)
+        return keys
+
+    # ----------------------------
+    # Columns
+    # ----------------------------
+    def numbers(self, field: str) -> np.ndarray:
+        """A number field for every row as float64 (NaN where missing or not a number). Read-only."""
+        return self._numbers[field]
+
+    @property
+    def nbytes(self) -> int:
+        """Approximate memory held by the columns (interned strings and extras not included)."""
+        total = sum(a.nbytes for a in self._state.values()) + sum(a.nbytes for a in self._numbers.values())
+        for offsets, data in [*self._text.values(), *self._lists.values(), *self._payloads.values()]:
+            total += offsets.nbytes + data.nbytes
+        return total
+
+    # ----------------------------
+    # Persistence
+    # ----------------------------
+    def to_arrays(self) -> Tuple[Dict[str, np.ndarray], Dict[str, Any]]:
+        """Flat name -> array mapping plus the JSON-able rest (string tables, extras)."""
+        arrays: Dict[str, np.ndarray] = {}
+        for f, col in self._state.items():
+            arrays[f"state_{f}"] = col
+        for f, col in self._numbers.items():
+            arrays[f"number_{f}"] = col
+        for prefix, ragged in (("text", self._text), ("list", self._lists), ("payload", self._payloads)):
+            for name, (offsets, data) in ragged.items():
+                arrays[f"{prefix}_{name}_offsets"] = offsets
+                arrays[f"{prefix}_{name}_data"] = data
+        meta = {
+            "size": self.size,
+            "strings": self._strings,
+            "extras": [[row, extras] for row, extras in self._extras.items()],
+        }
+        return arrays, meta
+
+    @classmethod
+    def from_arrays(cls, arrays: Dict[str, np.ndarray], meta: Dict[str, Any]) -> "RestaurantCatalog":
+        """Inverse of to_arrays(); arrays may be read-only memory maps (nothing is copied)."""
+        def ragged(prefix: str, names: Iterable[str]) -> Dict[str, Tuple[np.ndarray, np.ndarray]]:
+            return {n: (arrays[f"{prefix}_{n}_offsets"], arrays[f"{prefix}_{n}_data"]) for n in names}
+
+        return cls(
+            size=meta["size"],
+            state={f: arrays[f"state_{f}"] for f in FIELDS},
+            numbers={f: arrays[f"number_{f}"] for f in NUMBER_FIELDS},
+            text=ragged("text", TEXT_FIELDS),
+            lists=ragged("list", LIST_FIELDS),
+            strings={f: list(meta["strings"][f]) for f in LIST_FIELDS},
+            extras={int(row): extras for row, extras in meta["extras"]},
+            payloads=ragged("payload", PAYLOAD_PARTS),
+        )
+
+    # ----------------------------
+    # Derived catalogs
+    # ----------------------------
+    def take(self, rows: Union[Sequence[int], np.ndarray]) -> "RestaurantCatalog":
+        """New catalog of the given rows, in that order."""
+        rows = np.asarray(rows, dtype=np.int64)
+        extras: Dict[int, Dict[str, Any]] = {}
+        if self._extras:
+            for new_row in np.flatnonzero(np.isin(rows, list(self._extras))):
+                extras[int(new_row)] = self._extras[int(rows[new_row])]
+
+        return RestaurantCatalog(
+            size=len(rows),
+            state={f: col[rows] for f, col in self._state.items()},
+            numbers={f: col[rows] for f, col in self._numbers.items()},
+            text={f: _take_ragged(offsets, blob, rows) for f, (offsets, blob) in self._text.items()},
+            lists={f: _take_ragged(offsets, items, rows) for f, (offsets, items) in self._lists.items()},
+            strings=self._strings,
+            extras=extras,
+            payloads={p: _take_ragged(offsets, blob, rows) for p, (offsets, blob) in self._payloads.items()},
+        )
+
+    def appended(self, records: Iterable[Dict[str, Any]]) -> "RestaurantCatalog":
+        """
+        New catalog with records added as rows after the existing ones. Costs
+        O(records), not O(catalog): columns grow in place (indexing.segments)
+        and the string tables are only copied when a record brings a new string.
+        """
+        other = RestaurantCatalog.from_records(records)
+
+        lists = {}
+        strings = {}
+        string_ids = {}
+        for f, column in self._lists.items():
+            # re-intern the new rows' strings into this catalog's table
+            table, ids = self._strings[f], self._string_index(f)
+            new = [s for s in other._strings[f] if s not in ids]
+            if new:
+                table = table + new
+                ids = dict(ids)
+                ids.update((s, len(ids)) for s in new)
+            strings[f], string_ids[f] = table, ids
+            remap = np.array([ids[s] for s in other._strings[f]], dtype=np.int32)
+            other_offsets, other_items = other._lists[f]
+            lists[f] = append_ragged(column, (other_offsets, remap[other_items] if len(other_items) else other_items))
+
+        extras = self._extras
+        if other._extras:
+            extras = dict(extras)
+            extras.update({self.size + row: e for row, e in other._extras.items()})
+
+        return RestaurantCatalog(
+            size=self.size + other.size,
+            state={f: append_rows(col, other._state[f]) for f, col in self._state.items()},
+            numbers={f: append_rows(col, other._numbers[f]) for f, col in self._numbers.items()},
+            text={f: append_ragged(col, other._text[f]) for f, col in self._text.items()},
+            lists=lists,
+            strings=strings,
+            extras=extras,
+            payloads={p: append_ragged(col, other._payloads[p]) for p, col in self._payloads.items()},
+            string_ids=string_ids,
+        )
+
+    def _string_index(self, field: str) -> Dict[str, int]:
+        """string -> id for a list field's table (built on first use, shared by appended catalogs)."""
+        ids = self._string_ids.get(field)
+        if ids is None:
+            ids = self._string_ids[field] = {s: i for i, s in enumerate(self._strings[field])}
+        return ids
+
+
+def as_catalog(restaurants: Union[RestaurantCatalog, Iterable[Dict[str, Any]]]) -> RestaurantCatalog:
+    return restaurants if isinstance(restaurants, RestaurantCatalog) else RestaurantCatalog.from_records(restaurants)
+
+
+class IdLookup:
+    """restaurant id -> RestaurantView, resolved through id_to_index on each call."""
+
+    __slots__ = ("_catalog", "_id_to_index")
+
+    def __init__(self, catalog: RestaurantCatalog, id_to_index: Dict[str, int]):
+        self._catalog = catalog
+        self._id_to_index = id_to_index
+
+    def get(self, rid: str, default: Optional[RestaurantView] = None) -> Optional[RestaurantView]:
+        row = self._id_to_index.get(rid)
+        return default if row is None else self._catalog[row]
+
+    def __getitem__(self, rid: str) -> RestaurantView:
+        return self._catalog[self._id_to_index[rid]]
+
+    def __contains__(self, rid: object) -> bool:
+        return rid in self._id_to_index
+
+    def __len__(self) -> int:
+        return len(self._id_to_index)
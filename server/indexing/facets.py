@@ -0,0 +1,133 @@
+"""
+Per-value posting lists for the hard-filter facets.
+
+Each (facet, value) pair maps to the sorted row indices that carry it, so a
+conjunction of filters is an intersection of sorted arrays that starts from
+the shortest one: the cost follows the number of matches, not the catalog
+size. Values are lowercased; tombstoned rows are left in and filtered by the
+caller together with the other per-row checks, so an incremental edit only
+has to append its new row to the lists of that row's values (appended()).
+"""
+from typing import Any, Dict, Iterable, List, Optional
+
+import numpy as np
+
+try:
+    from server.indexing.segments import append_rows
+except ImportError:
+    from indexing.segments import append_rows
+
+FACET_FIELDS = ("dietary_tags", "price_level", "cuisines", "categories")
+
+
+def facet_values(field: str, raw: Any) -> List[str]:
+    """The values a record's field holds, as the postings key them."""
+    if field == "price_level":
+        return [str(raw)] if isinstance(raw, int) and not isinstance(raw, bool) else []
+    values: List[str] = []
+    for v in raw or []:
+        if isinstance(v, str):
+            # categories sometimes hold "Cafe, Healthy" in one entry
+            values.extend(p.strip().lower() for p in v.split(",") if p.strip())
+    return values
+
+
+def _rows_by_value(restaurants: List[Dict[str, Any]], start: int, stop: int) -> Dict[str, Dict[str, List[int]]]:
+    """field -> value -> rows, for the rows start..stop."""
+    rows: Dict[str, Dict[str, List[int]]] = {f: {} for f in FACET_FIELDS}
+    for i in range(start, stop):
+        r = restaurants[i]
+        for field in FACET_FIELDS:
+            for value in set(facet_values(field, r.get(field))):
+                rows[field].setdefault(value, []).append(i)
+    return rows
+
+
+def sorted_contains(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """Boolean mask over a: which elements occur in the sorted array b (O(len(a) * log(len(b))))."""
+    if len(b) == 0:
+        return np.zeros(len(a), dtype=bool)
+    pos = np.minimum(np.searchsorted(b, a), len(b) - 1)
+    return b[pos] == a
+
+
+def intersect_sorted(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """Intersection of two sorted unique arrays, probing the longer with the shorter."""
+    if len(a) > len(b):
+        a, b = b, a
+    return a[sorted_contains(a, b)]
+
+
+class FacetIndex:
+    """facet -> value -> sorted int64 rows. Never mutated."""
+
+    def __init__(self, restaurants: List[Dict[str, Any]]):
+        rows = _rows_by_value(restaurants, 0, len(restaurants))
+        self.postings: Dict[str, Dict[str, np.ndarray]] = {
+            field: {v: np.asarray(ids, dtype=np.int64) for v, ids in by_value.items()}
+            for field, by_value in rows.items()
+        }
+        self._empty = np.zeros(0, dtype=np.int64)
+
+    def appended(self, restaurants: List[Dict[str, Any]], start: int) -> "FacetIndex":
+        """
+        Postings for restaurants, whose rows before start are the ones self
+        was built over (later rows were appended by edits). Costs O(the new
+        rows), not a rebuild: only the lists they add to grow, in place.
+        """
+        new = FacetIndex.__new__(FacetIndex)
+        new._empty = self._empty
+        new.postings = {}
+        for field, by_value in _rows_by_value(restaurants, start, len(restaurants)).items():
+            postings = self.postings[field]
+            if by_value:
+                postings = dict(postings)
+                for value, ids in by_value.items():
+                    postings[value] = append_rows(postings.get(value, self._empty), np.asarray(ids, dtype=np.int64))
+            new.postings[field] = postings
+        return new
+
+    def rows(self, field: str, value: Any) -> np.ndarray:
+        return self.postings[field].get(str(value).strip().lower(), self._empty)
+
+    def any_of(self, field: str, values: Iterable[Any]) -> np.ndarray:
+        lists = [self.rows(field, v) for v in values]
+        lists = [l for l in lists if len(l)]
+        if not lists:
+            return self._empty
+        if len(lists) == 1:
+            return lists[0]
+        return np.unique(np.concatenate(lists))
+
+    def match(
+        self,
+        *,
+        dietary_required: Iterable[str] = (),
+        price_max: Optional[int] = None,
+        cuisines: Iterable[str] = (),
+        categories: Iterable[str] = (),
+    ) -> Optional[np.ndarray]:
+        """
+        Sorted rows that have every required dietary tag, a price_level <= price_max
+        and (when given) any of the cuisines / any of the categories.
+        None when no filter is given at all (every row qualifies).
+        """
+        lists: List[np.ndarray] = [self.rows("dietary_tags", t) for t in set(dietary_required)]
+        if price_max is not None:
+            lists.append(self.any_of("price_level", range(1, price_max + 1)))
+        cuisines = list(cuisines)
+        if cuisines:
+            lists.append(self.any_of("cuisines", cuisines))
+        categories = list(categories)
+        if categories:
+            lists.append(self.any_of("categories", categories))
+
+        if not lists:
+            return None
+        lists.sort(key=len)
+        result = lists[0]
+        for other in lists[1:]:
+            if len(result) == 0:
+                break
+            result = intersect_sorted(result, other)
+        return result
@@ -0,0 +1,234 @@
+"""
+Incremental edits to a TfidfIndex.
+
+Upserts append a row (a replaced restaurant's old row is tombstoned) and
+deletes only tombstone, so neither re-tokenizes or refits the catalog.
+Document frequencies are kept exact on every edit; the IDF used for
+weighting stays frozen between compactions, so every row and every query
+is weighted consistently. compact() drops tombstones, recomputes IDF from
+df and re-weights from the stored term counts, which yields exactly what a
+full refit over the live rows would. LSA vectors, when present, are folded
+in for upserted rows and refitted by compact().
+
+An edit costs O(the edited row), plus O(vocabulary) when it brings new
+terms, and one copy of the one-byte-per-row live flags: appended rows go
+into the delta segment of the TF-IDF and TF matrices and into growable
+columns, and the id map records only the changes (see indexing.segments).
+compact() merges all of that back into plain arrays.
+
+All functions return new objects and never mutate their inputs.
+"""
+from collections import Counter
+from typing import Any, Dict, List, Tuple, Union
+
+import numpy as np
+from scipy import sparse
+
+try:
+    from server.indexing.catalog import RestaurantCatalog, as_catalog
+    from server.indexing.index_store import TfidfIndex, fit_index, query_vectorizer, smooth_idf, weight_counts
+    from server.indexing.segments import append_matrix_rows, overlay
+    from server.indexing.semantic import fit_semantic
+    from server.indexing.text_builder import build_doc_text
+    from server.scoring import SignalColumns
+except ImportError:
+    from indexing.catalog import RestaurantCatalog, as_catalog
+    from indexing.index_store import TfidfIndex, fit_index, query_vectorizer, smooth_idf, weight_counts
+    from indexing.segments import append_matrix_rows, overlay
+    from indexing.semantic import fit_semantic
+    from indexing.text_builder import build_doc_text
+    from scoring import SignalColumns
+
+# Incoming catalogs may also be plain lists of dicts; results are always columnar.
+Restaurants = Union[RestaurantCatalog, List[Dict[str, Any]]]
+
+# Compact once tombstones make up this share of all rows ...
+COMPACT_DEAD_FRACTION = 0.25
+# ... or once this many edits (relative to live rows) happened under a frozen IDF.
+COMPACT_DRIFT_FRACTION = 0.10
+
+
+def upsert_restaurant(
+    index: TfidfIndex,
+    restaurants: Restaurants,
+    r: Dict[str, Any],
+) -> Tuple[TfidfIndex, RestaurantCatalog]:
+    """Add r, or replace the restaurant with the same id. r["id"] must be a string."""
+    rid = r["id"]
+    vocab = index.vectorizer.vocabulary
+    idf = index.vectorizer.idf_
+
+    counts = Counter(index.vectorizer.build_analyzer()(build_doc_text(r)))
+
+    new_terms = sorted(t for t in counts if t not in vocab)
+    if new_terms:
+        vocab = dict(vocab)
+        for t in new_terms:
+            vocab[t] = len(vocab)
+    n_terms = len(vocab)
+
+    df = np.zeros(n_terms, dtype=np.int64)
+    df[: len(index.df)] = index.df
+    # the one per-row column copied on every edit: a tombstone changes an existing row
+    live = np.append(np.asarray(index.signals.live, dtype=bool), True)
+
+    old_row = index.id_to_index.get(rid)
+    if old_row is not None:
+        df[index.tf_matrix[old_row].indices] -= 1
+        live[old_row] = False
+
+    cols = np.fromiter((vocab[t] for t in counts), dtype=np.int32, count=len(counts))
+    vals = np.fromiter(counts.values(), dtype=np.int32, count=len(counts))
+    order = np.argsort(cols)
+    cols, vals = cols[order], vals[order]
+    df[cols] += 1
+
+    n_live = int(np.count_nonzero(live))
+    if new_terms:
+        # existing terms keep their frozen IDF; brand-new terms get one from the current df
+        idf = np.concatenate([idf, smooth_idf(df[len(idf):], n_live)])
+        vectorizer = query_vectorizer(vocab, idf)
+    else:
+        vectorizer = index.vectorizer
+
+    row_tf = sparse.csr_matrix((vals, cols, np.array([0, len(cols)])), shape=(1, n_terms))
+    row_tfidf = weight_counts(row_tf, idf)
+
+    new_row = index.tfidf_matrix.shape[0]
+
+    updated = TfidfIndex(
+        vectorizer=vectorizer,
+        tfidf_matrix=append_matrix_rows(index.tfidf_matrix, row_tfidf),
+        tf_matrix=append_matrix_rows(index.tf_matrix, row_tf),
+        df=df,
+        id_to_index=overlay(index.id_to_index).updated(rid, new_row),
+        signals=index.signals.append(SignalColumns.build([r]), live=live),
+        data_hash="",  # no longer the content of the data file
+        edits_since_compaction=index.edits_since_compaction + 1,
+        semantic=index.semantic.appended(row_tfidf) if index.semantic is not None else None,
+    )
+    return updated, as_catalog(restaurants).appended([r])
+
+
+def delete_restaurant(
+    index: TfidfIndex,
+    restaurants: Restaurants,
+    rid: str,
+) -> Tuple[TfidfIndex, RestaurantCatalog]:
+    """Tombstone the row for rid. Raises KeyError if rid is not in the index."""
+    row = index.id_to_index[rid]
+
+    df = np.array(index.df, dtype=np.int64)
+    df[index.tf_matrix[row].indices] -= 1
+
+    live = np.array(index.signals.live, dtype=bool)
+    live[row] = False
+
+    updated = TfidfIndex(
+        vectorizer=index.vectorizer,
+        tfidf_matrix=index.tfidf_matrix,
+        tf_matrix=index.tf_matrix,
+        df=df,
+        id_to_index=overlay(index.id_to_index).updated(rid, None),
+        signals=index.signals.with_live(live),
+        data_hash="",
+        edits_since_compaction=index.edits_since_compaction + 1,
+        semantic=index.semantic,
+    )
+    return updated, as_catalog(restaurants)
+
+
+def needs_compaction(index: TfidfIndex) -> bool:
+    total = index.tfidf_matrix.shape[0]
+    if total == 0:
+        return False
+    live = index.live_count
+    dead = total - live
+    return (
+        dead > COMPACT_DEAD_FRACTION * total
+        or index.edits_since_compaction > COMPACT_DRIFT_FRACTION * max(live, 1)
+    )
+
+
+def compact(
+    index: TfidfIndex,
+    restaurants: Restaurants,
+) -> Tuple[TfidfIndex, RestaurantCatalog]:
+    """
+    Drop tombstoned rows and unused terms, sort the vocabulary and re-weight
+    every row with an IDF recomputed from df (no re-tokenizing). The result
+    holds plain arrays again (delta segments merged).
+    """
+    keep = np.flatnonzero(index.signals.live)
+    tf = index.tf_matrix[keep]
+
+    terms = index.vectorizer.get_feature_names_out()
+    df = np.bincount(tf.indices, minlength=tf.shape[1]).astype(np.int64)
+
+    used = np.flatnonzero(df > 0)
+    used = used[np.argsort(terms[used], kind="stable")]
+    colmap = np.full(tf.shape[1], -1, dtype=np.int32)
+    colmap[used] = np.arange(len(used), dtype=np.int32)
+
+    tf = sparse.csr_matrix((tf.data, colmap[tf.indices], tf.indptr), shape=(len(keep), len(used)))
+    tf.sort_indices()
+    df = df[used]
+    idf = smooth_idf(df, len(keep))
+
+    kept = as_catalog(restaurants).take(keep)
+    id_to_index = {}
+    for i, r in enumerate(kept):
+        rid = r.get("id")
+        if isinstance(rid, str):
+            id_to_index[rid] = i
+
+    tfidf_matrix = weight_counts(tf, idf)
+    semantic = index.semantic
+    compacted = TfidfIndex(
+        vectorizer=query_vectorizer({str(t): i for i, t in enumerate(terms[used])}, idf),
+        tfidf_matrix=tfidf_matrix,
+        tf_matrix=tf,
+        df=df,
+        id_to_index=id_to_index,
+        signals=index.signals.take(keep),
+        data_hash=index.data_hash,
+        semantic=fit_semantic(tfidf_matrix, semantic.dims, semantic.quantized) if semantic is not None else None,
+    )
+    return compacted, kept
+
+
+def consistency_report(index: TfidfIndex, restaurants: Restaurants) -> Dict[str, Any]:
+    """
+    Refit the live rows from scratch and compare against the incremental index.
+    max_abs_diff is 0 right after compact(); between compactions it measures IDF drift.
+    """
+    keep = np.flatnonzero(index.signals.live)
+    fresh = fit_index(as_catalog(restaurants).take(keep))
+
+    fresh_vocab = fresh.vectorizer.vocabulary
+    ours = index.tfidf_matrix[keep].tocoo()
+    terms = index.vectorizer.get_feature_names_out()
+
+    colmap = np.fromiter((fresh_vocab.get(str(t), -1) for t in terms), dtype=np.int64, count=len(terms))
+    mapped_cols = colmap[ours.col]
+    terms_match = bool(np.all(mapped_cols >= 0)) and int(np.count_nonzero(index.df)) == len(fresh_vocab)
+
+    known = colmap >= 0
+    expected_df = np.zeros(len(terms), dtype=np.int64)
+    expected_df[known] = fresh.df[colmap[known]]
+
+    max_abs_diff = None
+    if terms_match:
+        ours_mapped = sparse.csr_matrix(
+            (ours.data, (ours.row, mapped_cols)), shape=fresh.tfidf_matrix.shape
+        )
+        diff = abs(ours_mapped - fresh.tfidf_matrix)
+        max_abs_diff = float(diff.max()) if diff.nnz else 0.0
+
+    return {
+        "rows": int(len(keep)),
+        "terms": len(fresh_vocab),
+        "terms_match": terms_match,
+        "df_match": bool(np.array_equal(index.df, expected_df)),
+        "max_abs_diff": max_abs_diff,
+    }
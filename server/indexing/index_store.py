@@ -0,0 +1,354 @@
+import hashlib
+import json
+import os
+import shutil
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Mapping, Optional, Tuple
+
+import numpy as np
+from scipy import sparse
+from sklearn.feature_extraction.text import CountVectorizer, TfidfTransformer, TfidfVectorizer
+
+try:
+    from server.indexing.catalog import CatalogBuilder, RestaurantCatalog, as_catalog
+    from server.indexing.segments import RowMatrix, as_csr
+    from server.indexing.semantic import SemanticIndex, fit_semantic, semantic_matches
+    from server.indexing.text_builder import build_doc_text
+    from server.scoring import CAMPUS_LAT, CAMPUS_LNG, MAX_DISTANCE_MILES, SignalColumns, SignalColumnsBuilder
+except ImportError:
+    from indexing.catalog import CatalogBuilder, RestaurantCatalog, as_catalog
+    from indexing.segments import RowMatrix, as_csr
+    from indexing.semantic import SemanticIndex, fit_semantic, semantic_matches
+    from indexing.text_builder import build_doc_text
+    from scoring import CAMPUS_LAT, CAMPUS_LNG, MAX_DISTANCE_MILES, SignalColumns, SignalColumnsBuilder
+
+# Bump whenever the on-disk layout or the meaning of a stored array changes.
+INDEX_FORMAT_VERSION = 4
+
+STOP_WORDS = "english"
+
+# Signal columns bake these in, so an artifact built with other values is stale.
+SIGNAL_PARAMS = {
+    "campus_lat": CAMPUS_LAT,
+    "campus_lng": CAMPUS_LNG,
+    "max_distance_miles": MAX_DISTANCE_MILES,
+}
+
+
+class TfidfIndex:
+    """
+    Everything /recommend needs from one build of the catalog.
+
+    tf_matrix holds the raw term counts behind tfidf_matrix (same sparsity
+    pattern) and df the document frequency of every column over live rows,
+    so rows can be added, removed and re-weighted without re-tokenizing.
+    semantic, when fitted, holds the LSA vectors of the same rows.
+    After incremental edits the matrices are SegmentedMatrix (base + delta)
+    and id_to_index an OverlayMap; compaction turns them back into a CSR
+    matrix and a dict.
+    """
+
+    def __init__(
+        self,
+        *,
+        vectorizer: TfidfVectorizer,
+        tfidf_matrix: RowMatrix,
+        tf_matrix: RowMatrix,
+        df: np.ndarray,
+        id_to_index: Mapping[str, int],
+        signals: SignalColumns,
+        data_hash: str = "",
+        edits_since_compaction: int = 0,
+        semantic: Optional[SemanticIndex] = None,
+    ):
+        self.vectorizer = vectorizer
+        self.tfidf_matrix = tfidf_matrix
+        self.tf_matrix = tf_matrix
+        self.df = df
+        self.id_to_index = id_to_index
+        self.signals = signals
+        self.data_hash = data_hash
+        self.edits_since_compaction = edits_since_compaction
+        self.semantic = semantic
+
+    @property
+    def live_count(self) -> int:
+        return int(np.count_nonzero(self.signals.live))
+
+
+# ----------------------------
+# Building
+# ----------------------------
+def data_file_hash(path: Path) -> str:
+    """sha256 of the catalog file contents (the artifact cache key)."""
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def smooth_idf(df: np.ndarray, n_docs: int) -> np.ndarray:
+    """Same formula as TfidfVectorizer(smooth_idf=True)."""
+    return np.log((n_docs + 1) / (df.astype(np.float64) + 1)) + 1
+
+
+def weight_counts(tf_matrix: sparse.csr_matrix, idf: np.ndarray) -> sparse.csr_matrix:
+    """tf * idf, L2-normalized per row (keeps tf_matrix's sparsity pattern)."""
+    transformer = TfidfTransformer()
+    transformer.idf_ = idf
+    return sparse.csr_matrix(transformer.transform(tf_matrix.astype(np.float64)))
+
+
+def query_vectorizer(vocabulary: Dict[str, int], idf: np.ndarray) -> TfidfVectorizer:
+    """A TfidfVectorizer that transforms queries against a fixed vocabulary and IDF."""
+    vectorizer = TfidfVectorizer(stop_words=STOP_WORDS, vocabulary=vocabulary)
+    vectorizer.idf_ = np.asarray(idf, dtype=np.float64)
+    return vectorizer
+
+
+def fit_index(restaurants: Iterable[Dict[str, Any]], data_hash: str = "") -> TfidfIndex:
+    return fit_index_stream(restaurants, data_hash)[0]
+
+
+def fit_index_stream(
+    records: Iterable[Dict[str, Any]], data_hash: str = ""
+) -> Tuple[TfidfIndex, RestaurantCatalog]:
+    """
+    Fit in a single pass over records, which may be a one-shot stream (e.g.
+    iter_restaurants): each record is turned into doc text, signal values and
+    a catalog row as soon as it is parsed, then dropped, so neither the
+    records nor a list of document texts is ever held.
+    Returns the index and the columnar catalog in row order.
+    """
+    catalog = CatalogBuilder()
+    id_to_index: Dict[str, int] = {}
+    signals = SignalColumnsBuilder()
+
+    def corpus() -> Iterator[str]:
+        for r in records:
+            rid = r.get("id")
+            if isinstance(rid, str):
+                id_to_index[rid] = catalog.size
+            catalog.add(r)
+            signals.add(r)
+            yield build_doc_text(r)
+
+    counter = CountVectorizer(stop_words=STOP_WORDS)
+    tf_matrix = sparse.csr_matrix(counter.fit_transform(corpus()), dtype=np.int32)
+    tf_matrix.sort_indices()
+
+    df = np.bincount(tf_matrix.indices, minlength=tf_matrix.shape[1]).astype(np.int64)
+    idf = smooth_idf(df, catalog.size)
+
+    index = TfidfIndex(
+        vectorizer=query_vectorizer(counter.vocabulary_, idf),
+        tfidf_matrix=weight_counts(tf_matrix, idf),
+        tf_matrix=tf_matrix,
+        df=df,
+        id_to_index=id_to_index,
+        signals=signals.build(),
+        data_hash=data_hash,
+    )
+    return index, catalog.build()
+
+
+# ----------------------------
+# On-disk artifact
+#
+#   <index_dir>/tfidf-v<format>-<hash[:16]>/
+#       manifest.json        format version, full data hash, shapes
+#       vocabulary.json      terms in column order
+#       cuisines.json        cuisine terms in column order
+#       ids.json             restaurant id per row (null if missing)
+#       *.npy                idf, CSR arrays and signal columns (mmap-able)
+# ----------------------------
+def artifact_dir(index_dir: Path, data_hash: str) -> Path:
+    return Path(index_dir) / f"tfidf-v{INDEX_FORMAT_VERSION}-{data_hash[:16]}"
+
+
+def _write_json(path: Path, obj: Any) -> None:
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(obj, f)
+
+
+def _read_json(path: Path) -> Any:
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_index(index: TfidfIndex, index_dir: Path) -> Path:
+    """Write the artifact for index.data_hash; the final directory appears atomically."""
+    if not index.data_hash:
+        raise ValueError("save_index needs an index built with a data_hash")
+
+    final_dir = artifact_dir(index_dir, index.data_hash)
+    tmp_dir = final_dir.with_name(f".{final_dir.name}.tmp-{os.getpid()}")
+    if tmp_dir.exists():
+        shutil.rmtree(tmp_dir)
+    tmp_dir.mkdir(parents=True)
+
+    write_index_files(index, tmp_dir)
+
+    if final_dir.exists():
+        shutil.rmtree(final_dir)
+    os.replace(tmp_dir, final_dir)
+    return final_dir
+
+
+def write_index_files(
+    index: TfidfIndex,
+    directory: Path,
+    extra_arrays: Optional[Dict[str, np.ndarray]] = None,
+) -> None:
+    """
+    Write the artifact files into directory (which must exist). extra_arrays
+    are stored alongside, as extra_<name>.npy, for callers that persist more.
+    """
+    matrix = as_csr(index.tfidf_matrix)
+    vocab = index.vectorizer.get_feature_names_out().tolist()
+
+    ids: List[Optional[str]] = [None] * matrix.shape[0]
+    for rid, idx in index.id_to_index.items():
+        ids[idx] = rid
+
+    arrays = {
+        "idf": index.vectorizer.idf_,
+        "tfidf_data": matrix.data,
+        "tfidf_indices": matrix.indices,
+        "tfidf_indptr": matrix.indptr,
+        "tf_data": as_csr(index.tf_matrix).data,
+        "df": index.df,
+    }
+    arrays.update({f"signal_{k}": v for k, v in index.signals.to_arrays().items()})
+    if index.semantic is not None:
+        arrays.update({f"semantic_{k}": v for k, v in index.semantic.to_arrays().items()})
+    arrays.update({f"extra_{k}": v for k, v in (extra_arrays or {}).items()})
+    for name, arr in arrays.items():
+        np.save(directory / f"{name}.npy", np.ascontiguousarray(arr))
+
+    _write_json(directory / "vocabulary.json", vocab)
+    _write_json(directory / "cuisines.json", index.signals.cuisine_terms())
+    _write_json(directory / "ids.json", ids)
+    # Manifest last: a directory without it is never treated as valid.
+    _write_json(directory / "manifest.json", {
+        "format_version": INDEX_FORMAT_VERSION,
+        "data_hash": index.data_hash,
+        "n_docs": int(matrix.shape[0]),
+        "n_terms": int(matrix.shape[1]),
+        "nnz": int(matrix.nnz),
+        "stop_words": STOP_WORDS,
+        "signal_params": SIGNAL_PARAMS,
+        "arrays": sorted(arrays),
+        "built_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+    })
+
+
+def load_index(index_dir: Path, data_hash: str) -> Optional[TfidfIndex]:
+    """
+    Memory-map the artifact for data_hash.
+    Returns None when there is no usable artifact (missing, stale or unreadable).
+    """
+    loaded = read_index_files(artifact_dir(index_dir, data_hash), data_hash)
+    return None if loaded is None else loaded[0]
+
+
+def read_index_files(path: Path, data_hash: str) -> Optional[Tuple[TfidfIndex, Dict[str, np.ndarray]]]:
+    """
+    Memory-map the artifact files in path: the index plus its extra arrays
+    (see write_index_files). None when missing, stale or unreadable.
+    """
+    manifest_path = path / "manifest.json"
+    if not manifest_path.exists():
+        return None
+
+    try:
+        manifest = _read_json(manifest_path)
+        if (
+            manifest.get("format_version") != INDEX_FORMAT_VERSION
+            or manifest.get("data_hash") != data_hash
+            or manifest.get("stop_words") != STOP_WORDS
+            or manifest.get("signal_params") != SIGNAL_PARAMS
+        ):
+            return None
+
+        arrays = {name: np.load(path / f"{name}.npy", mmap_mode="r") for name in manifest["arrays"]}
+        vocab = _read_json(path / "vocabulary.json")
+        cuisines = _read_json(path / "cuisines.json")
+        ids = _read_json(path / "ids.json")
+    except (OSError, ValueError, KeyError) as e:
+        print(f"Ignoring unreadable index artifact at {path}: {e}")
+        return None
+
+    shape = (manifest["n_docs"], manifest["n_terms"])
+    tfidf_matrix = sparse.csr_matrix(
+        (arrays["tfidf_data"], arrays["tfidf_indices"], arrays["tfidf_indptr"]),
+        shape=shape,
+        copy=False,
+    )
+    # counts share the index arrays of the weighted matrix
+    tf_matrix = sparse.csr_matrix(
+        (arrays["tf_data"], arrays["tfidf_indices"], arrays["tfidf_indptr"]),
+        shape=shape,
+        copy=False,
+    )
+
+    signal_arrays = {
+        name[len("signal_"):]: arr for name, arr in arrays.items() if name.startswith("signal_")
+    }
+
+    extra_arrays = {
+        name[len("extra_"):]: arr for name, arr in arrays.items() if name.startswith("extra_")
+    }
+
+    semantic_arrays = {
+        name[len("semantic_"):]: arr for name, arr in arrays.items() if name.startswith("semantic_")
+    }
+
+    index = TfidfIndex(
+        vectorizer=query_vectorizer({term: i for i, term in enumerate(vocab)}, arrays["idf"]),
+        tfidf_matrix=tfidf_matrix,
+        tf_matrix=tf_matrix,
+        df=arrays["df"],
+        id_to_index={rid: i for i, rid in enumerate(ids) if isinstance(rid, str)},
+        signals=SignalColumns.from_arrays(signal_arrays, cuisines),
+        data_hash=data_hash,
+        semantic=SemanticIndex.from_arrays(semantic_arrays) if semantic_arrays else None,
+    )
+    return index, extra_arrays
+
+
+def ensure_semantic(index: TfidfIndex, lsa_dims: int, lsa_quantize: bool = False) -> TfidfIndex:
+    """
+    Fit (or drop) index.semantic so it matches the requested LSA settings;
+    lsa_dims=0 means no semantic vectors. Vectors loaded from an artifact
+    with the same settings are kept.
+    """
+    if lsa_dims <= 0:
+        index.semantic = None
+    elif not semantic_matches(index.semantic, lsa_dims, lsa_quantize, index.tfidf_matrix.shape):
+        index.semantic = fit_semantic(index.tfidf_matrix, lsa_dims, lsa_quantize)
+    return index
+
+
+def load_or_fit_index(
+    restaurants: Iterable[Dict[str, Any]],
+    data_hash: str,
+    index_dir: Optional[Path],
+    lsa_dims: int = 0,
+    lsa_quantize: bool = False,
+) -> Tuple[TfidfIndex, RestaurantCatalog]:
+    """
+    Use the persisted artifact when it matches data_hash, otherwise refit in
+    memory (in the same pass that reads restaurants when it is a stream).
+    Returns the index and the restaurants as a columnar catalog.
+    """
+    if index_dir is not None and data_hash:
+        index = load_index(index_dir, data_hash)
+        if index is not None:
+            restaurants = as_catalog(restaurants)
+            if index.tfidf_matrix.shape[0] == len(restaurants):
+                return ensure_semantic(index, lsa_dims, lsa_quantize), restaurants
+    index, catalog = fit_index_stream(restaurants, data_hash)
+    return ensure_semantic(index, lsa_dims, lsa_quantize), catalog
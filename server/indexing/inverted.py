@@ -0,0 +1,341 @@
+"""
+Native inverted index with BM25 scoring (the "bm25" ranking engine).
+
+Each term's postings are a contiguous slice of three parallel arrays: row
+ids (sorted), boosted term frequencies (sum over fields of boost * count)
+and the precomputed BM25 impact of the term in that row. Fields come from
+build_doc_fields, so documents are the same text TF-IDF indexes, tokenized
+with the same vocabulary and stop words; only the weighting differs:
+
+    impact(t, d) = idf(t) * tf * (k1 + 1) / (tf + k1 * (1 - b + b * len(d) / avg_len))
+
+where tf and len(d) count name / cuisine / dietary words more than menu text.
+
+top() finds the k best rows with MaxScore-style upper bounds: the exact
+scores of each term's k highest-impact rows give a lower bound on the k-th
+best final score, and each term's max impact bounds what it can add. Every
+term also has its postings in impact order, so the postings that could
+still start a top-k row (impact above the term's cutoff) are a prefix found
+by binary search. Only those rows are scored, by binary-searching the other
+posting lists; terms whose bounds are too small contribute no prefix at all.
+When the bounds prune too little (several terms of similar weight), every
+posting is scored once instead.
+
+Scores are divided by the query's upper bound (the sum of its terms' max
+impacts), so they lie in [0, 1] like the TF-IDF cosine they stand in for.
+
+Rows appended by incremental edits (appended()) are not merged into the
+postings, which would copy them: their impacts, computed with the idf and
+average length frozen at build time, go to a delta matrix that every query
+scores in full next to the postings. It stays small because compaction
+rebuilds the snapshot, and with it this index.
+"""
+from typing import Dict, Iterable, Optional, Sequence, Tuple
+
+import numpy as np
+from scipy import sparse
+from sklearn.feature_extraction.text import CountVectorizer
+
+try:
+    from server.indexing.segments import RowMatrix, append_matrix_rows
+    from server.indexing.text_builder import DOC_FIELDS, build_doc_fields
+    from server.scoring import top_k_indices
+except ImportError:
+    from indexing.segments import RowMatrix, append_matrix_rows
+    from indexing.text_builder import DOC_FIELDS, build_doc_fields
+    from scoring import top_k_indices
+
+# Per-field term frequency multipliers (fields missing here count once)
+FIELD_BOOSTS = {
+    "name": 3.0,
+    "cuisines": 2.0,
+    "categories": 1.0,
+    "menu_text": 1.0,
+    "dietary": 1.5,
+}
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+
+class InvertedIndex:
+    def __init__(
+        self,
+        *,
+        vocabulary: Dict[str, int],
+        stop_words,
+        offsets: np.ndarray,
+        rows: np.ndarray,
+        tfs: np.ndarray,
+        doc_len: np.ndarray,
+        k1: float = BM25_K1,
+        b: float = BM25_B,
+    ):
+        # queries are tokenized exactly like the documents
+        self.counter = CountVectorizer(stop_words=stop_words, vocabulary=vocabulary)
+        self.n_rows = len(doc_len)
+        # rows in the postings; later ones (appended()) are in delta
+        self.n_indexed = self.n_rows
+        self.k1, self.b = k1, b
+        # postings of term t: rows[offsets[t]:offsets[t + 1]] (sorted), tfs alongside
+        self.offsets = offsets
+        self.rows = rows
+        self.tfs = tfs
+        self.doc_len = doc_len
+
+        df = np.diff(offsets)
+        self.idf = np.log1p((self.n_rows - df + 0.5) / (df + 0.5))
+        avg_len = float(doc_len.mean()) if self.n_rows and doc_len.any() else 1.0
+        self.avg_len = avg_len
+        norm = k1 * (1.0 - b + b * doc_len / avg_len)
+        term_of = np.repeat(np.arange(len(df)), df)
+        self.impacts = (self.idf[term_of] * tfs * (k1 + 1.0) / (tfs + norm[rows])).astype(np.float32)
+        # upper bound of each term's contribution (0 for terms without postings)
+        self.max_impact = np.zeros(len(df), dtype=np.float32)
+        np.maximum.at(self.max_impact, term_of, self.impacts)
+        # positions of each term's postings by impact, highest first (same slices as rows)
+        self.by_impact = np.lexsort((-self.impacts, term_of)).astype(np.int64)
+        # impacts of the appended rows (row n_indexed + i is row i), or None
+        self.delta: Optional[RowMatrix] = None
+
+    @classmethod
+    def build(
+        cls,
+        restaurants: Iterable[Dict],
+        vocabulary: Dict[str, int],
+        stop_words,
+        boosts: Optional[Dict[str, float]] = None,
+    ) -> "InvertedIndex":
+        """Index restaurants (in row order) against a fixed vocabulary."""
+        counter = CountVectorizer(stop_words=stop_words, vocabulary=vocabulary)
+        weighted = _weighted_counts(counter, restaurants, FIELD_BOOSTS if boosts is None else boosts)
+        postings = sparse.csc_matrix(weighted, dtype=np.float32)
+        postings.sort_indices()
+        return cls(
+            vocabulary=vocabulary,
+            stop_words=stop_words,
+            offsets=postings.indptr.astype(np.int64),
+            rows=postings.indices.astype(np.int32),
+            tfs=postings.data,
+            doc_len=np.asarray(weighted.sum(axis=1), dtype=np.float32).ravel(),
+        )
+
+    def appended(
+        self,
+        restaurants: Sequence[Dict],
+        start: int,
+        vocabulary: Dict[str, int],
+        boosts: Optional[Dict[str, float]] = None,
+    ) -> "InvertedIndex":
+        """
+        This index plus rows start.. of restaurants (the rows appended since
+        it was built or last appended to), against vocabulary (this one's,
+        possibly with new terms at the end); O(the new rows), plus
+        O(vocabulary) for the max impacts. Terms the index has not seen get
+        their idf from the new rows and keep it, like the TF-IDF side.
+        """
+        counter = self.counter
+        if vocabulary is not counter.vocabulary:
+            counter = CountVectorizer(stop_words=counter.stop_words, vocabulary=vocabulary)
+            # vocabulary extends the one already checked: skip sklearn's O(vocabulary) validation
+            counter.vocabulary_, counter.fixed_vocabulary_ = vocabulary, True
+        new_rows = [restaurants[row] for row in range(start, len(restaurants))]
+        weighted = _weighted_counts(counter, new_rows, FIELD_BOOSTS if boosts is None else boosts).tocsr()
+        n_terms = max(len(vocabulary), len(self.idf))
+
+        idf = self.idf
+        if n_terms > len(idf):
+            df = np.bincount(weighted.indices, minlength=n_terms)[len(idf):]
+            idf = np.concatenate([idf, np.log1p((self.n_rows + len(new_rows) - df + 0.5) / (df + 0.5))])
+        doc_len = np.asarray(weighted.sum(axis=1), dtype=np.float32).ravel()
+        norm = self.k1 * (1.0 - self.b + self.b * doc_len / self.avg_len)
+        tfs = weighted.data
+        row_of = np.repeat(np.arange(len(new_rows)), np.diff(weighted.indptr))
+        impacts = sparse.csr_matrix(
+            ((idf[weighted.indices] * tfs * (self.k1 + 1.0) / (tfs + norm[row_of])).astype(np.float32),
+             weighted.indices, weighted.indptr),
+            shape=(len(new_rows), n_terms),
+        )
+
+        new = InvertedIndex.__new__(InvertedIndex)
+        new.__dict__.update(self.__dict__)
+        new.counter = counter
+        new.n_rows = self.n_rows + len(new_rows)
+        new.idf = idf
+        new.max_impact = np.zeros(n_terms, dtype=np.float32)
+        new.max_impact[:len(self.max_impact)] = self.max_impact
+        np.maximum.at(new.max_impact, impacts.indices, impacts.data)
+        if self.delta is None:
+            new.delta = append_matrix_rows(sparse.csr_matrix((0, n_terms), dtype=np.float32), impacts)
+        else:
+            new.delta = append_matrix_rows(self.delta, impacts)
+        return new
+
+    # ----------------------------
+    # Queries
+    # ----------------------------
+    def query_terms(self, text: str) -> Tuple[np.ndarray, np.ndarray]:
+        """(term ids, query term counts) of text's in-vocabulary terms that have postings."""
+        q = sparse.csr_matrix(self.counter.transform([text]))
+        terms, counts = q.indices, q.data.astype(np.float64)
+        has_postings = self.max_impact[terms] > 0
+        return terms[has_postings], counts[has_postings]
+
+    def _postings(self, term: int) -> Tuple[np.ndarray, np.ndarray]:
+        start, end = self._span(term)
+        return self.rows[start:end], self.impacts[start:end]
+
+    def _span(self, term: int) -> Tuple[int, int]:
+        """Where term's postings are in rows (and by_impact); empty for terms added after the build."""
+        if term + 1 >= len(self.offsets):
+            return 0, 0
+        return int(self.offsets[term]), int(self.offsets[term + 1])
+
+    def _delta_scores(self, terms: np.ndarray, counts: np.ndarray) -> Optional[np.ndarray]:
+        """Unscaled scores of the appended rows, or None when there are none."""
+        if self.delta is None:
+            return None
+        query = np.zeros(self.delta.shape[1], dtype=np.float64)
+        query[terms] = counts
+        return np.asarray(self.delta @ query, dtype=np.float64)
+
+    def similarity(self, text: str) -> np.ndarray:
+        """Scaled BM25 score of every row (every posting of the query's terms is scored)."""
+        out = np.zeros(self.n_rows, dtype=np.float64)
+        terms, counts = self.query_terms(text)
+        for term, count in zip(terms, counts):
+            rows, impacts = self._postings(term)
+            out[rows] += count * impacts
+        delta = self._delta_scores(terms, counts)
+        if delta is not None:
+            out[self.n_indexed:] += delta
+        bound = float(np.dot(counts, self.max_impact[terms]))
+        return out / bound if bound > 0 else out
+
+    def score_rows(self, text: str, rows: np.ndarray) -> np.ndarray:
+        """Scaled BM25 scores of the sorted rows only (posting lists are binary-searched)."""
+        terms, counts = self.query_terms(text)
+        out = self._exact(rows, terms, counts)
+        bound = float(np.dot(counts, self.max_impact[terms]))
+        return out / bound if bound > 0 else out
+
+    def top(self, text: str, k: int, stats: Optional[Dict[str, int]] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        (rows, scaled scores) of the k best rows by BM25 (ties in row order),
+        rows sorted; rows with score 0 are never returned. stats, when given,
+        receives how many postings were scored in full vs. exist for the query.
+        """
+        empty = np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float64)
+        terms, counts = self.query_terms(text)
+        if k <= 0 or len(terms) == 0:
+            return empty
+
+        bounds = counts * self.max_impact[terms]
+        order = np.argsort(-bounds, kind="stable")
+        terms, counts, bounds = terms[order], counts[order], bounds[order]
+        # rest[i]: the most that terms i.. can still add to any row
+        rest = np.concatenate([np.cumsum(bounds[::-1])[::-1], [0.0]])
+
+        # theta: a lower bound on the final k-th best score, from the exact
+        # scores of each term's k highest-impact rows
+        seeds = _unique([
+            self.rows[self.by_impact[start:min(start + k, end)]] for start, end in map(self._span, terms)
+        ])
+        theta = _kth(self._exact(seeds, terms, counts), k) if len(seeds) >= k else 0.0
+
+        # A row whose first (strongest) term is terms[i] scores at most its
+        # impact there plus rest[i + 1], so only the postings of terms[i] with
+        # an impact of at least (theta - rest[i + 1]) / count can start a
+        # top-k row: a prefix of its impact-ordered postings.
+        entry_parts = []
+        for i, (term, count) in enumerate(zip(terms, counts)):
+            need = (theta - rest[i + 1]) / count
+            order = self.by_impact[slice(*self._span(term))]
+            entry_parts.append(self.rows[order[:self._count_at_least(order, need)]])
+
+        total = int(sum(end - start for start, end in map(self._span, terms)))
+        # appended rows are few: all of them are scored
+        delta = self._delta_scores(terms, counts)
+        if sum(len(part) for part in entry_parts) * len(terms) < total:
+            rows = _unique(entry_parts)
+            scores = self._exact(rows, terms, counts)
+            if delta is not None:
+                hit = np.flatnonzero(delta)
+                rows = np.concatenate([rows, self.n_indexed + hit])
+                scores = np.concatenate([scores, delta[hit]])
+        else:
+            # the bounds prune too little: probing would cost more than
+            # scoring every posting once
+            entry_parts = [self._postings(t)[0] for t in terms]
+            dense = np.zeros(self.n_rows, dtype=np.float64)
+            for term, count in zip(terms, counts):
+                term_rows, impacts = self._postings(term)
+                dense[term_rows] += count * impacts
+            if delta is not None:
+                dense[self.n_indexed:] += delta
+            rows = np.flatnonzero(dense)
+            scores = dense[rows]
+
+        if stats is not None:
+            stats["scored_postings"] = int(sum(len(part) for part in entry_parts))
+            stats["postings"] = total
+
+        keep = np.sort(top_k_indices(scores, np.arange(len(rows)), k))
+        return rows[keep], scores[keep] / rest[0]
+
+    def _exact(self, rows: np.ndarray, terms: np.ndarray, counts: np.ndarray) -> np.ndarray:
+        """Unscaled scores of the sorted rows, binary-searching every posting list."""
+        scores = np.zeros(len(rows), dtype=np.float64)
+        for term, count in zip(terms, counts):
+            _add_probed(scores, rows, *self._postings(term), count)
+        appended = rows >= self.n_indexed
+        if appended.any():
+            scores[appended] += self._delta_scores(terms, counts)[rows[appended] - self.n_indexed]
+        return scores
+
+    def _count_at_least(self, order: np.ndarray, need: float) -> int:
+        """How many postings (positions order, impact descending) have an impact >= need."""
+        if need <= 0:
+            return len(order)
+        lo, hi = 0, len(order)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.impacts[order[mid]] >= need:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+
+def _weighted_counts(counter: CountVectorizer, restaurants: Iterable[Dict], boosts: Dict[str, float]) -> sparse.spmatrix:
+    """Boosted term counts of restaurants (rows) summed over the document fields."""
+    texts: Dict[str, list] = {field: [] for field in DOC_FIELDS}
+    for r in restaurants:
+        for field, text in build_doc_fields(r).items():
+            texts[field].append(text)
+    weighted = None
+    for field in DOC_FIELDS:
+        counts = counter.transform(texts[field]).astype(np.float32) * boosts.get(field, 1.0)
+        weighted = counts if weighted is None else weighted + counts
+    return weighted
+
+
+def _kth(scores: np.ndarray, k: int) -> float:
+    """k-th largest of scores (len(scores) >= k)."""
+    return float(np.partition(scores, len(scores) - k)[len(scores) - k])
+
+
+def _unique(parts) -> np.ndarray:
+    """Sorted distinct values of the concatenated arrays, as int64."""
+    values = np.sort(np.concatenate(parts).astype(np.int64))
+    if len(values) == 0:
+        return values
+    return values[np.concatenate([[True], values[1:] != values[:-1]])]
+
+
+def _add_probed(out: np.ndarray, rows: np.ndarray, term_rows: np.ndarray, impacts: np.ndarray, count: float) -> None:
+    """out[i] += count * impact of rows[i] in one posting list, for the rows it contains."""
+    if len(term_rows) == 0 or len(rows) == 0:
+        return
+    pos = np.minimum(np.searchsorted(term_rows, rows), len(term_rows) - 1)
+    hit = term_rows[pos] == rows
+    out[hit] += count * impacts[pos[hit]]
@@ -0,0 +1,91 @@
+import gzip
+import json
+from pathlib import Path
+from typing import IO, Any, Dict, Iterator, List
+
+GZIP_MAGIC = b"\x1f\x8b"
+
+
+def _open_text(path: Path) -> IO[str]:
+    """Open the catalog as text, transparently decompressing gzip (detected by its magic bytes)."""
+    with open(path, "rb") as f:
+        compressed = f.read(2) == GZIP_MAGIC
+    if compressed:
+        return gzip.open(path, "rt", encoding="utf-8-sig")
+    return open(path, "r", encoding="utf-8-sig")
+
+
+def _is_ndjson_record(line: str) -> bool:
+    """True when the first line of a file is a complete restaurant object on its own."""
+    try:
+        first = json.loads(line)
+    except json.JSONDecodeError:
+        return False
+    return isinstance(first, dict) and "restaurants" not in first
+
+
+def iter_restaurants(path: Path) -> Iterator[Dict[str, Any]]:
+    """Yields restaurants one at a time, in file order.
+    Accepts any of (optionally gzip-compressed):
+      1) [ {restaurant}, ... ]
+      2) { "restaurants": [ {restaurant}, ... ] }
+      3) NDJSON: one {restaurant} per line (blank lines are skipped)
+    NDJSON is parsed line by line, so memory does not grow with the file;
+    the other two forms have to be parsed whole.
+    """
+    try:
+        f = _open_text(path)
+    except FileNotFoundError as e:
+        raise RuntimeError(f"restaurants.json not found at: {path}") from e
+
+    with f:
+        try:
+            first, lineno = "", 0
+            for lineno, first in enumerate(f, start=1):
+                if first.strip():
+                    break
+
+            if _is_ndjson_record(first):
+                yield from _iter_ndjson(path, f, first, lineno)
+                return
+
+            f.seek(0)
+            data = json.load(f)
+        except (OSError, EOFError, UnicodeDecodeError) as e:
+            raise RuntimeError(f"Could not read: {path} ({e})") from e
+        except json.JSONDecodeError as e:
+            raise RuntimeError(f"Invalid JSON in: {path} ({e})") from e
+
+    if isinstance(data, dict) and "restaurants" in data:
+        restaurants = data["restaurants"]
+    else:
+        restaurants = data
+
+    if not isinstance(restaurants, list):
+        raise RuntimeError(
+            "restaurants.json must be a list OR an object with a 'restaurants' list."
+        )
+
+    for i, r in enumerate(restaurants):
+        if not isinstance(r, dict):
+            raise RuntimeError(f"restaurants[{i}] is not an object")
+        yield r
+
+
+def _iter_ndjson(path: Path, f: IO[str], first: str, first_lineno: int) -> Iterator[Dict[str, Any]]:
+    yield json.loads(first)
+    for lineno, line in enumerate(f, start=first_lineno + 1):
+        if not line.strip():
+            continue
+        try:
+            r = json.loads(line)
+        except json.JSONDecodeError as e:
+            raise RuntimeError(f"Invalid JSON in: {path} line {lineno} ({e})") from e
+        if not isinstance(r, dict):
+            raise RuntimeError(f"{path} line {lineno} is not an object")
+        yield r
+
+
+def load_restaurants(path: Path) -> List[Dict[str, Any]]:
+    """Loads every restaurant into a list (see iter_restaurants for the accepted formats)."""
+    return list(iter_restaurants(path))
@@ -0,0 +1,214 @@
+"""
+Append-only storage for incremental edits.
+
+An upsert adds one row at the end of every per-row structure. Copying each
+column or matrix to add that row would make an edit cost O(catalog), so:
+
+- append_rows() grows NumPy columns in place, in buffers with spare
+  capacity (doubling), and hands out prefix views. A snapshot holds its own
+  view, so rows appended later are never visible to it. Only the view that
+  ends where the buffer's used rows end may grow in place; any other one
+  (an older snapshot being edited again) is copied into a new buffer.
+- SegmentedMatrix keeps a CSR base as built and a small delta of the rows
+  appended since, stored the same way. Products and row lookups go segment
+  by segment; compact() (and persisting) merge them with tocsr().
+- OverlayMap keeps the id -> row mapping as built plus the changes since.
+
+All three are immutable from the reader's side, like the snapshots holding them.
+"""
+import threading
+import weakref
+from collections.abc import Mapping
+from typing import Any, Dict, Iterator, Optional, Tuple, Union
+
+import numpy as np
+from scipy import sparse
+
+MIN_CAPACITY = 16
+
+# buffer id -> (weak ref to the buffer, rows in use)
+_buffers: Dict[int, Tuple["weakref.ref[np.ndarray]", int]] = {}
+_buffers_lock = threading.Lock()
+
+
+def _forget(buffer_id: int) -> None:
+    with _buffers_lock:
+        _buffers.pop(buffer_id, None)
+
+
+def _grows_in_place(column: np.ndarray, n_new: int, dtype: np.dtype) -> Optional[np.ndarray]:
+    """The buffer column is a prefix view of, when the new rows fit right after it; else None."""
+    buffer = column.base
+    if buffer is None or column.dtype != dtype:
+        return None
+    entry = _buffers.get(id(buffer))
+    if entry is None or entry[0]() is not buffer or entry[1] != len(column):
+        return None
+    if len(column) + n_new > len(buffer) or column.ctypes.data != buffer.ctypes.data:
+        return None
+    return buffer
+
+
+def append_rows(column: np.ndarray, new: Any) -> np.ndarray:
+    """column with new's rows after its own (first axis), in amortized O(len(new)); column is not changed."""
+    new = np.asarray(new)
+    dtype = np.result_type(column.dtype, new.dtype)
+    n, k = len(column), len(new)
+    with _buffers_lock:
+        buffer = _grows_in_place(column, k, dtype)
+        if buffer is None:
+            capacity = max(MIN_CAPACITY, 2 * (n + k))
+            buffer = np.empty((capacity,) + column.shape[1:], dtype=dtype)
+            buffer[:n] = column
+            buffer_id = id(buffer)
+            weakref.finalize(buffer, _forget, buffer_id)
+        buffer[n:n + k] = new
+        _buffers[id(buffer)] = (weakref.ref(buffer), n + k)
+    view = buffer[:n + k]
+    view.flags.writeable = False
+    return view
+
+
+def append_ragged(
+    column: Tuple[np.ndarray, np.ndarray], other: Tuple[np.ndarray, np.ndarray]
+) -> Tuple[np.ndarray, np.ndarray]:
+    """(offsets, data) of a ragged column with other's rows appended."""
+    offsets, data = column
+    other_offsets, other_data = other
+    return append_rows(offsets, other_offsets[1:] + offsets[-1]), append_rows(data, other_data)
+
+
+# ----------------------------
+# Matrices
+# ----------------------------
+def widen(m: sparse.csr_matrix, n_cols: int) -> sparse.csr_matrix:
+    """m with n_cols columns (the extra ones empty); the arrays are shared."""
+    if m.shape[1] == n_cols:
+        return m
+    return sparse.csr_matrix((m.data, m.indices, m.indptr), shape=(m.shape[0], n_cols), copy=False)
+
+
+class SegmentedMatrix:
+    """
+    A CSR base plus a delta of rows appended after it; the columns added by
+    those rows are empty in the base. Supports what the index's readers do
+    with a row matrix: shape, nnz, matrix @ other, row lookups and tocsr().
+    """
+
+    def __init__(self, base: sparse.csr_matrix, delta: sparse.csr_matrix):
+        self.base = base
+        self.delta = delta
+        self.shape = (base.shape[0] + delta.shape[0], max(base.shape[1], delta.shape[1]))
+        self.dtype = base.dtype
+
+    @property
+    def nnz(self) -> int:
+        return self.base.nnz + self.delta.nnz
+
+    def __matmul__(self, other: Any) -> Any:
+        """Same result as tocsr() @ other: each segment multiplies the rows of other it has columns for."""
+        top = self.base @ other[:self.base.shape[1]]
+        bottom = self.delta @ other[:self.delta.shape[1]]
+        if sparse.issparse(top):
+            return sparse.vstack([top, bottom], format="csr")
+        return np.concatenate([top, bottom])
+
+    def __getitem__(self, rows: Union[int, slice, np.ndarray]) -> sparse.csr_matrix:
+        """The given rows (a row number, slice or row array) as one CSR matrix."""
+        if isinstance(rows, (int, np.integer)):
+            rows = int(rows) + (self.shape[0] if rows < 0 else 0)
+            segment, row = (self.base, rows) if rows < self.base.shape[0] else (self.delta, rows - self.base.shape[0])
+            return widen(segment[row], self.shape[1])
+        rows = np.arange(self.shape[0])[rows] if isinstance(rows, slice) else np.asarray(rows, dtype=np.int64)
+        in_base = rows < self.base.shape[0]
+        if in_base.all():
+            return widen(self.base[rows], self.shape[1])
+        parts = sparse.vstack(
+            [widen(self.base[rows[in_base]], self.shape[1]), widen(self.delta[rows[~in_base] - self.base.shape[0]], self.shape[1])],
+            format="csr",
+        )
+        # parts holds the base rows first; put every row back at its position
+        order = np.argsort(~in_base, kind="stable")
+        position = np.empty(len(rows), dtype=np.int64)
+        position[order] = np.arange(len(rows))
+        return parts[position]
+
+    def tocsr(self) -> sparse.csr_matrix:
+        """Both segments merged into one CSR matrix (a copy)."""
+        return sparse.vstack([widen(self.base, self.shape[1]), widen(self.delta, self.shape[1])], format="csr")
+
+
+RowMatrix = Union[sparse.csr_matrix, SegmentedMatrix]
+
+
+def append_matrix_rows(matrix: RowMatrix, rows: sparse.csr_matrix) -> SegmentedMatrix:
+    """matrix with the CSR rows appended to its delta segment; O(rows), whatever the size of matrix."""
+    if isinstance(matrix, SegmentedMatrix):
+        base, delta = matrix.base, matrix.delta
+    else:
+        base = matrix
+        delta = sparse.csr_matrix((0, matrix.shape[1]), dtype=matrix.dtype)
+        delta.indptr = delta.indptr.astype(np.int32)
+        delta.indices = delta.indices.astype(np.int32)
+    n_cols = max(base.shape[1], delta.shape[1], rows.shape[1])
+    rows = sparse.csr_matrix(rows)
+    grown = sparse.csr_matrix(
+        (
+            append_rows(delta.data, rows.data.astype(delta.dtype, copy=False)),
+            append_rows(delta.indices, rows.indices.astype(np.int32, copy=False)),
+            append_rows(delta.indptr, rows.indptr[1:].astype(np.int32) + delta.indptr[-1]),
+        ),
+        shape=(delta.shape[0] + rows.shape[0], n_cols),
+        copy=False,
+    )
+    return SegmentedMatrix(base, grown)
+
+
+def as_csr(matrix: RowMatrix) -> sparse.csr_matrix:
+    """A plain CSR matrix: matrix itself, or its segments merged."""
+    return matrix.tocsr() if isinstance(matrix, SegmentedMatrix) else matrix
+
+
+# ----------------------------
+# Id maps
+# ----------------------------
+class OverlayMap(Mapping):
+    """A read-only mapping: base with changes on top (None in changes removes the key)."""
+
+    def __init__(self, base: Mapping, changes: Optional[Dict[Any, Any]] = None, size: Optional[int] = None):
+        self.base = base
+        self.changes = changes or {}
+        self._size = len(base) if size is None else size
+
+    def __getitem__(self, key: Any) -> Any:
+        if key in self.changes:
+            value = self.changes[key]
+            if value is None:
+                raise KeyError(key)
+            return value
+        return self.base[key]
+
+    def __contains__(self, key: object) -> bool:
+        if key in self.changes:
+            return self.changes[key] is not None
+        return key in self.base
+
+    def __iter__(self) -> Iterator[Any]:
+        for key in self.base:
+            if key not in self.changes:
+                yield key
+        for key, value in self.changes.items():
+            if value is not None:
+                yield key
+
+    def __len__(self) -> int:
+        return self._size
+
+    def updated(self, key: Any, value: Any) -> "OverlayMap":
+        """New map with key set to value (None: removed); copies only the changes."""
+        size = self._size + (value is not None) - (key in self)
+        return OverlayMap(self.base, {**self.changes, key: value}, size)
+
+
+def overlay(mapping: Mapping) -> OverlayMap:
+    return mapping if isinstance(mapping, OverlayMap) else OverlayMap(mapping)
@@ -0,0 +1,190 @@
+"""
+LSA (latent semantic analysis) vectors for semantic matching.
+
+A TruncatedSVD of the TF-IDF matrix, fitted at index time, maps documents
+and queries into a small dense space where terms that occur in similar
+documents ("ramen" / "noodles", "espresso" / "coffee") end up close even
+though TF-IDF scores them 0 against each other.
+
+Document vectors are L2-normalized float32 (or int8 codes with one float32
+scale per row when quantized, 4x smaller), stored with the index artifact
+and memory-mapped like the rest of it. A query costs one sparse projection
+plus a dense matrix-vector product, done in blocks of rows so quantized
+codes are widened a block at a time.
+"""
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+from scipy import sparse
+from sklearn.decomposition import TruncatedSVD
+
+try:
+    from server.indexing.segments import append_rows
+except ImportError:
+    from indexing.segments import append_rows
+
+# rows per block of the dense matrix-vector product
+BLOCK_ROWS = 65536
+SVD_SEED = 0
+
+
+class SemanticIndex:
+    def __init__(
+        self,
+        *,
+        components: np.ndarray,
+        vectors: Optional[np.ndarray] = None,
+        codes: Optional[np.ndarray] = None,
+        scales: Optional[np.ndarray] = None,
+    ):
+        # (dims x n_terms) projection; queries with terms beyond n_terms (added
+        # by incremental upserts) simply ignore them
+        self.components = components
+        # either float32 unit vectors (rows x dims) or int8 codes + per-row scales
+        self.vectors = vectors
+        self.codes = codes
+        self.scales = scales
+
+    @property
+    def dims(self) -> int:
+        return int(self.components.shape[0])
+
+    @property
+    def quantized(self) -> bool:
+        return self.codes is not None
+
+    def __len__(self) -> int:
+        return int((self.codes if self.quantized else self.vectors).shape[0])
+
+    # ----------------------------
+    # Queries
+    # ----------------------------
+    def project(self, X: sparse.csr_matrix) -> np.ndarray:
+        """Unit vectors (float32, one row per row of X) for TF-IDF rows X; all-zero rows stay zero."""
+        X = sparse.csr_matrix(X)
+        n_terms = self.components.shape[1]
+        dense = np.zeros((X.shape[0], self.dims), dtype=np.float32)
+        # rows are short: gather their columns of the projection instead of
+        # multiplying by the whole (n_terms x dims) matrix
+        for i in range(X.shape[0]):
+            cols = X.indices[X.indptr[i]:X.indptr[i + 1]]
+            vals = X.data[X.indptr[i]:X.indptr[i + 1]]
+            known = cols < n_terms
+            dense[i] = self.components[:, cols[known]] @ vals[known].astype(np.float32)
+        return _normalize(dense)
+
+    def scores(self, q: np.ndarray) -> np.ndarray:
+        """Cosine similarity of every row to the unit query vector q (float32)."""
+        out = np.empty(len(self), dtype=np.float32)
+        q = np.asarray(q, dtype=np.float32)
+        for start in range(0, len(out), BLOCK_ROWS):
+            end = min(start + BLOCK_ROWS, len(out))
+            if self.quantized:
+                out[start:end] = (self.codes[start:end].astype(np.float32) @ q) * self.scales[start:end]
+            else:
+                out[start:end] = self.vectors[start:end] @ q
+        return out
+
+    def blend(self, lexical: np.ndarray, query: sparse.csr_matrix, weight: float, top_n: int) -> np.ndarray:
+        """
+        (1 - weight) * lexical + weight * semantic, where semantic keeps only the
+        top_n most similar rows (others 0, negatives clipped) so far-off rows
+        are not lifted by noise. lexical is left untouched.
+        """
+        rows, sims = self.nearest(query, top_n)
+        if len(rows) == 0:
+            return lexical
+        semantic = np.zeros(len(lexical), dtype=np.float64)
+        semantic[rows] = sims
+        return (1.0 - weight) * lexical + weight * semantic
+
+    def nearest(self, query: sparse.csr_matrix, top_n: int) -> Tuple[np.ndarray, np.ndarray]:
+        """(rows, similarities) of the top_n rows most similar to query, negatives clipped to 0; rows sorted."""
+        q = self.project(query)[0]
+        if not q.any():
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float64)
+        sims = self.scores(q)
+        n = len(sims)
+        top = np.arange(n) if top_n >= n else np.sort(np.argpartition(-sims, top_n)[:top_n])
+        return top, np.maximum(sims[top], 0.0).astype(np.float64)
+
+    # ----------------------------
+    # Derived indexes (incremental edits)
+    # ----------------------------
+    def appended(self, X: sparse.csr_matrix) -> "SemanticIndex":
+        """Fold the TF-IDF rows X in with the current projection (no refit); O(rows of X)."""
+        vectors = self.project(X)
+        if not self.quantized:
+            return SemanticIndex(components=self.components, vectors=append_rows(self.vectors, vectors))
+        codes, scales = quantize(vectors)
+        return SemanticIndex(
+            components=self.components,
+            codes=append_rows(self.codes, codes),
+            scales=append_rows(self.scales, scales),
+        )
+
+    # ----------------------------
+    # Persistence
+    # ----------------------------
+    def to_arrays(self) -> Dict[str, np.ndarray]:
+        arrays = {"components": self.components}
+        if self.quantized:
+            arrays.update(codes=self.codes, scales=self.scales)
+        else:
+            arrays["vectors"] = self.vectors
+        return arrays
+
+    @classmethod
+    def from_arrays(cls, arrays: Dict[str, np.ndarray]) -> "SemanticIndex":
+        return cls(
+            components=arrays["components"],
+            vectors=arrays.get("vectors"),
+            codes=arrays.get("codes"),
+            scales=arrays.get("scales"),
+        )
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return np.divide(vectors, norms, out=np.zeros_like(vectors), where=norms > 0)
+
+
+def quantize(vectors: np.ndarray):
+    """Symmetric int8 codes with one scale per row: row ~= codes * scale."""
+    peak = np.abs(vectors).max(axis=1) if vectors.size else np.zeros(len(vectors), dtype=np.float32)
+    scales = (peak / 127.0).astype(np.float32)
+    safe = np.where(scales > 0, scales, 1.0)[:, None]
+    codes = np.clip(np.rint(vectors / safe), -127, 127).astype(np.int8)
+    return codes, scales
+
+
+def fit_semantic(tfidf_matrix: sparse.csr_matrix, dims: int, quantized: bool = False) -> Optional[SemanticIndex]:
+    """
+    Fit a dims-dimensional LSA projection of tfidf_matrix (fewer when the
+    matrix is too small). None when dims < 1 or there is nothing to fit.
+    """
+    dims = min(dims, min(tfidf_matrix.shape) - 1)
+    if dims < 1:
+        return None
+
+    svd = TruncatedSVD(n_components=dims, random_state=SVD_SEED)
+    docs = svd.fit_transform(tfidf_matrix)
+    components = np.ascontiguousarray(svd.components_, dtype=np.float32)
+    vectors = _normalize(docs.astype(np.float32))
+    if not quantized:
+        return SemanticIndex(components=components, vectors=vectors)
+    codes, scales = quantize(vectors)
+    return SemanticIndex(components=components, codes=codes, scales=scales)
+
+
+def semantic_matches(semantic: Optional[SemanticIndex], dims: int, quantized: bool, shape) -> bool:
+    """Whether semantic is what fit_semantic(matrix of shape, dims, quantized) would produce."""
+    wanted = min(dims, min(shape) - 1)
+    if wanted < 1:
+        return semantic is None
+    return (
+        semantic is not None
+        and semantic.dims == wanted
+        and semantic.quantized == quantized
+        and len(semantic) == shape[0]
+    )
@@ -0,0 +1,121 @@
+"""
+Read-only index shared by several server processes.
+
+One builder process (scripts/publish_index.py) writes a snapshot's arrays
+-- CSR matrix, signal columns, catalog columns and pre-serialized payloads --
+as .npy files into a new version directory, then points the CURRENT header
+at it with an atomic rename. Server processes memory-map those files
+read-only, so the page cache holds a single copy for all of them, and attach
+to the next version when CURRENT changes.
+
+    <shared_dir>/
+        CURRENT          {"version", "path", "data_hash", "count", "published_at"}
+        v0000000003/     write_index_files() output, extra_catalog_*.npy, catalog.json
+
+Only the newest KEEP_VERSIONS directories are kept. A process still mapping
+an older one is unaffected (unlinked files stay valid while mapped); one
+that fails to attach keeps its current snapshot and retries on the next poll.
+Small per-process structures (vocabulary and id dicts, facet postings, the
+spatial grid) are still rebuilt by each process on attach.
+"""
+import json
+import os
+import shutil
+import time
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+
+try:
+    from server.indexing.catalog import RestaurantCatalog
+    from server.indexing.index_store import TfidfIndex, read_index_files, write_index_files
+except ImportError:
+    from indexing.catalog import RestaurantCatalog
+    from indexing.index_store import TfidfIndex, read_index_files, write_index_files
+
+HEADER_NAME = "CURRENT"
+KEEP_VERSIONS = 2
+CATALOG_PREFIX = "catalog_"
+
+
+def header_path(shared_dir: Path) -> Path:
+    return Path(shared_dir) / HEADER_NAME
+
+
+def read_header(shared_dir: Path) -> Optional[Dict[str, Any]]:
+    """The published version's header, or None when nothing (readable) is published."""
+    try:
+        with open(header_path(shared_dir), "r", encoding="utf-8") as f:
+            header = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return header if isinstance(header, dict) and "version" in header else None
+
+
+def _version_dirs(shared_dir: Path):
+    return sorted(p for p in Path(shared_dir).glob("v*") if p.is_dir() and p.name[1:].isdigit())
+
+
+def publish_shared(index: TfidfIndex, catalog: RestaurantCatalog, shared_dir: Path) -> Dict[str, Any]:
+    """Write index + catalog as the next version and switch CURRENT to it. Returns the new header."""
+    shared_dir = Path(shared_dir)
+    shared_dir.mkdir(parents=True, exist_ok=True)
+
+    existing = [int(p.name[1:]) for p in _version_dirs(shared_dir)]
+    header = read_header(shared_dir)
+    version = max(existing + [header["version"] if header else 0]) + 1
+    name = f"v{version:010d}"
+
+    tmp_dir = shared_dir / f".{name}.tmp-{os.getpid()}"
+    if tmp_dir.exists():
+        shutil.rmtree(tmp_dir)
+    tmp_dir.mkdir()
+
+    arrays, meta = catalog.to_arrays()
+    write_index_files(index, tmp_dir, {f"{CATALOG_PREFIX}{k}": v for k, v in arrays.items()})
+    with open(tmp_dir / "catalog.json", "w", encoding="utf-8") as f:
+        json.dump(meta, f)
+    os.replace(tmp_dir, shared_dir / name)
+
+    header = {
+        "version": version,
+        "path": name,
+        "data_hash": index.data_hash,
+        "count": index.live_count,
+        "published_at": time.time(),
+    }
+    tmp_header = shared_dir / f".{HEADER_NAME}.tmp-{os.getpid()}"
+    with open(tmp_header, "w", encoding="utf-8") as f:
+        json.dump(header, f)
+    os.replace(tmp_header, header_path(shared_dir))
+
+    for old in _version_dirs(shared_dir)[:-KEEP_VERSIONS]:
+        shutil.rmtree(old, ignore_errors=True)
+    return header
+
+
+def attach_shared(
+    shared_dir: Path, header: Optional[Dict[str, Any]] = None
+) -> Optional[Tuple[TfidfIndex, RestaurantCatalog, Dict[str, Any]]]:
+    """
+    Memory-map the version named by header (default: the current one).
+    Returns (index, catalog, header), or None when it is missing or unreadable.
+    """
+    if header is None:
+        header = read_header(shared_dir)
+        if header is None:
+            return None
+
+    path = Path(shared_dir) / header["path"]
+    loaded = read_index_files(path, header["data_hash"])
+    if loaded is None:
+        return None
+    index, extra = loaded
+    try:
+        with open(path / "catalog.json", "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        arrays = {k[len(CATALOG_PREFIX):]: v for k, v in extra.items() if k.startswith(CATALOG_PREFIX)}
+        catalog = RestaurantCatalog.from_arrays(arrays, meta)
+    except (OSError, ValueError, KeyError) as e:
+        print(f"Ignoring unreadable shared index at {path}: {e}")
+        return None
+    return index, catalog, header
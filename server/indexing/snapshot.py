@@ -0,0 +1,449 @@
+"""
+Immutable index snapshots and the background builder that publishes them.
+
+A request grabs IndexManager.current once and uses only that snapshot, so
+it always sees a restaurant list, matrix and signal columns that belong
+together. New snapshots (full rebuilds from the data file, or incremental
+edits) replace it with a single reference assignment, and get their version
+number then, so versions only ever go up in publish order.
+"""
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Union
+
+try:
+    from server.indexing.candidates import CandidateIndex
+    from server.indexing.catalog import IdLookup, RestaurantCatalog, as_catalog
+    from server.indexing.facets import FacetIndex
+    from server.indexing.index_store import STOP_WORDS, TfidfIndex, data_file_hash, load_or_fit_index
+    from server.indexing.inverted import InvertedIndex
+    from server.indexing.loader import iter_restaurants
+    from server.indexing.shared import attach_shared, header_path, read_header
+    from server.indexing.spatial import GridIndex
+    from server.indexing.spelling import SpellIndex
+    from server.indexing.suggest import SuggestIndex
+except ImportError:
+    from indexing.candidates import CandidateIndex
+    from indexing.catalog import IdLookup, RestaurantCatalog, as_catalog
+    from indexing.facets import FacetIndex
+    from indexing.index_store import STOP_WORDS, TfidfIndex, data_file_hash, load_or_fit_index
+    from indexing.inverted import InvertedIndex
+    from indexing.loader import iter_restaurants
+    from indexing.shared import attach_shared, header_path, read_header
+    from indexing.spatial import GridIndex
+    from indexing.spelling import SpellIndex
+    from indexing.suggest import SuggestIndex
+
+WATCH_INTERVAL_SECONDS = 2.0
+MAX_BUILD_HISTORY = 50
+
+
+class IndexSnapshot:
+    """
+    One consistent view of the catalog and everything derived from it. Never
+    mutated once published (IndexManager.publish sets its version);
+    structures only some requests need are built on first use.
+
+    previous is the snapshot an incremental edit started from, when the
+    edit only appended and tombstoned rows (not after compaction). Derived
+    structures (the lazy ones if previous had built them) are then carried
+    over from it and updated with the appended rows, so an edit never
+    rebuilds them; nothing keeps a reference to it.
+    """
+
+    def __init__(
+        self,
+        index: TfidfIndex,
+        restaurants: Union[RestaurantCatalog, List[Dict[str, Any]]],
+        *,
+        version: int = 0,
+        source: str = "",
+        previous: Optional["IndexSnapshot"] = None,
+    ):
+        self.index = index
+        # columnar; rows read back as dict-like RestaurantViews
+        self.restaurants = as_catalog(restaurants)
+        self.version = version
+        self.source = source
+        self.built_at = time.time()
+
+        self.vectorizer = index.vectorizer
+        self.tfidf_matrix = index.tfidf_matrix
+        self.id_to_index = index.id_to_index
+        self.signals = index.signals
+        self.restaurant_lookup = IdLookup(self.restaurants, index.id_to_index)
+        if previous is None:
+            self.spatial = GridIndex(self.signals.lat, self.signals.lng)
+            self.facets = FacetIndex(self.restaurants)
+        else:
+            start = len(previous.restaurants)
+            self.spatial = previous.spatial.appended(self.signals.lat, self.signals.lng, start)
+            self.facets = previous.facets.appended(self.restaurants, start)
+        self._candidates: Optional[CandidateIndex] = None
+        if previous is not None and previous._candidates is not None:
+            self._candidates = previous._candidates.appended(
+                self.tfidf_matrix, self.signals, start, previous.signals.live
+            )
+        self._bm25: Optional[InvertedIndex] = None
+        if previous is not None and previous._bm25 is not None:
+            self._bm25 = previous._bm25.appended(self.restaurants, start, self.vectorizer.vocabulary)
+        self._spelling: Optional[SpellIndex] = None
+        if previous is not None and previous._spelling is not None:
+            self._spelling = previous._spelling.appended(self.vectorizer.vocabulary, self.index.df)
+        self._suggest: Optional[SuggestIndex] = None
+        if previous is not None and previous._suggest is not None:
+            self._suggest = previous._suggest.appended(
+                self.restaurants, self.signals, self.facets, start, previous.signals.live
+            )
+        self._lazy_lock = threading.Lock()
+
+    @property
+    def candidates(self) -> CandidateIndex:
+        """Stage-one retrieval for two-stage ranking; built on first use."""
+        if self._candidates is None:
+            with self._lazy_lock:
+                if self._candidates is None:
+                    self._candidates = CandidateIndex(self.tfidf_matrix, self.signals)
+        return self._candidates
+
+    @property
+    def bm25(self) -> InvertedIndex:
+        """BM25 inverted index over the same documents and vocabulary; built on first use."""
+        if self._bm25 is None:
+            with self._lazy_lock:
+                if self._bm25 is None:
+                    self._bm25 = InvertedIndex.build(self.restaurants, self.vectorizer.vocabulary, STOP_WORDS)
+        return self._bm25
+
+    @property
+    def spelling(self) -> SpellIndex:
+        """Typo correction against this vocabulary (symmetric-delete index); built on first use."""
+        if self._spelling is None:
+            with self._lazy_lock:
+                if self._spelling is None:
+                    self._spelling = SpellIndex.build(self.vectorizer.vocabulary, self.index.df)
+        return self._spelling
+
+    @property
+    def suggest(self) -> SuggestIndex:
+        """Autocomplete prefix index over names, cuisines, categories and frequent terms; built on first use."""
+        if self._suggest is None:
+            with self._lazy_lock:
+                if self._suggest is None:
+                    self._suggest = SuggestIndex.build(
+                        self.restaurants, self.signals, self.facets, self.index.tf_matrix, self.vectorizer.vocabulary
+                    )
+        return self._suggest
+
+    @property
+    def live_count(self) -> int:
+        return self.index.live_count
+
+    @property
+    def data_hash(self) -> str:
+        return self.index.data_hash
+
+
+def build_snapshot(
+    data_path: Path,
+    index_dir: Optional[Path],
+    version: int = 0,
+    lsa_dims: int = 0,
+    lsa_quantize: bool = False,
+) -> IndexSnapshot:
+    """
+    The single build pipeline: hash the data file, then load the artifact or
+    refit while the file is still being parsed (plus LSA vectors when lsa_dims > 0).
+    """
+    data_hash = data_file_hash(data_path)
+    index, restaurants = load_or_fit_index(
+        iter_restaurants(data_path), data_hash, index_dir, lsa_dims=lsa_dims, lsa_quantize=lsa_quantize
+    )
+    return IndexSnapshot(index, restaurants, version=version, source=str(data_path))
+
+
+class IndexManager:
+    """
+    Holds the current snapshot and runs rebuilds on a background thread.
+
+    data_path / index_dir / shared_dir are callables so callers can repoint
+    them at runtime. Rebuild requests that arrive while one is already queued
+    are coalesced. When shared_dir gives a directory, snapshots are attached
+    from the index another process publishes there (see indexing.shared)
+    instead of being built, and "rebuilding" means attaching a newer version.
+    on_build(seconds, status) is called after every build, including the first.
+    prepare(snapshot), when given, runs on every snapshot before it is
+    published (e.g. to build its lazy structures off the request path); an
+    edit snapshot carries those over from the one it was edited from (see
+    IndexSnapshot), so preparing it costs little unless it was compacted.
+    Edits go through edit(). One that lands while a rebuild is running is
+    replayed onto the rebuilt snapshot before that is published, so the
+    rebuild (which read the data file before the edit) cannot undo it.
+    lsa_dims / lsa_quantize give the LSA settings of built snapshots (see
+    indexing.semantic); attached ones carry whatever the publisher fitted.
+    """
+
+    def __init__(
+        self,
+        data_path: Callable[[], Path],
+        index_dir: Callable[[], Optional[Path]],
+        shared_dir: Callable[[], Optional[Path]] = lambda: None,
+        on_build: Optional[Callable[[float, str], None]] = None,
+        lsa_dims: Callable[[], int] = lambda: 0,
+        lsa_quantize: Callable[[], bool] = lambda: False,
+        prepare: Optional[Callable[[IndexSnapshot], None]] = None,
+    ):
+        self._data_path = data_path
+        self._index_dir = index_dir
+        self._shared_dir = shared_dir
+        self._on_build = on_build
+        self._lsa_dims = lsa_dims
+        self._lsa_quantize = lsa_quantize
+        self._prepare = prepare
+        # shared version the current snapshot was attached from
+        self._attached_version: Optional[int] = None
+
+        self._current: Optional[IndexSnapshot] = None
+        self._version = 0
+
+        # Held while publishing; callers doing read-modify-publish (edits) hold it too.
+        self.write_lock = threading.RLock()
+        # edits published since the running rebuild started (None: no rebuild running)
+        self._replay: Optional[List[Callable[[IndexSnapshot], Optional[IndexSnapshot]]]] = None
+
+        self._lock = threading.Lock()
+        self._builds: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._pending: Optional[Dict[str, Any]] = None
+        self._worker: Optional[threading.Thread] = None
+
+        self._watcher: Optional[threading.Thread] = None
+        self._watch_stop = threading.Event()
+
+    # ----------------------------
+    # Snapshots
+    # ----------------------------
+    @property
+    def current(self) -> Optional[IndexSnapshot]:
+        return self._current
+
+    def publish(self, snapshot: IndexSnapshot) -> None:
+        """Make snapshot current under the next version number."""
+        with self.write_lock:
+            self._version += 1
+            snapshot.version = self._version
+            self._current = snapshot
+
+    def edit(self, change: Callable[[IndexSnapshot], Optional[IndexSnapshot]]) -> IndexSnapshot:
+        """
+        Publish change(current snapshot) and return it; change returns None
+        when there is nothing to do. change may run again later, on a
+        rebuilt snapshot (see the class docstring), so it must only depend
+        on the snapshot it is given.
+        """
+        with self.write_lock:
+            current = self.ensure_ready()
+            snap = change(current)
+            if snap is None:
+                return current
+            if self._prepare is not None:
+                self._prepare(snap)
+            self.publish(snap)
+            if self._replay is not None:
+                self._replay.append(change)
+            return snap
+
+    def ensure_ready(self) -> IndexSnapshot:
+        """Current snapshot, building one synchronously if none has been published yet."""
+        snap = self._current
+        if snap is not None:
+            return snap
+        with self.write_lock:
+            if self._current is None:
+                started = time.perf_counter()
+                if self.shared:
+                    snap = self._attach()
+                    if snap is None:
+                        raise RuntimeError(f"No shared index has been published in {self._shared_dir()}")
+                    self.publish(snap)
+                else:
+                    self.publish(self._build(self._data_path()))
+                if self._on_build is not None:
+                    self._on_build(time.perf_counter() - started, "done")
+            return self._current
+
+    @property
+    def shared(self) -> bool:
+        """True when snapshots come from a shared index published by another process (read-only)."""
+        return self._shared_dir() is not None
+
+    def _attach(self) -> Optional[IndexSnapshot]:
+        shared_dir = self._shared_dir()
+        attached = attach_shared(shared_dir)
+        if attached is None:
+            return None
+        index, catalog, header = attached
+        self._attached_version = header["version"]
+        snap = IndexSnapshot(index, catalog, source=f"{shared_dir}@v{header['version']}")
+        if self._prepare is not None:
+            self._prepare(snap)
+        return snap
+
+    # ----------------------------
+    # Background rebuilds
+    # ----------------------------
+    def request_rebuild(self, reason: str = "refresh") -> Dict[str, Any]:
+        """Queue a rebuild from the data file and return its status record (a copy)."""
+        with self._lock:
+            if self._pending is not None:
+                return dict(self._pending)
+
+            build = {
+                "build_id": uuid.uuid4().hex[:12],
+                "status": "queued",
+                "reason": reason,
+                "requested_at": time.time(),
+                "started_at": None,
+                "finished_at": None,
+                "duration_s": None,
+                "version": None,
+                "count": None,
+                "error": None,
+            }
+            self._builds[build["build_id"]] = build
+            while len(self._builds) > MAX_BUILD_HISTORY:
+                self._builds.popitem(last=False)
+
+            self._pending = build
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._run_builds, name="index-builder", daemon=True)
+                self._worker.start()
+            return dict(build)
+
+    def build_status(self, build_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            build = self._builds.get(build_id)
+            return dict(build) if build is not None else None
+
+    def wait(self, build_id: str, timeout: Optional[float] = None) -> Optional[Dict[str, Any]]:
+        """Block until the build finishes (or timeout); returns its final status."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            status = self.build_status(build_id)
+            if status is None or status["status"] in ("done", "skipped", "failed"):
+                return status
+            if deadline is not None and time.monotonic() >= deadline:
+                return status
+            time.sleep(0.01)
+
+    def _run_builds(self) -> None:
+        while True:
+            with self._lock:
+                build = self._pending
+                self._pending = None
+                if build is None:
+                    return
+                build["status"] = "running"
+                build["started_at"] = time.time()
+
+            started = time.perf_counter()
+            try:
+                status = self._build_and_publish(build)
+                error = None
+            except Exception as e:  # a failed rebuild must not take down the serving snapshot
+                status, error = "failed", f"{type(e).__name__}: {e}"
+
+            duration = time.perf_counter() - started
+            with self._lock:
+                build["status"] = status
+                build["error"] = error
+                build["finished_at"] = time.time()
+                build["duration_s"] = round(duration, 4)
+                snap = self._current
+                if snap is not None:
+                    build["version"] = snap.version
+                    build["count"] = snap.live_count
+            if self._on_build is not None:
+                self._on_build(duration, status)
+
+    def _build_and_publish(self, build: Dict[str, Any]) -> str:
+        if self.shared:
+            header = read_header(self._shared_dir())
+            if header is None or header["version"] == self._attached_version:
+                return "skipped"
+            snap = self._attach()
+            if snap is None:
+                raise RuntimeError(f"Could not attach shared index version {header['version']}")
+            self.publish(snap)
+            return "done"
+
+        data_path = self._data_path()
+
+        # Nothing to do when the published snapshot already is this exact file
+        current = self._current
+        if current is not None and current.data_hash and current.data_hash == data_file_hash(data_path):
+            return "skipped"
+
+        with self.write_lock:
+            self._replay = []
+        try:
+            snap = self._build(data_path)
+            with self.write_lock:
+                for change in self._replay:
+                    snap = change(snap) or snap
+                if self._replay and self._prepare is not None:
+                    self._prepare(snap)
+                self.publish(snap)
+        finally:
+            with self.write_lock:
+                self._replay = None
+        return "done"
+
+    def _build(self, data_path: Path) -> IndexSnapshot:
+        snap = build_snapshot(
+            data_path,
+            self._index_dir(),
+            lsa_dims=self._lsa_dims(),
+            lsa_quantize=self._lsa_quantize(),
+        )
+        if self._prepare is not None:
+            self._prepare(snap)
+        return snap
+
+    # ----------------------------
+    # Data file watcher
+    # ----------------------------
+    def start_watcher(self, interval: float = WATCH_INTERVAL_SECONDS) -> None:
+        if self._watcher is not None and self._watcher.is_alive():
+            return
+        self._watch_stop.clear()
+        self._watcher = threading.Thread(
+            target=self._watch, args=(interval,), name="index-watcher", daemon=True
+        )
+        self._watcher.start()
+
+    def stop_watcher(self) -> None:
+        self._watch_stop.set()
+        if self._watcher is not None:
+            self._watcher.join(timeout=5)
+            self._watcher = None
+
+    def _stat(self):
+        # shared mode watches the version header instead of the data file
+        shared_dir = self._shared_dir()
+        path = header_path(shared_dir) if shared_dir is not None else self._data_path()
+        try:
+            st = path.stat()
+        except OSError:
+            return (str(path), None, None)
+        return (str(path), st.st_mtime_ns, st.st_size)
+
+    def _watch(self, interval: float) -> None:
+        last = self._stat()
+        while not self._watch_stop.wait(interval):
+            now = self._stat()
+            if now != last and now[1] is not None:
+                self.request_rebuild("watch")
+            last = now
@@ -0,0 +1,108 @@
+"""
+Fixed-size lat/lng grid over the restaurant coordinates.
+
+Rows are sorted by cell key (lat cell major, lng cell minor), so every
+latitude band of a query's bounding box is one contiguous slice found with
+two binary searches. Only rows in those slices get an exact haversine
+distance; everything else is pruned without being looked at.
+
+Rows appended by incremental edits are not merged into the sorted keys
+(that would copy them); they stay in a short list, checked against the
+query's bounding box, until the next full build.
+"""
+import math
+from typing import Tuple
+
+import numpy as np
+
+try:
+    from server.indexing.segments import append_rows
+    from server.scoring import EARTH_RADIUS_MILES, haversine_miles_array
+except ImportError:
+    from indexing.segments import append_rows
+    from scoring import EARTH_RADIUS_MILES, haversine_miles_array
+
+# ~0.69 mi of latitude per cell; a few cells cover a typical search radius
+SPATIAL_CELL_DEG = 0.01
+# Bounding boxes spanning more latitude bands than this just scan every row
+MAX_QUERY_BANDS = 2048
+
+_KEY_OFFSET = 1 << 20
+_KEY_STRIDE = 1 << 21
+
+
+def _cell(deg: np.ndarray, cell_deg: float) -> np.ndarray:
+    return np.floor(np.asarray(deg, dtype=np.float64) / cell_deg).astype(np.int64)
+
+
+class GridIndex:
+    """Rows with coordinates, bucketed into SPATIAL_CELL_DEG cells. Never mutated."""
+
+    def __init__(self, lat: np.ndarray, lng: np.ndarray, cell_deg: float = SPATIAL_CELL_DEG):
+        self.cell_deg = cell_deg
+        self.lat = lat
+        self.lng = lng
+
+        located = np.flatnonzero(~(np.isnan(lat) | np.isnan(lng)))
+        keys = (_cell(lat[located], cell_deg) + _KEY_OFFSET) * _KEY_STRIDE + (
+            _cell(lng[located], cell_deg) + _KEY_OFFSET
+        )
+        order = np.argsort(keys, kind="stable")
+        self.keys = keys[order]
+        self.rows = located[order]
+        # every located row in catalog order (the fallback scan)
+        self.located = located
+        # located rows appended since the build, not in keys
+        self.appended_rows = np.zeros(0, dtype=np.int64)
+
+    def appended(self, lat: np.ndarray, lng: np.ndarray, start: int) -> "GridIndex":
+        """Grid over lat/lng, whose rows before start are the ones self was built over; O(the new rows)."""
+        new = GridIndex.__new__(GridIndex)
+        new.__dict__.update(self.__dict__)
+        new.lat, new.lng = lat, lng
+        rows = np.arange(start, len(lat), dtype=np.int64)
+        rows = rows[~(np.isnan(lat[rows]) | np.isnan(lng[rows]))]
+        new.appended_rows = append_rows(self.appended_rows, rows)
+        new.located = append_rows(self.located, rows)
+        return new
+
+    def __len__(self) -> int:
+        return len(self.rows) + len(self.appended_rows)
+
+    def _box_rows(self, lat: float, lng: float, radius_miles: float) -> np.ndarray:
+        """Rows in the grid cells overlapping the radius' bounding box (a superset), sorted."""
+        dlat = math.degrees(radius_miles / EARTH_RADIUS_MILES)
+        lat_lo, lat_hi = lat - dlat, lat + dlat
+        cos_lat = math.cos(math.radians(max(abs(lat_lo), abs(lat_hi))))
+        if lat_lo <= -90 or lat_hi >= 90 or cos_lat <= 1e-6:
+            return self.located
+
+        dlng = dlat / cos_lat
+        lng_lo, lng_hi = lng - dlng, lng + dlng
+        if lng_lo < -180 or lng_hi > 180:
+            # crosses the antimeridian; not worth special-casing
+            return self.located
+
+        bands = np.arange(_cell(lat_lo, self.cell_deg), _cell(lat_hi, self.cell_deg) + 1)
+        if len(bands) > MAX_QUERY_BANDS:
+            return self.located
+
+        band_base = (bands + _KEY_OFFSET) * _KEY_STRIDE
+        starts = np.searchsorted(self.keys, band_base + _cell(lng_lo, self.cell_deg) + _KEY_OFFSET, side="left")
+        stops = np.searchsorted(self.keys, band_base + _cell(lng_hi, self.cell_deg) + _KEY_OFFSET, side="right")
+
+        slices = [self.rows[a:b] for a, b in zip(starts, stops) if b > a]
+        if len(self.appended_rows):
+            extra_lat, extra_lng = self.lat[self.appended_rows], self.lng[self.appended_rows]
+            in_box = (extra_lat >= lat_lo) & (extra_lat <= lat_hi) & (extra_lng >= lng_lo) & (extra_lng <= lng_hi)
+            slices.append(self.appended_rows[in_box])
+        if not slices:
+            return self.rows[:0]
+        return np.sort(np.concatenate(slices))
+
+    def within(self, lat: float, lng: float, radius_miles: float) -> Tuple[np.ndarray, np.ndarray]:
+        """(rows, miles) for every located row within radius_miles of (lat, lng), rows sorted."""
+        rows = self._box_rows(lat, lng, radius_miles)
+        miles = haversine_miles_array(lat, lng, self.lat[rows], self.lng[rows])
+        keep = miles <= radius_miles
+        return rows[keep], miles[keep]
@@ -0,0 +1,218 @@
+"""
+Spelling correction against the index vocabulary (SymSpell-style symmetric delete).
+
+At build time every vocabulary term is reduced to all the strings left after
+deleting up to max_distance characters from its first prefix_length
+characters, and each such "delete" points back at the terms that produce
+it. Two words within edit distance d share a delete of at most d
+characters, so a misspelled query word only has to generate its own
+deletes (a few dozen strings, however large the vocabulary is) and look
+them up; the handful of terms found are checked with a real edit distance.
+The vocabulary is never scanned per query.
+
+Among the terms within range that start with the same letter (typos there
+are rare, and it keeps real words like "thai" from turning into "chai")
+the closest wins, then the one in the most documents. Results (including
+"no correction") are kept in a small LRU keyed by the query word.
+
+Terms are indexed whatever their document frequency and skipped at lookup
+while it is 0, so an incremental edit (appended()) only has to index the
+terms it adds to the vocabulary and take the new frequencies.
+"""
+import threading
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional, Set
+
+import numpy as np
+
+MAX_EDIT_DISTANCE = 2
+PREFIX_LENGTH = 7
+# shorter words are left alone (abbreviations, typos too short to guess)
+MIN_CORRECTED_LENGTH = 4
+# words shorter than this get at most one edit
+TWO_EDITS_LENGTH = 6
+DEFAULT_MAX_CACHED = 4096
+
+
+class SpellIndex:
+    def __init__(
+        self,
+        vocabulary: Dict[str, int],
+        terms: List[str],
+        weights: np.ndarray,
+        max_distance: int = MAX_EDIT_DISTANCE,
+        prefix_length: int = PREFIX_LENGTH,
+        max_cached: int = DEFAULT_MAX_CACHED,
+        columns: Optional[np.ndarray] = None,
+    ):
+        # every known word (nothing in it is ever corrected); terms are the
+        # correction targets, weights their document frequencies (0: skipped),
+        # columns their vocabulary columns (needed by appended())
+        self.vocabulary = vocabulary
+        self.terms = terms
+        self.weights = weights
+        self.columns = columns
+        self.max_distance = max_distance
+        self.prefix_length = prefix_length
+        self.deletes: Dict[str, List[int]] = {}
+        for i, term in enumerate(terms):
+            for key in _deletes(term[:prefix_length], max_distance):
+                self.deletes.setdefault(key, []).append(i)
+        # deletes of the terms appended() added
+        self.added_deletes: Dict[str, List[int]] = {}
+
+        self.max_cached = max_cached
+        self._lock = threading.Lock()
+        self._cache: "OrderedDict[str, Optional[str]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    @classmethod
+    def build(cls, vocabulary: Dict[str, int], df: np.ndarray, **kwargs) -> "SpellIndex":
+        """Index the alphabetic terms of vocabulary; those in no live document are skipped by lookups."""
+        terms: List[str] = []
+        columns: List[int] = []
+        for term, col in vocabulary.items():
+            if len(term) >= 3 and term.isalpha():
+                terms.append(term)
+                columns.append(col)
+        columns = np.asarray(columns, dtype=np.int64)
+        return cls(vocabulary, terms, _weights(df, columns), columns=columns, **kwargs)
+
+    def appended(self, vocabulary: Dict[str, int], df: np.ndarray) -> "SpellIndex":
+        """
+        This index for an edited vocabulary (self's, with any new terms added
+        at the end, as incremental edits add them) and document frequencies.
+        Costs O(the new terms) plus one pass over the indexed terms' weights;
+        the correction cache starts empty.
+        """
+        new = SpellIndex.__new__(SpellIndex)
+        new.__dict__.update(self.__dict__)
+        new.vocabulary = vocabulary
+        if vocabulary is not self.vocabulary:
+            # edits add terms at the end of the dict: read it backwards to the old size
+            added = []
+            for term, col in reversed(vocabulary.items()):
+                if col < len(self.vocabulary):
+                    break
+                if len(term) >= 3 and term.isalpha():
+                    added.append((term, col))
+            added.reverse()
+            if added:
+                new.terms = self.terms + [term for term, _ in added]
+                new.columns = np.concatenate([self.columns, [col for _, col in added]])
+                new.added_deletes = {key: list(ids) for key, ids in self.added_deletes.items()}
+                for i, (term, _) in enumerate(added, start=len(self.terms)):
+                    for key in _deletes(term[:self.prefix_length], self.max_distance):
+                        new.added_deletes.setdefault(key, []).append(i)
+        new.weights = _weights(df, new.columns)
+        new._lock = threading.Lock()
+        new._cache = OrderedDict()
+        new.hits = new.misses = 0
+        return new
+
+    def __len__(self) -> int:
+        return int(np.count_nonzero(self.weights))
+
+    def distance_for(self, word: str) -> int:
+        """Most edits a correction of word may take."""
+        if len(word) < MIN_CORRECTED_LENGTH:
+            return 0
+        if len(word) < TWO_EDITS_LENGTH:
+            return min(1, self.max_distance)
+        return self.max_distance
+
+    def correct(self, word: str) -> Optional[str]:
+        """The closest indexed term to an unknown word, or None (known word, or nothing in range)."""
+        if word in self.vocabulary:
+            return None
+        with self._lock:
+            if word in self._cache:
+                self._cache.move_to_end(word)
+                self.hits += 1
+                return self._cache[word]
+            self.misses += 1
+
+        found = self._lookup(word)
+        if self.max_cached > 0:
+            with self._lock:
+                self._cache[word] = found
+                while len(self._cache) > self.max_cached:
+                    self._cache.popitem(last=False)
+        return found
+
+    def _lookup(self, word: str) -> Optional[str]:
+        limit = self.distance_for(word)
+        if limit == 0:
+            return None
+        seen: Set[int] = set()
+        for key in _deletes(word[:self.prefix_length], limit):
+            seen.update(self.deletes.get(key, ()))
+            seen.update(self.added_deletes.get(key, ()))
+
+        best, best_key = None, None
+        for i in seen:
+            term = self.terms[i]
+            if term[0] != word[0] or self.weights[i] == 0:
+                continue
+            distance = edit_distance(word, term, limit)
+            if distance > limit:
+                continue
+            key = (distance, -int(self.weights[i]), term)
+            if best_key is None or key < best_key:
+                best, best_key = term, key
+        return best
+
+    def stats(self) -> Dict[str, object]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "terms": len(self),
+                "deletes": len(self.deletes),
+                "size": len(self._cache),
+                "max_entries": self.max_cached,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+
+def _weights(df: np.ndarray, columns: np.ndarray) -> np.ndarray:
+    """df of each column (0 for columns past its end)."""
+    weights = np.zeros(len(columns), dtype=np.int64)
+    known = columns < len(df)
+    weights[known] = df[columns[known]]
+    return weights
+
+
+def _deletes(word: str, max_distance: int) -> Iterable[str]:
+    """word plus every string left after deleting 1..max_distance of its characters."""
+    found = {word}
+    frontier = {word}
+    for _ in range(max_distance):
+        frontier = {w[:i] + w[i + 1:] for w in frontier for i in range(len(w))} - found
+        found |= frontier
+    return found
+
+
+def edit_distance(a: str, b: str, limit: int) -> int:
+    """
+    Optimal string alignment distance (insert, delete, substitute, swap two
+    neighbours), or limit + 1 as soon as it is known to exceed limit.
+    """
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    before: Optional[List[int]] = None
+    previous = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        current = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            cost = 0 if a[i - 1] == b[j - 1] else 1
+            value = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if before is not None and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                value = min(value, before[j - 2] + 1)
+            current[j] = value
+        if min(current) > limit:
+            return limit + 1
+        before, previous = previous, current
+    return previous[-1] if previous[-1] <= limit else limit + 1
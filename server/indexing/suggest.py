@@ -0,0 +1,337 @@
+"""
+Prefix index for /suggest (search-box autocomplete).
+
+Entries are restaurant names, cuisines, categories and terms that occur in
+at least MIN_TERM_DOCS restaurants (but not in most of them, like "menu").
+Each has a popularity weight fixed at build time: a restaurant's is
+log1p(review_count) + rating (stars), a cuisine's, category's or term's the
+sum of that over the live restaurants carrying it (times TERM_WEIGHT for
+terms), so broad suggestions ("pizza") come before single places.
+
+Keys are the normalized text (lowercase words joined by one space), plus
+every later word start of a name ("house" finds "Dumpling House"), kept in
+one sorted list. The keys starting with a prefix are a contiguous range
+found by two binary searches; the best weights in that range are picked
+with a partial sort. Answers for prefixes of up to PRECOMPUTED_PREFIX
+characters, whose ranges are the longest, are computed at build time.
+
+Incremental edits do not rebuild the index (appended()): entries for the
+names, cuisines and categories the edit brings are kept in a short sorted
+list of their own, and entries whose last live restaurant was tombstoned
+are masked out, until the next full build. Weights stay as built, and
+terms are only counted by a build.
+"""
+import re
+from bisect import bisect_left, insort
+from typing import AbstractSet, Any, Dict, List, Mapping, Optional, Tuple
+
+import numpy as np
+from scipy import sparse
+
+try:
+    from server.indexing.catalog import RestaurantCatalog
+    from server.indexing.facets import FacetIndex, facet_values
+    from server.indexing.segments import RowMatrix, as_csr, overlay
+    from server.scoring import SignalColumns
+except ImportError:
+    from indexing.catalog import RestaurantCatalog
+    from indexing.facets import FacetIndex, facet_values
+    from indexing.segments import RowMatrix, as_csr, overlay
+    from scoring import SignalColumns
+
+MIN_TERM_DOCS = 3
+# terms in a larger share of the live restaurants are too generic to suggest
+MAX_TERM_SHARE = 0.5
+# terms rank below a cuisine or category that reaches as many restaurants
+TERM_WEIGHT = 0.5
+PRECOMPUTED_PREFIX = 2
+MAX_SUGGESTIONS = 20
+# sorts after every character a normalized key can hold
+_KEY_END = "\U0010ffff"
+_WORD = re.compile(r"\w+")
+
+
+def normalize(text: str) -> str:
+    return " ".join(_WORD.findall(text.lower()))
+
+
+def _keys(text: str, kind: str) -> List[str]:
+    """The keys an entry is found by: its normalized text, plus every later word start of a name."""
+    key = normalize(text)
+    if not key:
+        return []
+    if kind != "restaurant":
+        return [key]
+    words = key.split(" ")
+    return [" ".join(words[w:]) for w in range(len(words))]
+
+
+def _popularity(restaurants: RestaurantCatalog, signals: SignalColumns, rows: Any = slice(None)) -> np.ndarray:
+    """Popularity of the given rows (0 for tombstoned ones)."""
+    reviews = np.nan_to_num(np.asarray(restaurants.numbers("review_count")[rows], dtype=np.float64), nan=0.0)
+    popularity = np.log1p(np.maximum(reviews, 0.0)) + 5.0 * np.asarray(signals.rating[rows], dtype=np.float64)
+    return np.where(np.asarray(signals.live[rows], dtype=bool), popularity, 0.0)
+
+
+class SuggestIndex:
+    def __init__(
+        self,
+        entries: List[Tuple[str, str, Optional[str], float]],
+        rows: Optional[List[int]] = None,
+        runners_up: Optional[Dict[str, List[Tuple[float, int]]]] = None,
+    ):
+        """
+        entries: (text, kind, restaurant id or None, weight); one suggestion
+        each. appended() also needs rows (the catalog row of each restaurant
+        entry, -1 for the others) and runners_up (normalized name -> the
+        (weight, row) of the other live restaurants with that name).
+        """
+        self.texts = [e[0] for e in entries]
+        self.kinds = [e[1] for e in entries]
+        self.ids = [e[2] for e in entries]
+        self.weights = np.array([e[3] for e in entries], dtype=np.float64)
+        self.rows = np.array([-1] * len(entries) if rows is None else rows, dtype=np.int64)
+        self.runners_up = runners_up or {}
+
+        keyed: List[Tuple[str, int]] = []
+        # normalized text -> entry
+        self.entry_of: Mapping[str, int] = {}
+        for i, (text, kind, _, _) in enumerate(entries):
+            keys = _keys(text, kind)
+            keyed.extend((k, i) for k in keys)
+            if keys:
+                self.entry_of.setdefault(keys[0], i)
+        keyed.sort()
+        self.keys = [k for k, _ in keyed]
+        self.key_entries = np.array([i for _, i in keyed], dtype=np.int64)
+        self.key_weights = self.weights[self.key_entries] if len(keyed) else np.zeros(0)
+
+        # short prefixes have the longest ranges: answer them now
+        prefixes = {""} | {k[:n] for k in self.keys for n in range(1, PRECOMPUTED_PREFIX + 1)}
+        self._precomputed: Dict[str, List[int]] = {p: self._search(p, MAX_SUGGESTIONS) for p in prefixes}
+
+        # changes made by edits since the build (see appended()): the new
+        # entries (text, kind, id, weight, row), numbered after the built
+        # ones, their sorted (key, entry) pairs, and the entries taken out
+        self.added: List[Tuple[str, str, Optional[str], float, int]] = []
+        self.added_keys: List[Tuple[str, int]] = []
+        self.removed: AbstractSet[int] = frozenset()
+
+    @classmethod
+    def build(
+        cls,
+        restaurants: RestaurantCatalog,
+        signals: SignalColumns,
+        facets: FacetIndex,
+        tf_matrix: RowMatrix,
+        vocabulary: Dict[str, int],
+        min_term_docs: int = MIN_TERM_DOCS,
+        max_term_share: float = MAX_TERM_SHARE,
+    ) -> "SuggestIndex":
+        live = np.asarray(signals.live, dtype=bool)
+        popularity = _popularity(restaurants, signals)
+
+        entries: List[Tuple[str, str, Optional[str], float]] = []
+        entry_rows: List[int] = []
+        seen = set()
+
+        # one entry per distinct name: the most popular restaurant carrying it
+        names: Dict[str, List[Tuple[float, int]]] = {}
+        for row in np.flatnonzero(live):
+            name = restaurants.value(int(row), "name")
+            if isinstance(name, str) and normalize(name):
+                names.setdefault(normalize(name), []).append((float(popularity[row]), int(row)))
+        runners_up: Dict[str, List[Tuple[float, int]]] = {}
+        for key, found in names.items():
+            weight, row = max(found, key=lambda f: (f[0], -f[1]))
+            if len(found) > 1:
+                runners_up[key] = [f for f in found if f[1] != row]
+            entries.append(_name_entry(restaurants, row, weight))
+            entry_rows.append(row)
+            seen.add(key)
+
+        for field, kind in (("cuisines", "cuisine"), ("categories", "category")):
+            for value, rows in facets.postings[field].items():
+                weight = float(popularity[rows].sum())
+                if weight > 0 and normalize(value) not in seen:
+                    entries.append((value, kind, None, weight))
+                    entry_rows.append(-1)
+                    seen.add(normalize(value))
+
+        # terms: summed over the rows whose text contains them (binary counts)
+        tf = as_csr(tf_matrix)
+        row_of = np.repeat(np.arange(tf.shape[0]), np.diff(tf.indptr))
+        docs = np.bincount(tf.indices, weights=live[row_of].astype(np.float64), minlength=tf.shape[1])
+        weights = TERM_WEIGHT * np.bincount(tf.indices, weights=popularity[row_of], minlength=tf.shape[1])
+        max_docs = max_term_share * np.count_nonzero(live)
+        for term, col in vocabulary.items():
+            if col >= len(docs) or not min_term_docs <= docs[col] <= max_docs:
+                continue
+            if term.isalpha() and term not in seen:
+                entries.append((term, "term", None, float(weights[col])))
+                entry_rows.append(-1)
+                seen.add(term)
+
+        return cls(entries, entry_rows, runners_up)
+
+    def __len__(self) -> int:
+        return len(self.texts) + len(self.added) - len(self.removed)
+
+    def _entry(self, i: int) -> Tuple[str, str, Optional[str], float, int]:
+        """(text, kind, restaurant id or None, weight, row or -1) of entry i."""
+        if i < len(self.texts):
+            return self.texts[i], self.kinds[i], self.ids[i], float(self.weights[i]), int(self.rows[i])
+        return self.added[i - len(self.texts)]
+
+    # ----------------------------
+    # Edits
+    # ----------------------------
+    def appended(
+        self,
+        restaurants: RestaurantCatalog,
+        signals: SignalColumns,
+        facets: FacetIndex,
+        start: int,
+        was_live: np.ndarray,
+    ) -> "SuggestIndex":
+        """
+        This index after an edit that appended rows start.. of restaurants
+        and tombstoned some of the earlier ones (was_live: the live flags
+        before it). Costs O(the changed rows) plus one pass over the live
+        flags, and leaves self as it was.
+        """
+        new = SuggestIndex.__new__(SuggestIndex)
+        new.__dict__.update(self.__dict__)
+        new.added = list(self.added)
+        new.added_keys = list(self.added_keys)
+        new.runners_up = dict(self.runners_up)
+        new.entry_of = overlay(self.entry_of)
+        removed = set(self.removed)
+        live = np.asarray(signals.live, dtype=bool)
+
+        def add(text: str, kind: str, rid: Optional[str], weight: float, row: int = -1) -> None:
+            entry = len(new.texts) + len(new.added)
+            new.added.append((text, kind, rid, weight, row))
+            keys = _keys(text, kind)
+            new.entry_of = new.entry_of.updated(keys[0], entry)
+            for key in keys:
+                insort(new.added_keys, (key, entry))
+
+        def remove(entry: int) -> None:
+            removed.add(entry)
+            new.entry_of = new.entry_of.updated(normalize(new._entry(entry)[0]), None)
+
+        def entry_of_kind(key: str, kind: str) -> Optional[int]:
+            entry = new.entry_of.get(key)
+            return entry if entry is not None and new._entry(entry)[1] == kind else None
+
+        # tombstoned rows: their name passes to the next most popular
+        # restaurant carrying it, if any; cuisines and categories go once
+        # no live restaurant has them
+        for row in np.flatnonzero(np.asarray(was_live[:start], dtype=bool) & ~live[:start]).tolist():
+            name = restaurants.value(row, "name")
+            key = normalize(name) if isinstance(name, str) else ""
+            others = [f for f in new.runners_up.pop(key, []) if f[1] != row and live[f[1]]]
+            entry = entry_of_kind(key, "restaurant") if key else None
+            if entry is not None and new._entry(entry)[4] == row:
+                remove(entry)
+                if others:
+                    weight, best = max(others, key=lambda f: (f[0], -f[1]))
+                    add(*_name_entry(restaurants, best, weight), best)
+                    others = [f for f in others if f[1] != best]
+            if others:
+                new.runners_up[key] = others
+            for field, kind in (("cuisines", "cuisine"), ("categories", "category")):
+                for value in set(facet_values(field, restaurants.value(row, field))):
+                    entry = entry_of_kind(normalize(value), kind)
+                    if entry is not None and not live[facets.rows(field, value)].any():
+                        remove(entry)
+
+        # appended rows: names, cuisines and categories without an entry get one
+        appended = np.arange(start, len(restaurants))
+        for row, weight in zip(appended.tolist(), _popularity(restaurants, signals, appended).tolist()):
+            if not live[row]:
+                continue
+            name = restaurants.value(row, "name")
+            key = normalize(name) if isinstance(name, str) else ""
+            entry = new.entry_of.get(key) if key else None
+            if key and entry is None:
+                add(*_name_entry(restaurants, row, weight), row)
+            elif key and new._entry(entry)[1] == "restaurant":
+                _, _, _, best_weight, best = new._entry(entry)
+                if weight > best_weight:
+                    remove(entry)
+                    add(*_name_entry(restaurants, row, weight), row)
+                    weight, row = best_weight, best
+                new.runners_up[key] = new.runners_up.get(key, []) + [(weight, row)]
+            for field, kind in (("cuisines", "cuisine"), ("categories", "category")):
+                for value in set(facet_values(field, restaurants.value(row, field))):
+                    if weight > 0 and normalize(value) and normalize(value) not in new.entry_of:
+                        add(value, kind, None, weight)
+
+        new.removed = frozenset(removed)
+        return new
+
+    # ----------------------------
+    # Queries
+    # ----------------------------
+    def suggest(self, prefix: str, limit: int = MAX_SUGGESTIONS) -> List[Dict[str, Any]]:
+        """Up to limit suggestions whose normalized text (or a later word of a name) starts with prefix, best first."""
+        key = normalize(prefix)
+        # removed entries are dropped from the answer: ask for that many more
+        want = limit + len(self.removed)
+        found = self._precomputed.get(key) if want <= MAX_SUGGESTIONS else None
+        if found is None:
+            found = self._search(key, want)
+        if self.added or self.removed:
+            found = self._with_changes(key, found)
+        out = []
+        for i in found[:limit]:
+            text, kind, rid = self._entry(i)[:3]
+            item: Dict[str, Any] = {"text": text, "kind": kind}
+            if rid is not None:
+                item["id"] = rid
+            out.append(item)
+        return out
+
+    def _with_changes(self, key: str, found: List[int]) -> List[int]:
+        """found without the removed entries, merged by weight with the added ones matching key."""
+        lo = bisect_left(self.added_keys, (key,))
+        hi = bisect_left(self.added_keys, (key + _KEY_END,), lo)
+        merged = [i for i in found if i not in self.removed]
+        for _, entry in self.added_keys[lo:hi]:
+            if entry not in self.removed and entry not in merged:
+                merged.append(entry)
+        # stable: equal weights keep the built order, then key order
+        merged.sort(key=lambda i: -self._entry(i)[3])
+        return merged
+
+    def _search(self, key: str, limit: int) -> List[int]:
+        """Entry ids for the keys starting with key: weight descending, ties by key; each entry once."""
+        lo = bisect_left(self.keys, key)
+        hi = bisect_left(self.keys, key + _KEY_END, lo)
+        if lo == hi:
+            return []
+        weights = self.key_weights[lo:hi]
+        # a name can have several keys in range; a few spares cover the repeats
+        want = min(len(weights), 2 * limit)
+        while True:
+            if want < len(weights):
+                picked = np.argpartition(-weights, want - 1)[:want]
+            else:
+                picked = np.arange(len(weights))
+            picked = picked[np.lexsort((picked, -weights[picked]))]
+            found: List[int] = []
+            for entry in self.key_entries[lo + picked]:
+                if entry not in found:
+                    found.append(int(entry))
+                    if len(found) == limit:
+                        return found
+            if want >= len(weights):
+                return found
+            want = min(len(weights), 2 * want)
+
+
+def _name_entry(restaurants: RestaurantCatalog, row: int, weight: float) -> Tuple[str, str, Optional[str], float]:
+    rid = restaurants.value(row, "id")
+    return restaurants.value(row, "name"), "restaurant", rid if isinstance(rid, str) else None, weight
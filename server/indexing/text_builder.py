@@ -31,17 +31,14 @@ def expand_tags(tags: List[str]) -> List[str]:
             expanded.append(t.replace("_", " "))
     return expanded
 
-def build_doc_text(r: Dict[str, Any]) -> str:
-    """
-    Build the TF-IDF document text for one restaurant object.
+# Fields of a document, in the order build_doc_text concatenates them
+DOC_FIELDS = ("name", "cuisines", "categories", "menu_text", "price", "dietary")
 
-    Uses schema fields:
-    - name (str)
-    - cuisines (list[str] | null)
-    - categories (list[str] | null)
-    - menu_text (str | null)
-    - dietary_tags (list[str])
-    - price_level (int 1..4)
+
+def build_doc_fields(r: Dict[str, Any]) -> Dict[str, str]:
+    """
+    The text of each DOC_FIELDS field of one restaurant object, not yet
+    normalized (dietary tags appear once here; build_doc_text repeats them).
     """
     name = r.get("name", "") or ""
     cuisines = _as_str_list(r.get("cuisines"))
@@ -57,16 +54,33 @@ def build_doc_text(r: Dict[str, Any]) -> str:
     if isinstance(pl, int) and 1 <= pl <= 4:
         price_token = "$" * pl
 
-    parts: List[str] = []
-    parts.append(name)
-    parts.extend(cuisines)
-    parts.extend(categories)
-    parts.append(menu_text)
-    parts.append(price_token)
+    return {
+        "name": name,
+        "cuisines": " ".join(c for c in cuisines if c),
+        "categories": " ".join(c for c in categories if c),
+        "menu_text": menu_text,
+        "price": price_token,
+        "dietary": " ".join(t for t in expanded_dietary if t),
+    }
+
+
+def build_doc_text(r: Dict[str, Any]) -> str:
+    """
+    Build the TF-IDF document text for one restaurant object.
+
+    Uses schema fields:
+    - name (str)
+    - cuisines (list[str] | null)
+    - categories (list[str] | null)
+    - menu_text (str | null)
+    - dietary_tags (list[str])
+    - price_level (int 1..4)
+    """
+    fields = build_doc_fields(r)
+    parts: List[str] = [fields[f] for f in DOC_FIELDS]
 
     # Upweight dietary tags by repeating them
-    parts.extend(expanded_dietary)
-    parts.extend(expanded_dietary)
+    parts.append(fields["dietary"])
 
     # Remove empties and normalize
-    return _clean(" ".join(p for p in parts if p))
\ No newline at end of file
+    return _clean(" ".join(p for p in parts if p))
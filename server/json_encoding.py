@@ -0,0 +1,27 @@
+# server/json_encoding.py
+"""
+JSON to bytes for response bodies: orjson when it is installed, the standard
+library otherwise. Both produce compact UTF-8 JSON that parses to the same
+values, so pre-serialized fragments from either can be stitched together.
+"""
+import json
+from typing import Any
+
+try:
+    import orjson
+except ImportError:  # optional dependency
+    orjson = None
+
+
+def dumps(obj: Any) -> bytes:
+    if orjson is not None:
+        try:
+            return orjson.dumps(obj)
+        except TypeError:
+            pass  # e.g. ints wider than 64 bits; the standard library handles them
+    return json.dumps(obj, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
+
+
+def dumps_members(obj: dict) -> bytes:
+    """The members of a JSON object without the surrounding braces, ready to be joined with b","."""
+    return dumps(obj)[1:-1]
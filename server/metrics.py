@@ -0,0 +1,177 @@
+# server/metrics.py
+"""
+Hot-path metrics in the Prometheus text format, standard library only.
+
+Histograms have fixed buckets and take one lock per observe_many() call, so a
+request's whole stage breakdown costs a few perf_counter() calls plus one lock
+acquisition. Values that already live elsewhere (cache hit counts, index size,
+profile count) are read at scrape time through collectors instead of being
+counted twice on the hot path.
+
+    timer = StageTimer()
+    ... ; timer.lap("filter")
+    ... ; timer.lap("score")
+    timer.finish(STAGE_SECONDS, "recommend")
+    response.headers["Server-Timing"] = timer.server_timing()
+"""
+import bisect
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+# 50us .. 10s
+LATENCY_BUCKETS = (
+    0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 10.0
+)
+# 10ms .. 30min
+BUILD_BUCKETS = (0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0, 30.0, 60.0, 300.0, 1800.0)
+COUNT_BUCKETS = (0, 1, 10, 100, 1000, 10_000, 100_000, 1_000_000)
+
+# name, type, help, [(name suffix, labels, value)]
+Sample = Tuple[str, Dict[str, str], float]
+Family = Tuple[str, str, str, List[Sample]]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(str(v))}"' for k, v in labels.items()) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class Histogram:
+    """Cumulative-bucket histogram, optionally split by label values."""
+
+    def __init__(self, name: str, help: str, buckets: Sequence[float], labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.buckets = tuple(buckets)
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        # label values -> [per-bucket counts (+Inf last), sum, count]
+        self._series: Dict[Tuple[str, ...], list] = {}
+
+    def _series_for(self, labels: Tuple[str, ...]) -> list:
+        series = self._series.get(labels)
+        if series is None:
+            series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        return series
+
+    def observe(self, value: float, *labels: str) -> None:
+        self.observe_many([(labels, value)])
+
+    def observe_many(self, observations: Iterable[Tuple[Tuple[str, ...], float]]) -> None:
+        with self._lock:
+            for labels, value in observations:
+                series = self._series_for(labels)
+                series[0][bisect.bisect_left(self.buckets, value)] += 1
+                series[1] += value
+                series[2] += 1
+
+    def collect(self) -> Family:
+        samples: List[Sample] = []
+        with self._lock:
+            series = [(labels, list(s[0]), s[1], s[2]) for labels, s in self._series.items()]
+        for labels, counts, total, count in sorted(series):
+            base = dict(zip(self.labelnames, labels))
+            cumulative = 0
+            for bound, n in zip(self.buckets + (float("inf"),), counts):
+                cumulative += n
+                samples.append(("_bucket", {**base, "le": _format_value(bound)}, cumulative))
+            samples.append(("_sum", base, total))
+            samples.append(("_count", base, count))
+        return self.name, "histogram", self.help, samples
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._histograms: List[Histogram] = []
+        self._collectors: List[Callable[[], Iterable[Family]]] = []
+
+    def histogram(self, name: str, help: str, buckets: Sequence[float], labelnames: Sequence[str] = ()) -> Histogram:
+        h = Histogram(name, help, buckets, labelnames)
+        self._histograms.append(h)
+        return h
+
+    def collector(self, fn: Callable[[], Iterable[Family]]) -> Callable[[], Iterable[Family]]:
+        """Register fn (usable as a decorator); it returns metric families read at scrape time."""
+        self._collectors.append(fn)
+        return fn
+
+    def render(self) -> str:
+        """Every metric in the Prometheus text exposition format (version 0.0.4)."""
+        families: List[Family] = [h.collect() for h in self._histograms]
+        for fn in self._collectors:
+            families.extend(fn())
+
+        # families yielded more than once (e.g. per label value) are merged under one header
+        merged: Dict[str, Family] = {}
+        for name, kind, help, samples in families:
+            if name in merged:
+                merged[name][3].extend(samples)
+            else:
+                merged[name] = (name, kind, help, list(samples))
+
+        lines: List[str] = []
+        for name, kind, help, samples in merged.values():
+            lines.append(f"# HELP {name} {help}")
+            lines.append(f"# TYPE {name} {kind}")
+            for suffix, labels, value in samples:
+                lines.append(f"{name}{suffix}{_format_labels(labels)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+def gauge(name: str, help: str, value: Optional[float], labels: Optional[Dict[str, str]] = None) -> Family:
+    return name, "gauge", help, [] if value is None else [("", labels or {}, value)]
+
+
+def counter(name: str, help: str, value: float, labels: Optional[Dict[str, str]] = None) -> Family:
+    return name, "counter", help, [("", labels or {}, value)]
+
+
+class StageTimer:
+    """Wall time of each stage of one request; repeated stages add up."""
+
+    __slots__ = ("stages", "started", "_last")
+
+    def __init__(self):
+        self.stages: Dict[str, float] = {}
+        self.started = self._last = time.perf_counter()
+
+    def lap(self, stage: str) -> None:
+        """Charge the time since the previous lap (or the start) to stage."""
+        now = time.perf_counter()
+        self.stages[stage] = self.stages.get(stage, 0.0) + (now - self._last)
+        self._last = now
+
+    def add(self, stage: str, seconds: float) -> None:
+        """Charge seconds measured inside the current lap to stage; the next lap() leaves them out."""
+        self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+        self._last += seconds
+
+    def total(self) -> float:
+        return time.perf_counter() - self.started
+
+    def finish(self, histogram: Histogram, endpoint: str) -> float:
+        """Record every stage plus "total" under endpoint; returns the total."""
+        total = self.total()
+        observations = [((endpoint, stage), seconds) for stage, seconds in self.stages.items()]
+        observations.append(((endpoint, "total"), total))
+        histogram.observe_many(observations)
+        self.stages["total"] = total
+        return total
+
+    def server_timing(self) -> str:
+        """The stages as a Server-Timing header value (durations in milliseconds)."""
+        return ", ".join(f"{stage};dur={seconds * 1000.0:.3f}" for stage, seconds in self.stages.items())
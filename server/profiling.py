@@ -0,0 +1,198 @@
+# server/profiling.py
+"""
+On-demand profiling of live requests.
+
+RequestProfiler.start(n) arms a session; the next n calls to functions
+wrapped with @profiler.profiled are profiled, then the session is finished
+and its aggregate returned. Two modes:
+
+  cprofile  a cProfile.Profile per call, merged into one pstats.Stats
+            (text report, or the marshalled stats pstats/snakeviz can load)
+  sample    a background thread samples the stacks of threads inside profiled
+            calls every interval seconds, aggregated as collapsed stacks
+            ("outer;inner;leaf count", the flamegraph.pl input format)
+
+While no session is armed a wrapped call costs one extra function call and
+an attribute check.
+Only one session runs at a time.
+"""
+import cProfile
+import functools
+import io
+import marshal
+import pstats
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional
+
+MODES = ("cprofile", "sample")
+DEFAULT_SAMPLE_INTERVAL = 0.005
+
+
+class ProfileSession:
+    def __init__(self, requests: int, mode: str, interval: float):
+        self.session_id = uuid.uuid4().hex[:12]
+        self.mode = mode
+        self.requested = requests
+        self.interval = interval
+        self.started_at = time.time()
+        self.finished_at: Optional[float] = None
+
+        self._lock = threading.Lock()
+        self._claimed = 0
+        self.completed = 0
+        self.done = threading.Event()
+
+        self.stats: Optional[pstats.Stats] = None
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        # thread id -> code object of the profiled call's wrapper frame (where stacks are cut)
+        self.threads: Dict[int, Any] = {}
+
+    def claim(self) -> bool:
+        with self._lock:
+            if self._claimed >= self.requested:
+                return False
+            self._claimed += 1
+            return True
+
+    def release(self, profiled: bool) -> None:
+        """End a claimed call; unprofiled ones (cProfile was busy) give their slot back."""
+        with self._lock:
+            if not profiled:
+                self._claimed -= 1
+                return
+            self.completed += 1
+            if self.completed >= self.requested:
+                self.done.set()
+
+    def add_profile(self, profile: cProfile.Profile) -> None:
+        with self._lock:
+            if self.stats is None:
+                self.stats = pstats.Stats(profile)
+            else:
+                self.stats.add(profile)
+
+    def summary(self) -> Dict[str, Any]:
+        finished = self.finished_at or time.time()
+        return {
+            "session_id": self.session_id,
+            "mode": self.mode,
+            "requested": self.requested,
+            "profiled": self.completed,
+            "samples": self.samples,
+            "seconds": round(finished - self.started_at, 3),
+        }
+
+    def pstats_text(self, sort: str = "cumulative", limit: int = 50) -> str:
+        if self.stats is None:
+            return "no requests were profiled\n"
+        out = io.StringIO()
+        stats = pstats.Stats(stream=out)
+        stats.add(self.stats)
+        stats.sort_stats(sort).print_stats(limit)
+        return out.getvalue()
+
+    def pstats_dump(self) -> bytes:
+        """What pstats.Stats.dump_stats() writes, so pstats.Stats(path) can read it back."""
+        return marshal.dumps(self.stats.stats if self.stats is not None else {})
+
+    def collapsed(self) -> str:
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+
+def _frame_name(code) -> str:
+    return f"{code.co_name} ({Path(code.co_filename).name}:{code.co_firstlineno})"
+
+
+class RequestProfiler:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._session: Optional[ProfileSession] = None
+        self._sampler: Optional[threading.Thread] = None
+
+    @property
+    def session(self) -> Optional[ProfileSession]:
+        """The armed session, if any."""
+        return self._session
+
+    def start(self, requests: int, mode: str = "cprofile", interval: float = DEFAULT_SAMPLE_INTERVAL) -> ProfileSession:
+        """Arm a session for the next `requests` profiled calls. Raises RuntimeError if one is running."""
+        if mode not in MODES:
+            raise ValueError(f"mode must be one of {MODES}")
+        with self._lock:
+            if self._session is not None:
+                raise RuntimeError(f"profiling session {self._session.session_id} is already running")
+            session = ProfileSession(requests, mode, interval)
+            if mode == "sample":
+                self._sampler = threading.Thread(
+                    target=self._sample, args=(session,), name="request-sampler", daemon=True
+                )
+                self._sampler.start()
+            self._session = session
+            return session
+
+    def finish(self, session: ProfileSession) -> ProfileSession:
+        """Disarm the session (also when it timed out short of its request count)."""
+        with self._lock:
+            if self._session is session:
+                self._session = None
+            sampler, self._sampler = self._sampler, None
+        session.finished_at = time.time()
+        session.done.set()
+        if sampler is not None:
+            sampler.join()
+        return session
+
+    def profiled(self, fn: Callable) -> Callable:
+        """Decorator: calls to fn are profiled while a session is armed and has slots left."""
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            session = self._session
+            if session is None or not session.claim():
+                return fn(*args, **kwargs)
+            return self._call(session, fn, args, kwargs)
+
+        return wrapper
+
+    def _call(self, session: ProfileSession, fn: Callable, args, kwargs):
+        if session.mode == "sample":
+            tid = threading.get_ident()
+            session.threads[tid] = sys._getframe().f_code
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                session.threads.pop(tid, None)
+                session.release(True)
+
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            # another profiler owns this interpreter (Python 3.12+ allows only one)
+            session.release(False)
+            return fn(*args, **kwargs)
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            profile.disable()
+            session.add_profile(profile)
+            session.release(True)
+
+    def _sample(self, session: ProfileSession) -> None:
+        while not session.done.wait(session.interval):
+            frames = sys._current_frames()
+            for tid, stop_code in list(session.threads.items()):
+                frame = frames.get(tid)
+                stack = []
+                while frame is not None and frame.f_code is not stop_code:
+                    stack.append(_frame_name(frame.f_code))
+                    frame = frame.f_back
+                if stack:
+                    session.stacks[";".join(reversed(stack))] += 1
+                    session.samples += 1
@@ -1,26 +1,131 @@
 # server/query_processing.py
+import json
+import re
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple, Union
 
+from sklearn.feature_extraction.text import ENGLISH_STOP_WORDS
+
+try:
+    from server.indexing.spelling import SpellIndex
+except ImportError:
+    from indexing.spelling import SpellIndex
+
+# Built-in synonyms, used when no synonyms file is configured
 SYNONYMS = {
     "boba": "bubble tea",
     "bbq": "barbecue",
     "veg": "vegetarian",
 }
 
+# Words people search with that are not in restaurant text; never "corrected"
+QUERY_WORDS = frozenset({
+    "food", "restaurant", "restaurants", "near", "nearby", "campus", "open", "best",
+    "good", "cheap", "late", "night", "tonight", "today", "place", "places", "spot",
+    "spots", "around", "close", "delivery", "takeout", "quick", "fast",
+})
+
+_TOKEN = re.compile(r"\w+")
+# marks the end of a phrase in the trie ("" is never a token)
+_END = ""
+
+
+def tokenize(text: str) -> List[str]:
+    return _TOKEN.findall(text.lower())
+
+
+def load_synonyms(path: Path) -> Dict[str, List[str]]:
+    """phrase -> expansions from a JSON object (values: a string or a list of strings)."""
+    with Path(path).open("r", encoding="utf-8") as f:
+        raw = json.load(f)
+    if not isinstance(raw, dict):
+        raise ValueError(f"{path}: expected a JSON object of phrase -> expansions")
+    return {phrase: [value] if isinstance(value, str) else list(value) for phrase, value in raw.items()}
+
+
+class PhraseMatcher:
+    """
+    Token trie over synonym phrases ("bubble tea", "mac and cheese"), so a
+    query is matched in one left-to-right pass, longest phrase first.
+    """
+
+    def __init__(self, synonyms: Dict[str, Union[str, Sequence[str]]]):
+        self.root: Dict[str, dict] = {}
+        # every token of every phrase (spelling correction leaves them alone)
+        self.words = set()
+        for phrase, expansions in synonyms.items():
+            tokens = tokenize(phrase)
+            if not tokens:
+                continue
+            node = self.root
+            for token in tokens:
+                node = node.setdefault(token, {})
+            node[_END] = [expansions] if isinstance(expansions, str) else list(expansions)
+            self.words.update(tokens)
+
+    def match(self, tokens: List[str], start: int) -> Tuple[int, List[str]]:
+        """(end, expansions) of the longest phrase at tokens[start:end]; (start, []) when none."""
+        node, end, expansions = self.root, start, []
+        for i in range(start, len(tokens)):
+            node = node.get(tokens[i])
+            if node is None:
+                break
+            if _END in node:
+                end, expansions = i + 1, node[_END]
+        return end, expansions
+
+
+DEFAULT_PHRASES = PhraseMatcher(SYNONYMS)
 
-def expand_query(query: str) -> str:
+
+def expand_query(
+    query: str,
+    phrases: PhraseMatcher = DEFAULT_PHRASES,
+    spelling: Optional[SpellIndex] = None,
+) -> Tuple[str, Dict[str, str]]:
     """
-    Replace common shorthand with expanded terms
-    so TF-IDF can match more documents.
+    Correct misspelled words against the index vocabulary (skipped when
+    spelling is None), then put synonyms in front of the phrases they
+    expand, so TF-IDF can match more documents.
+    Returns (expanded text, {misspelled word: correction}).
     """
     if not query:
-        return ""
+        return "", {}
+
+    tokens = tokenize(query)
+    corrections: Dict[str, str] = {}
+    if spelling is not None:
+        for i, token in enumerate(tokens):
+            if _correctable(token, phrases):
+                fixed = spelling.correct(token)
+                if fixed is not None:
+                    corrections[token] = fixed
+                    tokens[i] = fixed
+
+    expanded: List[str] = []
+    i = 0
+    while i < len(tokens):
+        end, synonyms = phrases.match(tokens, i)
+        if end == i:
+            expanded.append(tokens[i])
+            i += 1
+        else:
+            expanded.extend(synonyms)
+            expanded.extend(tokens[i:end])
+            i = end
+
+    return " ".join(expanded), corrections
+
 
-    words = query.lower().split()
-    expanded = []
+def _correctable(token: str, phrases: PhraseMatcher) -> bool:
+    return (
+        token.isalpha()
+        and token not in ENGLISH_STOP_WORDS
+        and token not in QUERY_WORDS
+        and token not in phrases.words
+    )
 
-    for w in words:
-        if w in SYNONYMS:
-            expanded.append(SYNONYMS[w])
-        expanded.append(w)
 
-    return " ".join(expanded)
\ No newline at end of file
+def format_corrections(corrections: Dict[str, str]) -> str:
+    """Header form: "piza=pizza, shawarrma=shawarma"."""
+    return ", ".join(f"{word}={fixed}" for word, fixed in corrections.items())
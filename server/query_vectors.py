@@ -0,0 +1,206 @@
+# server/query_vectors.py
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+from scipy import sparse
+
+DEFAULT_MAX_VECTORS = 4096
+DEFAULT_MAX_BATCH = 64
+
+
+class QueryVectorCache:
+    """
+    Bounded LRU of expanded query text -> sparse TF-IDF query vector (1 x V).
+
+    Vectors are only valid for the vectorizer that produced them; the cache
+    holds a reference to that vectorizer and empties itself when asked about
+    a different one (a refit, compaction or vocabulary growth).
+    """
+
+    def __init__(self, max_entries: int = DEFAULT_MAX_VECTORS):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._vectors: "OrderedDict[str, sparse.csr_matrix]" = OrderedDict()
+        self._vectorizer: Any = None
+        self.hits = 0
+        self.misses = 0
+
+    def _check_vectorizer(self, vectorizer: Any) -> None:
+        if vectorizer is not self._vectorizer:
+            self._vectors.clear()
+            self._vectorizer = vectorizer
+
+    def lookup(self, vectorizer: Any, texts: List[str]) -> List[Optional[sparse.csr_matrix]]:
+        with self._lock:
+            self._check_vectorizer(vectorizer)
+            found: List[Optional[sparse.csr_matrix]] = []
+            for text in texts:
+                vec = self._vectors.get(text)
+                if vec is None:
+                    self.misses += 1
+                else:
+                    self._vectors.move_to_end(text)
+                    self.hits += 1
+                found.append(vec)
+            return found
+
+    def store(self, vectorizer: Any, texts: List[str], vectors: List[sparse.csr_matrix]) -> None:
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._check_vectorizer(vectorizer)
+            for text, vec in zip(texts, vectors):
+                self._vectors[text] = vec
+                self._vectors.move_to_end(text)
+            while len(self._vectors) > self.max_entries:
+                self._vectors.popitem(last=False)
+
+    def vectors(self, vectorizer: Any, texts: List[str]) -> sparse.csr_matrix:
+        """Query vectors for texts as one (len(texts) x V) matrix; misses share one transform call."""
+        found = self.lookup(vectorizer, texts)
+        missing = sorted({t for t, v in zip(texts, found) if v is None})
+        if missing:
+            fresh = sparse.csr_matrix(vectorizer.transform(missing))
+            rows = [fresh[i] for i in range(len(missing))]
+            self.store(vectorizer, missing, rows)
+            by_text = dict(zip(missing, rows))
+            found = [v if v is not None else by_text[t] for t, v in zip(texts, found)]
+        return sparse.vstack(found, format="csr")
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._vectors),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+
+class _Pending:
+    __slots__ = ("matrix", "vectorizer", "text", "result", "error", "promoted", "done", "vectorize_s", "matmul_s")
+
+    def __init__(self, matrix, vectorizer, text: str):
+        self.matrix = matrix
+        self.vectorizer = vectorizer
+        self.text = text
+        self.result: Optional[np.ndarray] = None
+        self.error: Optional[BaseException] = None
+        self.promoted = False
+        self.done = threading.Event()
+        # time the whole batch this query ran in spent on each step
+        self.vectorize_s = 0.0
+        self.matmul_s = 0.0
+
+
+class QueryBatcher:
+    """
+    Micro-batches similarity lookups from concurrent requests.
+
+    The first caller computes right away (no added latency when idle).
+    Callers arriving while a batch is running queue up; when it finishes,
+    the oldest waiter is promoted and runs every queued query as one
+    vectorizer.transform plus one tfidf_matrix @ Q.T.
+    """
+
+    def __init__(self, vector_cache: Optional[QueryVectorCache] = None, max_batch: int = DEFAULT_MAX_BATCH):
+        self.vector_cache = vector_cache if vector_cache is not None else QueryVectorCache()
+        self.max_batch = max_batch
+
+        self._lock = threading.Lock()
+        self._queue: List[_Pending] = []
+        self._running = False
+
+        self.batches = 0
+        self.queries = 0
+        self.largest_batch = 0
+
+    def similarity(self, tfidf_matrix, vectorizer, query_text: str, timer=None) -> np.ndarray:
+        """
+        tfidf_matrix @ vectorize(query_text).T as a dense 1-D array. With a
+        StageTimer, charges the batch's vectorize and matmul time to it and the
+        rest of the call (waiting for earlier batches) to "batch_wait".
+        """
+        item = _Pending(tfidf_matrix, vectorizer, query_text)
+        with self._lock:
+            self._queue.append(item)
+            lead = not self._running
+            if lead:
+                self._running = True
+
+        if not lead:
+            item.done.wait()
+            lead = item.promoted
+
+        if lead:
+            self._lead()
+
+        if item.error is not None:
+            raise item.error
+        if timer is not None:
+            timer.add("vectorize", item.vectorize_s)
+            timer.add("matmul", item.matmul_s)
+            timer.lap("batch_wait")
+        return item.result
+
+    def _lead(self) -> None:
+        with self._lock:
+            batch = self._queue[: self.max_batch]
+            del self._queue[: self.max_batch]
+
+        self._run(batch)
+
+        with self._lock:
+            if self._queue:
+                nxt = self._queue[0]
+                nxt.promoted = True
+                nxt.done.set()
+            else:
+                self._running = False
+
+    def _run(self, batch: List[_Pending]) -> None:
+        # Normally one group; two only while a new snapshot is being swapped in
+        groups: Dict[int, List[_Pending]] = {}
+        for item in batch:
+            groups.setdefault(id(item.matrix), []).append(item)
+
+        for items in groups.values():
+            try:
+                matrix = items[0].matrix
+                started = time.perf_counter()
+                Q = self.vector_cache.vectors(items[0].vectorizer, [it.text for it in items])
+                vectorized = time.perf_counter()
+                # column j of matrix @ Q.T is exactly matrix @ q_j.T
+                S = (matrix @ Q.T).T.toarray()
+                finished = time.perf_counter()
+                for j, it in enumerate(items):
+                    it.result = S[j]
+                    it.vectorize_s = vectorized - started
+                    it.matmul_s = finished - vectorized
+            except Exception as e:
+                for it in items:
+                    it.error = e
+
+        with self._lock:
+            self.batches += 1
+            self.queries += len(batch)
+            self.largest_batch = max(self.largest_batch, len(batch))
+
+        for it in batch:
+            if not it.promoted:
+                it.done.set()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "batches": self.batches,
+                "queries": self.queries,
+                "avg_batch": round(self.queries / self.batches, 3) if self.batches else 0.0,
+                "largest_batch": self.largest_batch,
+                "queued": len(self._queue),
+            }
@@ -0,0 +1,138 @@
+# server/result_cache.py
+import json
+import threading
+import time
+from collections import Counter, OrderedDict
+from pathlib import Path
+from typing import Any, Callable, Dict, Hashable, Iterator, Optional, Tuple
+
+DEFAULT_MAX_ENTRIES = 4096
+DEFAULT_TTL_SECONDS = 300.0
+
+
+def normalize_query(query: Optional[str]) -> str:
+    """Case/whitespace-insensitive form of a query (expand_query lowercases and splits anyway)."""
+    return " ".join((query or "").lower().split())
+
+
+class ResultCache:
+    """
+    Bounded LRU cache with a per-entry TTL.
+
+    Entries belong to one index version: the first get/put with a newer
+    version drops everything, so a /refresh or catalog edit never serves
+    results ranked against the previous snapshot. Per-user staleness is
+    handled by putting the profile version in the key.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = DEFAULT_MAX_ENTRIES,
+        ttl_seconds: float = DEFAULT_TTL_SECONDS,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._clock = clock
+
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self._version: Optional[int] = None
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def _check_version(self, version: int) -> None:
+        if version != self._version:
+            if self._entries:
+                self.invalidations += 1
+                self._entries.clear()
+            self._version = version
+
+    def get(self, key: Hashable, version: int) -> Optional[Any]:
+        with self._lock:
+            self._check_version(version)
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            expires_at, value = entry
+            if expires_at <= self._clock():
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key: Hashable, version: int, value: Any) -> None:
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._check_version(version)
+            self._entries[key] = (self._clock() + self.ttl_seconds, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+                "index_version": self._version,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations,
+            }
+
+
+def read_query_log(path: Path, limit: int, key: Callable[[Dict[str, Any]], Hashable]) -> Iterator[Dict[str, Any]]:
+    """
+    Most frequent request bodies from a JSONL query log (one /recommend body
+    per line), most frequent first. Bodies are counted as the same request
+    when key (the request part of the result cache key) gives the same value.
+    Malformed lines, and bodies key rejects with ValueError, are skipped.
+    """
+    counts: Counter = Counter()
+    bodies: Dict[Hashable, Dict[str, Any]] = {}
+
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                body = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if not isinstance(body, dict):
+                continue
+            try:
+                request_key = key(body)
+            except ValueError:
+                continue
+            counts[request_key] += 1
+            bodies.setdefault(request_key, body)
+
+    for request_key, _ in counts.most_common(limit):
+        yield bodies[request_key]
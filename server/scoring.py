@@ -0,0 +1,654 @@
+# server/scoring.py
+import math
+from array import array
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+from scipy import sparse
+
+try:
+    from server.hours import (
+        MINUTES_PER_WEEK,
+        SCHEDULE_BYTES,
+        SLOT_MINUTES,
+        HoursParseError,
+        compile_schedule,
+        parse_hours,
+    )
+    from server.indexing.segments import RowMatrix, append_matrix_rows, append_rows, as_csr
+except ImportError:
+    from hours import (
+        MINUTES_PER_WEEK,
+        SCHEDULE_BYTES,
+        SLOT_MINUTES,
+        HoursParseError,
+        compile_schedule,
+        parse_hours,
+    )
+    from indexing.segments import RowMatrix, append_matrix_rows, append_rows, as_csr
+
+# ----------------------------
+# Ranking weights (final_score)
+# ----------------------------
+W_TFIDF = 0.40
+W_DISTANCE = 0.15
+W_OPEN = 0.15
+W_RATING = 0.10
+W_PRICE = 0.10
+W_PERSONAL = 0.10
+W_TIME = 0.10
+
+PERSONAL_STEP = 0.05
+PERSONAL_MIN = -0.2
+PERSONAL_MAX = 0.4
+
+TIMES_OF_DAY = ("morning", "lunch", "dinner")
+
+# Open now, but closed this many minutes from now
+CLOSING_SOON_MINUTES = 30
+
+
+# ----------------------------
+# Helpers (numbers, distance, etc.)
+# ----------------------------
+def get_number(x: Any, default: float = 0.0) -> float:
+    try:
+        if x is None:
+            return default
+        if isinstance(x, bool):
+            return default
+        return float(x)
+    except (TypeError, ValueError):
+        return default
+
+
+# Campus center (approx) - simple demo reference point
+CAMPUS_LAT = 33.6405
+CAMPUS_LNG = -117.8443
+MAX_DISTANCE_MILES = 2.0  # beyond this distance_score becomes 0
+EARTH_RADIUS_MILES = 3958.8
+
+
+def haversine_miles(lat1: float, lng1: float, lat2: float, lng2: float) -> float:
+    R = EARTH_RADIUS_MILES
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    dphi = math.radians(lat2 - lat1)
+    dlambda = math.radians(lng2 - lng1)
+
+    a = (math.sin(dphi / 2) ** 2 +
+         math.cos(phi1) * math.cos(phi2) * (math.sin(dlambda / 2) ** 2))
+    return 2 * R * math.asin(math.sqrt(a))
+
+
+def haversine_miles_array(lat: float, lng: float, lats: np.ndarray, lngs: np.ndarray) -> np.ndarray:
+    """haversine_miles from one point to many (NaN where a coordinate is missing)."""
+    phi1 = math.radians(lat)
+    phi2 = np.radians(lats)
+    dphi = phi2 - phi1
+    dlambda = np.radians(lngs) - math.radians(lng)
+
+    a = (np.sin(dphi / 2) ** 2 +
+         math.cos(phi1) * np.cos(phi2) * (np.sin(dlambda / 2) ** 2))
+    return 2 * EARTH_RADIUS_MILES * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+def distance_scores(miles: np.ndarray) -> np.ndarray:
+    """Vectorized distance_score for precomputed distances (0 when unknown or too far)."""
+    score = 1.0 - (miles / MAX_DISTANCE_MILES)
+    return np.where(np.isnan(miles) | (miles >= MAX_DISTANCE_MILES), 0.0, np.maximum(score, 0.0))
+
+
+# ----------------------------
+# Per-restaurant signals (scalar)
+# ----------------------------
+def distance_score(r: Dict[str, Any]) -> float:
+    lat = get_number(r.get("lat"), None)  # type: ignore[arg-type]
+    lng = get_number(r.get("lng"), None)  # type: ignore[arg-type]
+    if lat is None or lng is None:
+        return 0.0
+
+    d = haversine_miles(CAMPUS_LAT, CAMPUS_LNG, float(lat), float(lng))
+    if d >= MAX_DISTANCE_MILES:
+        return 0.0
+
+    return max(0.0, 1.0 - (d / MAX_DISTANCE_MILES))
+
+
+def open_score(r: Dict[str, Any]) -> float:
+    """
+    Fallback for hours_text that does not parse into a schedule.
+    Simple heuristic:
+    - if hours_text contains 'closed' => 0
+    - if it contains am/pm => 1
+    - otherwise => 0.5
+    """
+    hours = (r.get("hours_text") or "").lower()
+    if "closed" in hours:
+        return 0.0
+    if "am" in hours or "pm" in hours:
+        return 1.0
+    return 0.5
+
+
+def compiled_schedule(r: Dict[str, Any]) -> Optional[bytes]:
+    """Weekly open bitmap for r's hours_text, or None when it does not parse."""
+    try:
+        return compile_schedule(parse_hours(r.get("hours_text") or ""))
+    except HoursParseError:
+        return None
+
+
+def rating_score(r: Dict[str, Any]) -> float:
+    rating = get_number(r.get("rating"), 0.0)
+    return min(max(rating / 5.0, 0.0), 1.0)
+
+
+def time_context_boost(restaurant, time_of_day):
+    tags = restaurant.get("tags") or []
+    cuisines = restaurant.get("cuisines") or []
+
+    boost = 0.0
+
+    if time_of_day == "morning":
+        if "cafe" in tags or "coffee" in tags or "breakfast" in cuisines:
+            boost = 0.15
+
+    elif time_of_day == "lunch":
+        if "fast food" in cuisines or "sandwich" in cuisines:
+            boost = 0.12
+
+    elif time_of_day == "dinner":
+        if "restaurant" in tags or "dinner" in cuisines:
+            boost = 0.10
+
+    return boost
+
+
+# ----------------------------
+# Signal columns (built once per index)
+# ----------------------------
+class SignalColumns:
+    """
+    Every ranking signal that does not depend on the request, stored as one
+    NumPy column per signal and aligned with the rows of tfidf_matrix.
+    """
+
+    # Per-row arrays (first axis = row). These are persisted, appended and
+    # sliced generically; anything listed here must be set in __init__.
+    ROW_COLUMNS = (
+        "distance",
+        "open",
+        "schedule",
+        "hours_known",
+        "rating",
+        "price_level",
+        "lat",
+        "lng",
+        "has_id",
+        "halal",
+        "live",
+    ) + tuple(f"time_boost_{tod}" for tod in TIMES_OF_DAY)
+
+    def __init__(
+        self,
+        *,
+        distance: np.ndarray,
+        open: np.ndarray,
+        schedule: np.ndarray,
+        hours_known: np.ndarray,
+        rating: np.ndarray,
+        price_level: np.ndarray,
+        lat: np.ndarray,
+        lng: np.ndarray,
+        time_boost: Dict[str, np.ndarray],
+        has_id: np.ndarray,
+        halal: np.ndarray,
+        cuisine_vocab: Dict[str, int],
+        cuisine_matrix: RowMatrix,
+        live: Optional[np.ndarray] = None,
+    ):
+        self.size = len(distance)
+        self.distance = distance
+        # heuristic open score (used where hours_text did not parse)
+        self.open = open
+        # compiled weekly schedules, one SCHEDULE_BYTES bitmap per row (zeros when unknown)
+        self.schedule = schedule
+        self.hours_known = hours_known
+        self.rating = rating
+        # price_level as float, NaN when unknown (price_score falls back to neutral)
+        self.price_level = price_level
+        # coordinates, NaN when missing
+        self.lat = lat
+        self.lng = lng
+        for tod in TIMES_OF_DAY:
+            setattr(self, f"time_boost_{tod}", time_boost[tod])
+        # Rows that can be ranked at all (the response needs a string id)
+        self.has_id = has_id
+        self.halal = halal
+        # restaurant x cuisine incidence (lowercased), one entry per listed cuisine
+        self.cuisine_vocab = cuisine_vocab
+        self.cuisine_matrix = cuisine_matrix
+        # False for tombstoned rows (deleted or replaced since the last compaction)
+        self.live = live if live is not None else np.ones(self.size, dtype=bool)
+
+    @property
+    def time_boost(self) -> Dict[str, np.ndarray]:
+        return {tod: getattr(self, f"time_boost_{tod}") for tod in TIMES_OF_DAY}
+
+    @classmethod
+    def build(cls, restaurants: Iterable[Dict[str, Any]]) -> "SignalColumns":
+        builder = SignalColumnsBuilder()
+        for r in restaurants:
+            builder.add(r)
+        return builder.build()
+
+    def _replace(self, columns: Dict[str, np.ndarray], cuisine_vocab=None, cuisine_matrix=None) -> "SignalColumns":
+        """Copy of self with the given row columns (and cuisine incidence) swapped in."""
+        new = SignalColumns.__new__(SignalColumns)
+        new.__dict__.update(self.__dict__)
+        new.__dict__.update(columns)
+        if cuisine_vocab is not None:
+            new.cuisine_vocab = cuisine_vocab
+        if cuisine_matrix is not None:
+            new.cuisine_matrix = cuisine_matrix
+        new.size = len(new.distance)
+        return new
+
+    def to_arrays(self) -> Dict[str, np.ndarray]:
+        """Flat name -> array mapping (used to persist the columns)."""
+        arrays = {name: getattr(self, name) for name in self.ROW_COLUMNS}
+        cuisine_matrix = as_csr(self.cuisine_matrix)
+        arrays["cuisine_data"] = cuisine_matrix.data
+        arrays["cuisine_indices"] = cuisine_matrix.indices
+        arrays["cuisine_indptr"] = cuisine_matrix.indptr
+        return arrays
+
+    @classmethod
+    def from_arrays(cls, arrays: Dict[str, np.ndarray], cuisine_terms: List[str]) -> "SignalColumns":
+        """Inverse of to_arrays(); arrays may be read-only memory maps."""
+        n = len(arrays["distance"])
+        columns = {name: arrays[name] for name in cls.ROW_COLUMNS}
+        new = cls.__new__(cls)
+        new.__dict__.update(columns)
+        new.size = n
+        new.cuisine_vocab = {c: i for i, c in enumerate(cuisine_terms)}
+        new.cuisine_matrix = sparse.csr_matrix(
+            (arrays["cuisine_data"], arrays["cuisine_indices"], arrays["cuisine_indptr"]),
+            shape=(n, len(cuisine_terms)),
+            copy=False,
+        )
+        return new
+
+    def cuisine_terms(self) -> List[str]:
+        terms = [""] * len(self.cuisine_vocab)
+        for c, i in self.cuisine_vocab.items():
+            terms[i] = c
+        return terms
+
+    def append(self, other: "SignalColumns", live: Optional[np.ndarray] = None) -> "SignalColumns":
+        """
+        New columns with other's rows after ours (cuisine vocabularies are
+        merged), in O(other's rows) (see indexing.segments). live, when given,
+        replaces the appended live flags (e.g. to tombstone a replaced row).
+        """
+        cuisine_vocab = self.cuisine_vocab
+        if any(c not in cuisine_vocab for c in other.cuisine_vocab):
+            cuisine_vocab = dict(cuisine_vocab)
+        remap = np.empty(len(other.cuisine_vocab), dtype=np.int32)
+        for c, i in other.cuisine_vocab.items():
+            remap[i] = cuisine_vocab.setdefault(c, len(cuisine_vocab))
+
+        theirs = other.cuisine_matrix
+        theirs = sparse.csr_matrix(
+            (theirs.data, remap[theirs.indices], theirs.indptr), shape=(other.size, len(cuisine_vocab))
+        )
+
+        columns = {
+            name: append_rows(getattr(self, name), getattr(other, name))
+            for name in self.ROW_COLUMNS
+            if name != "live" or live is None
+        }
+        if live is not None:
+            columns["live"] = live
+        return self._replace(
+            columns,
+            cuisine_vocab=cuisine_vocab,
+            cuisine_matrix=append_matrix_rows(self.cuisine_matrix, theirs),
+        )
+
+    def take(self, rows: np.ndarray) -> "SignalColumns":
+        """New columns holding only the given rows, in that order."""
+        return self._replace(
+            {name: getattr(self, name)[rows] for name in self.ROW_COLUMNS},
+            cuisine_matrix=self.cuisine_matrix[rows],
+        )
+
+    def with_live(self, live: np.ndarray) -> "SignalColumns":
+        """Same columns with a different live mask (arrays are shared, not copied)."""
+        return self._replace({"live": live})
+
+    def _open_at_slot(self, slot: int, rows: Optional[np.ndarray]) -> np.ndarray:
+        byte = self.schedule[:, slot >> 3] if rows is None else self.schedule[rows, slot >> 3]
+        return ((byte >> (slot & 7)) & 1).astype(bool)
+
+    def open_at(self, minute_of_week: int, rows: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        (open_now, closing_soon) for every row (or just rows), from the compiled
+        schedules: one bitmap column lookup each. Both are False where the hours are unknown.
+        """
+        slot = (minute_of_week % MINUTES_PER_WEEK) // SLOT_MINUTES
+        later = ((minute_of_week + CLOSING_SOON_MINUTES) % MINUTES_PER_WEEK) // SLOT_MINUTES
+        open_now = self._open_at_slot(slot, rows)
+        return open_now, open_now & ~self._open_at_slot(later, rows)
+
+    def open_scores(self, open_now: np.ndarray, rows: Optional[np.ndarray] = None) -> np.ndarray:
+        """1/0 from the schedule where hours are known, the open_score heuristic elsewhere."""
+        known = self.hours_known if rows is None else self.hours_known[rows]
+        heuristic = self.open if rows is None else self.open[rows]
+        return np.where(known, open_now.astype(np.float64), heuristic)
+
+    def price_scores(self, price_preference: int, rows: Optional[np.ndarray] = None) -> np.ndarray:
+        level = self.price_level if rows is None else self.price_level[rows]
+        diff = np.abs(price_preference - level)
+        return np.where(np.isnan(diff), 0.5, np.maximum(0.0, 1.0 - (diff / 4.0)))
+
+    def time_boosts(self, time_of_day: str, rows: Optional[np.ndarray] = None) -> np.ndarray:
+        n = self.size if rows is None else len(rows)
+        if time_of_day not in TIMES_OF_DAY:
+            return np.zeros(n, dtype=np.float64)
+        boost = getattr(self, f"time_boost_{time_of_day}")
+        return boost if rows is None else boost[rows]
+
+    def personal_boosts(
+        self,
+        cuisine_counts: Dict[str, int],
+        preferred_cuisines: Iterable[str],
+        disliked_cuisines: Iterable[str],
+        rows: Optional[np.ndarray] = None,
+    ) -> np.ndarray:
+        """Clicked/preferred/disliked cuisine boost for every row (or just rows), clamped."""
+        n = self.size if rows is None else len(rows)
+        if not self.cuisine_vocab:
+            return np.zeros(n, dtype=np.float64)
+
+        preferred = set(preferred_cuisines)
+        disliked = set(disliked_cuisines)
+
+        weights = np.zeros(len(self.cuisine_vocab), dtype=np.float64)
+        for cuisine, col in self.cuisine_vocab.items():
+            w = 0.0
+            if cuisine in cuisine_counts:
+                w += PERSONAL_STEP * cuisine_counts[cuisine]
+            if cuisine in preferred:
+                w += PERSONAL_STEP
+            if cuisine in disliked:
+                w -= PERSONAL_STEP
+            weights[col] = w
+
+        if not weights.any():
+            return np.zeros(n, dtype=np.float64)
+
+        matrix = self.cuisine_matrix if rows is None else self.cuisine_matrix[rows]
+        boost = matrix @ weights
+        return np.clip(boost, PERSONAL_MIN, PERSONAL_MAX)
+
+
+class SignalColumnsBuilder:
+    """
+    Accumulates SignalColumns one restaurant at a time, so a streamed catalog
+    never needs to exist as a list before its columns are built. Values are
+    kept in typed arrays (8 bytes per float), not lists of Python objects.
+    """
+
+    FLOAT_COLUMNS = ("distance", "open", "rating", "price_level", "lat", "lng") + tuple(
+        f"time_boost_{tod}" for tod in TIMES_OF_DAY
+    )
+    FLAG_COLUMNS = ("hours_known", "has_id", "halal")
+
+    def __init__(self):
+        self.size = 0
+        self._floats = {name: array("d") for name in self.FLOAT_COLUMNS}
+        self._flags = {name: array("b") for name in self.FLAG_COLUMNS}
+        self._schedule = bytearray()
+        self._no_schedule = bytes(SCHEDULE_BYTES)
+        self.cuisine_vocab: Dict[str, int] = {}
+        self._cuisine_indices = array("i")
+        self._cuisine_indptr = array("q", [0])
+
+    def add(self, r: Dict[str, Any]) -> None:
+        floats = self._floats
+        floats["distance"].append(distance_score(r))
+        floats["open"].append(open_score(r))
+        floats["rating"].append(rating_score(r))
+        floats["price_level"].append(float(r["price_level"]) if isinstance(r.get("price_level"), int) else np.nan)
+        floats["lat"].append(get_number(r.get("lat"), np.nan))
+        floats["lng"].append(get_number(r.get("lng"), np.nan))
+        for tod in TIMES_OF_DAY:
+            floats[f"time_boost_{tod}"].append(time_context_boost(r, tod))
+
+        bitmap = compiled_schedule(r)
+        self._schedule += self._no_schedule if bitmap is None else bitmap
+        self._flags["hours_known"].append(bitmap is not None)
+        self._flags["has_id"].append(isinstance(r.get("id"), str))
+        self._flags["halal"].append("halal" in (r.get("dietary_tags") or []))
+
+        for cuisine in r.get("cuisines", []) or []:
+            self._cuisine_indices.append(self.cuisine_vocab.setdefault(cuisine.lower(), len(self.cuisine_vocab)))
+        self._cuisine_indptr.append(len(self._cuisine_indices))
+        self.size += 1
+
+    def build(self) -> SignalColumns:
+        n = self.size
+        floats = {name: np.array(col, dtype=np.float64) for name, col in self._floats.items()}
+        flags = {name: np.array(col, dtype=bool) for name, col in self._flags.items()}
+        indices = np.array(self._cuisine_indices, dtype=np.int32)
+
+        return SignalColumns(
+            distance=floats["distance"],
+            open=floats["open"],
+            schedule=np.frombuffer(bytes(self._schedule), dtype=np.uint8).reshape(n, SCHEDULE_BYTES).copy(),
+            hours_known=flags["hours_known"],
+            rating=floats["rating"],
+            price_level=floats["price_level"],
+            lat=floats["lat"],
+            lng=floats["lng"],
+            time_boost={tod: floats[f"time_boost_{tod}"] for tod in TIMES_OF_DAY},
+            has_id=flags["has_id"],
+            halal=flags["halal"],
+            cuisine_vocab=dict(self.cuisine_vocab),
+            cuisine_matrix=sparse.csr_matrix(
+                (np.ones(len(indices), dtype=np.float64), indices, np.array(self._cuisine_indptr, dtype=np.int64)),
+                shape=(n, len(self.cuisine_vocab)),
+            ),
+        )
+
+
+# ----------------------------
+# Columns shared by a batch of requests
+# ----------------------------
+class BatchColumns:
+    """
+    Full-index score columns that do not depend on the query text, computed
+    once for a batch of requests scored at the same moment and then sliced
+    per request. Price and personal columns are memoized per distinct input,
+    so requests from the same user share them too.
+    """
+
+    def __init__(self, signals: SignalColumns, *, time_of_day: str, minute_of_week: Optional[int] = None):
+        self.signals = signals
+        self.time_of_day = time_of_day
+        self.minute_of_week = minute_of_week
+        self.closing_soon: Optional[np.ndarray] = None
+        if minute_of_week is None:
+            self.opn = signals.open
+        else:
+            open_now, self.closing_soon = signals.open_at(minute_of_week)
+            self.opn = signals.open_scores(open_now)
+        self.time_boost = signals.time_boosts(time_of_day)
+        self._price: Dict[int, np.ndarray] = {}
+        self._personal: Dict[Tuple, np.ndarray] = {}
+
+    def price(self, price_preference: int) -> np.ndarray:
+        col = self._price.get(price_preference)
+        if col is None:
+            col = self._price[price_preference] = self.signals.price_scores(price_preference)
+        return col
+
+    def personal(
+        self,
+        cuisine_counts: Dict[str, int],
+        preferred_cuisines: Iterable[str],
+        disliked_cuisines: Iterable[str],
+    ) -> np.ndarray:
+        preferred, disliked = frozenset(preferred_cuisines), frozenset(disliked_cuisines)
+        key = (frozenset(cuisine_counts.items()), preferred, disliked)
+        col = self._personal.get(key)
+        if col is None:
+            col = self._personal[key] = self.signals.personal_boosts(cuisine_counts, preferred, disliked)
+        return col
+
+
+# ----------------------------
+# Vectorized final score + top-k
+# ----------------------------
+class ScoredCandidates:
+    """
+    Score components as parallel arrays. Position i belongs to index row
+    rows[i] (every row of the index when rows was not given).
+    """
+
+    def __init__(
+        self, tfidf, dist, opn, rate, price, personal_boost, time_boost,
+        rows=None, hours_known=None, closing_soon=None,
+    ):
+        self.rows = rows
+        # per position: hours_text compiled into a schedule / open but closing soon
+        self.hours_known = hours_known
+        self.closing_soon = closing_soon
+        self.tfidf = tfidf
+        self.dist = dist
+        self.opn = opn
+        self.rate = rate
+        self.price = price
+        self.personal_boost = personal_boost
+        self.time_boost = time_boost
+
+        self.final = (
+            W_TFIDF * tfidf +
+            W_DISTANCE * dist +
+            W_OPEN * opn +
+            W_RATING * rate +
+            W_PRICE * price +
+            W_PERSONAL * personal_boost +
+            W_TIME * time_boost
+        )
+
+    def components(self, idx: int) -> Dict[str, float]:
+        return {
+            "tfidf": round(float(self.tfidf[idx]), 4),
+            "distance": round(float(self.dist[idx]), 4),
+            "open": round(float(self.opn[idx]), 4),
+            "rating": round(float(self.rate[idx]), 4),
+            "price": round(float(self.price[idx]), 4),
+            "personal_boost": round(float(self.personal_boost[idx]), 4),
+            "time_boost": round(float(self.time_boost[idx]), 4),
+        }
+
+
+def score_all(
+    signals: SignalColumns,
+    similarity_scores: np.ndarray,
+    *,
+    time_of_day: str,
+    price_preference: int,
+    cuisine_counts: Dict[str, int],
+    preferred_cuisines: Iterable[str],
+    disliked_cuisines: Iterable[str],
+    rows: Optional[np.ndarray] = None,
+    distance: Optional[np.ndarray] = None,
+    minute_of_week: Optional[int] = None,
+    shared: Optional[BatchColumns] = None,
+) -> ScoredCandidates:
+    """
+    Score every row, or only rows (positions in the result then follow rows).
+    similarity_scores covers the whole index; distance, if given, replaces the
+    precomputed campus distance signal and is aligned with rows. With
+    minute_of_week, the open signal comes from the compiled schedules.
+    shared (built for the same time_of_day and minute_of_week) supplies the
+    query-independent columns instead of computing them again.
+    """
+    def column(arr: np.ndarray) -> np.ndarray:
+        return arr if rows is None else arr[rows]
+
+    if shared is not None:
+        opn = column(shared.opn)
+        closing_soon = None if shared.closing_soon is None else column(shared.closing_soon)
+        price = column(shared.price(price_preference))
+        personal = column(shared.personal(cuisine_counts, preferred_cuisines, disliked_cuisines))
+        time_boost = column(shared.time_boost)
+    else:
+        closing_soon = None
+        if minute_of_week is None:
+            opn = column(signals.open)
+        else:
+            open_now, closing_soon = signals.open_at(minute_of_week, rows)
+            opn = signals.open_scores(open_now, rows)
+        price = signals.price_scores(price_preference, rows)
+        personal = signals.personal_boosts(cuisine_counts, preferred_cuisines, disliked_cuisines, rows)
+        time_boost = signals.time_boosts(time_of_day, rows)
+
+    return ScoredCandidates(
+        tfidf=column(np.asarray(similarity_scores, dtype=np.float64)),
+        dist=column(signals.distance) if distance is None else distance,
+        opn=opn,
+        rate=column(signals.rating),
+        price=price,
+        personal_boost=personal,
+        time_boost=time_boost,
+        rows=rows,
+        hours_known=column(signals.hours_known),
+        closing_soon=closing_soon,
+    )
+
+
+def top_k_indices(scores: np.ndarray, candidates: np.ndarray, k: int) -> np.ndarray:
+    """
+    Row indices of the k best candidates, best first.
+
+    Uses a partial selection (O(n)) instead of a full sort. Ties are broken by
+    row order, exactly like a stable descending sort over the candidate list.
+    """
+    if k <= 0 or len(candidates) == 0:
+        return candidates[:0]
+
+    cand_scores = scores[candidates]
+
+    if k < len(cand_scores):
+        # k-th largest score; everything strictly above it is in, ties fill up in row order
+        kth = np.partition(cand_scores, len(cand_scores) - k)[len(cand_scores) - k]
+        above = np.flatnonzero(cand_scores > kth)
+        ties = np.flatnonzero(cand_scores == kth)[: k - len(above)]
+        selected = np.sort(np.concatenate([above, ties]))
+    else:
+        selected = np.arange(len(cand_scores))
+
+    order = np.argsort(-cand_scores[selected], kind="stable")
+    return candidates[selected[order]]
+
+
+def candidate_mask(signals: SignalColumns, *, halal: bool = False) -> np.ndarray:
+    """Boolean mask of the rows that pass the hard filters."""
+    mask = signals.has_id & signals.live
+    if halal:
+        mask = mask & signals.halal
+    return mask
+
+
+def usable_mask(signals: SignalColumns, rows: np.ndarray) -> np.ndarray:
+    """Which of rows can be ranked (string id, not tombstoned); costs O(len(rows))."""
+    return signals.has_id[rows] & signals.live[rows]
+
+
+def candidate_rows(signals: SignalColumns, *, halal: bool = False) -> np.ndarray:
+    """Row indices that pass the hard filters, in catalog order."""
+    return np.flatnonzero(candidate_mask(signals, halal=halal))
@@ -1,7 +1,26 @@
 # server/user_profile.py
+import itertools
+import json
+import os
+import tempfile
+import threading
+import zlib
+from collections import Counter, OrderedDict, deque
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
 
-from collections import Counter
-from typing import List, Dict
+DEFAULT_USER_ID = "default"
+
+MAX_CLICK_HISTORY = 500
+MAX_PROFILES = 100_000
+PROFILE_SHARDS = 16
+SNAPSHOT_INTERVAL_SECONDS = 60.0
+# a spill file is rewritten once stale copies outweigh the live ones by this much
+SPILL_COMPACT_MIN_BYTES = 1 << 20
+
+# Profile versions come from one process-wide counter, so a user who is
+# evicted and comes back never reuses a version (they key cached results).
+_versions = itertools.count(1)
 
 
 class UserProfile:
@@ -11,28 +30,356 @@ class UserProfile:
         preferred_cuisines: List[str] = None,
         disliked_cuisines: List[str] = None,
         price_preference: int = 2,
+        max_history: int = MAX_CLICK_HISTORY,
     ):
         self.dietary_required = dietary_required or []
         self.preferred_cuisines = preferred_cuisines or []
         self.disliked_cuisines = disliked_cuisines or []
         self.price_preference = price_preference
 
-        # store restaurant_ids user clicked
-        self.click_history: List[str] = []
+        # most recent restaurant_ids the user clicked (oldest dropped past max_history),
+        # with the lowercased cuisines each click counted for
+        self.click_history: "deque[str]" = deque()
+        self._click_cuisines: "deque[List[str]]" = deque()
+        self.max_history = max_history
+        # running totals over click_history, kept up to date on every click
+        self._cuisine_counts: Counter = Counter()
+        # results shown to the user (not used for ranking, so no version bump)
+        self.impression_count = 0
+
+        self._lock = threading.Lock()
+        self.version: int = next(_versions)
+
+    def record_click(self, restaurant_id: str, cuisines: Iterable[str] = ()):
+        self.record_clicks([(restaurant_id, cuisines)])
+
+    def record_clicks(self, clicks: Iterable[Tuple[str, Iterable[str]]]):
+        """Append clicks (restaurant_id, cuisines) in order; one version bump for all of them."""
+        with self._lock:
+            added: List[str] = []
+            for restaurant_id, cuisines in clicks:
+                lowered = [c.lower() for c in cuisines]
+                self.click_history.append(restaurant_id)
+                self._click_cuisines.append(lowered)
+                added.extend(lowered)
+            self._cuisine_counts.update(added)
+
+            while len(self.click_history) > self.max_history:
+                self.click_history.popleft()
+                for c in self._click_cuisines.popleft():
+                    self._cuisine_counts[c] -= 1
+                    if self._cuisine_counts[c] <= 0:
+                        del self._cuisine_counts[c]
+
+            self.version = next(_versions)
+
+    def record_impression(self, count: int = 1):
+        with self._lock:
+            self.impression_count += count
+
+    def cuisine_click_counts(self) -> Counter:
+        """Clicks per (lowercased) cuisine; O(distinct cuisines), not O(history)."""
+        with self._lock:
+            return Counter(self._cuisine_counts)
+
+    def to_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "dietary_required": list(self.dietary_required),
+                "preferred_cuisines": list(self.preferred_cuisines),
+                "disliked_cuisines": list(self.disliked_cuisines),
+                "price_preference": self.price_preference,
+                "clicks": [[rid, cuisines] for rid, cuisines in zip(self.click_history, self._click_cuisines)],
+                "impressions": self.impression_count,
+            }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any], max_history: int = MAX_CLICK_HISTORY) -> "UserProfile":
+        profile = cls(
+            dietary_required=data.get("dietary_required"),
+            preferred_cuisines=data.get("preferred_cuisines"),
+            disliked_cuisines=data.get("disliked_cuisines"),
+            price_preference=data.get("price_preference", 2),
+            max_history=max_history,
+        )
+        profile.record_clicks(data.get("clicks", []))
+        profile.impression_count = data.get("impressions", 0)
+        return profile
+
+
+class _SpillFile:
+    """
+    Append-only temporary file of evicted profiles (compact JSON), plus
+    user_id -> (offset, length) of each spilled user's copy. Bytes once
+    written never change, so a copy of the index stays readable (pread)
+    while the owner goes on appending; compacted() writes a new file.
+    """
+
+    def __init__(self):
+        self.file = tempfile.TemporaryFile(buffering=0)
+        self.size = 0
+        # bytes of the copies still in index
+        self.live = 0
+        self.index: Dict[str, Tuple[int, int]] = {}
+
+    def put(self, user_id: str, data: bytes) -> None:
+        os.pwrite(self.file.fileno(), data, self.size)
+        self.index[user_id] = (self.size, len(data))
+        self.size += len(data)
+        self.live += len(data)
+
+    def read(self, offset: int, length: int) -> Dict[str, Any]:
+        return json.loads(os.pread(self.file.fileno(), length, offset))
+
+    def take(self, user_id: str) -> Optional[Dict[str, Any]]:
+        entry = self.index.pop(user_id, None)
+        if entry is None:
+            return None
+        self.live -= entry[1]
+        return self.read(*entry)
+
+    def compacted(self) -> "_SpillFile":
+        new = _SpillFile()
+        for user_id, (offset, length) in self.index.items():
+            new.put(user_id, os.pread(self.file.fileno(), length, offset))
+        return new
+
+
+class ProfileExport:
+    """
+    What ProfileStore.export() copied: resident profiles as dicts, and the
+    spilled ones as (spill file, index copy), read back only by items().
+    """
+
+    def __init__(self, resident: Dict[str, Dict[str, Any]], spilled: List[Tuple[_SpillFile, Dict[str, Tuple[int, int]]]]):
+        self.resident = resident
+        self.spilled = spilled
+
+    def __len__(self) -> int:
+        return len(self.resident) + sum(len(index) for _, index in self.spilled)
+
+    def items(self) -> Iterator[Tuple[str, Dict[str, Any]]]:
+        """Spilled (least recently used) profiles first, then the resident ones."""
+        for spill, index in self.spilled:
+            for user_id, entry in index.items():
+                yield user_id, spill.read(*entry)
+        yield from self.resident.items()
+
+
+class ProfileStore:
+    """
+    user_id -> UserProfile, split over PROFILE_SHARDS independently locked
+    LRU shards. Past max_profiles the least recently used users are evicted
+    to a per-shard spill file (temporary, so not a substitute for save()),
+    and read back the next time they are looked up. save() writes them too,
+    so the event log segments a snapshot covers hold nothing it lacks.
+    """
+
+    def __init__(
+        self,
+        max_profiles: int = MAX_PROFILES,
+        shards: int = PROFILE_SHARDS,
+        max_history: int = MAX_CLICK_HISTORY,
+    ):
+        self.max_profiles = max_profiles
+        self.max_history = max_history
+        self._per_shard = max(1, -(-max_profiles // shards))
+        self._shards = [OrderedDict() for _ in range(shards)]
+        self._locks = [threading.Lock() for _ in range(shards)]
+        # evicted profiles per shard (under the shard's lock)
+        self._spills = [_SpillFile() for _ in range(shards)]
+        # guards the counters below, which every shard updates
+        self._stats_lock = threading.Lock()
+        self.evictions = 0
+        # clicks since the last save (the periodic snapshot skips clean stores)
+        self._dirty = 0
+        self.snapshot_meta: Dict[str, Any] = {}
+
+        self._snapshot_thread: Optional[threading.Thread] = None
+        self._snapshot_stop = threading.Event()
+
+    def _shard(self, user_id: str) -> int:
+        return zlib.crc32(user_id.encode("utf-8")) % len(self._shards)
+
+    def get(self, user_id: str) -> Optional[UserProfile]:
+        i = self._shard(user_id)
+        with self._locks[i]:
+            profile = self._shards[i].get(user_id)
+            if profile is not None:
+                self._shards[i].move_to_end(user_id)
+            else:
+                profile = self._unspill(i, user_id)
+            return profile
+
+    def get_or_create(self, user_id: str) -> UserProfile:
+        i = self._shard(user_id)
+        with self._locks[i]:
+            shard = self._shards[i]
+            profile = shard.get(user_id)
+            if profile is not None:
+                shard.move_to_end(user_id)
+                return profile
+            profile = self._unspill(i, user_id)
+            if profile is None:
+                profile = UserProfile(max_history=self.max_history)
+                self._insert(i, user_id, profile)
+            return profile
+
+    def record_click(self, user_id: str, restaurant_id: str, cuisines: Iterable[str] = ()) -> UserProfile:
+        profile = self.get_or_create(user_id)
+        profile.record_click(restaurant_id, cuisines)
+        with self._stats_lock:
+            self._dirty += 1
+        return profile
+
+    def replay(self, events: Iterable[Tuple[str, str, str, List[str]]]) -> int:
+        """
+        Apply (user_id, kind, restaurant_id, cuisines) events in bulk. Only each
+        user's last max_history clicks can matter, so older ones are never applied.
+        Returns the number of events read.
+        """
+        clicks: Dict[str, deque] = {}
+        impressions: Counter = Counter()
+        n = 0
+        for user_id, kind, restaurant_id, cuisines in events:
+            n += 1
+            if kind == "click":
+                tail = clicks.get(user_id)
+                if tail is None:
+                    tail = clicks[user_id] = deque(maxlen=self.max_history)
+                tail.append((restaurant_id, cuisines))
+            else:
+                impressions[user_id] += 1
+
+        for user_id in clicks.keys() | impressions.keys():
+            profile = self.get_or_create(user_id)
+            if user_id in clicks:
+                profile.record_clicks(clicks[user_id])
+            if user_id in impressions:
+                profile.record_impression(impressions[user_id])
+        with self._stats_lock:
+            self._dirty += n
+        return n
+
+    def _insert(self, i: int, user_id: str, profile: UserProfile) -> None:
+        """Add a profile to shard i, spilling the least recently used past the cap (caller holds lock i)."""
+        shard = self._shards[i]
+        shard[user_id] = profile
+        shard.move_to_end(user_id)
+        while len(shard) > self._per_shard:
+            evicted_id, evicted = shard.popitem(last=False)
+            self._spills[i].put(evicted_id, json.dumps(evicted.to_dict(), separators=(",", ":")).encode("utf-8"))
+            with self._stats_lock:
+                self.evictions += 1
 
-    def record_click(self, restaurant_id: str):
-        self.click_history.append(restaurant_id)
+    def _unspill(self, i: int, user_id: str) -> Optional[UserProfile]:
+        """The spilled profile of user_id, back in shard i; None if it was never evicted (caller holds lock i)."""
+        spill = self._spills[i]
+        data = spill.take(user_id)
+        if data is None:
+            return None
+        if spill.size - spill.live > max(SPILL_COMPACT_MIN_BYTES, spill.live):
+            self._spills[i] = spill.compacted()
+        profile = UserProfile.from_dict(data, self.max_history)
+        self._insert(i, user_id, profile)
+        return profile
 
-    def cuisine_click_counts(self, restaurant_lookup: Dict[str, dict]) -> Counter:
+    def clear(self) -> None:
+        for i, shard in enumerate(self._shards):
+            with self._locks[i]:
+                shard.clear()
+                self._spills[i] = _SpillFile()
+
+    def __len__(self) -> int:
+        return sum(len(shard) for shard in self._shards)
+
+    def __contains__(self, user_id: str) -> bool:
+        return user_id in self._shards[self._shard(user_id)]
+
+    def spilled_count(self) -> int:
+        return sum(len(spill.index) for spill in self._spills)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "profiles": len(self),
+            "max_profiles": self.max_profiles,
+            "evictions": self.evictions,
+            "spilled": self.spilled_count(),
+        }
+
+    # ----------------------------
+    # Persistence
+    # ----------------------------
+    def export(self) -> ProfileExport:
+        """
+        A copy of every profile, resident ones as dicts (oldest first per
+        shard) and spilled ones by reference; marks the store clean.
         """
-        Count how many times each cuisine was clicked.
+        with self._stats_lock:
+            self._dirty = 0
+        resident: Dict[str, Any] = {}
+        spilled = []
+        for i, shard in enumerate(self._shards):
+            with self._locks[i]:
+                items = list(shard.items())  # LRU order, oldest first
+                spilled.append((self._spills[i], dict(self._spills[i].index)))
+            for user_id, profile in items:
+                resident[user_id] = profile.to_dict()
+        return ProfileExport(resident, spilled)
+
+    def save(self, path: Path, meta: Optional[Dict[str, Any]] = None, profiles: Optional[ProfileExport] = None) -> int:
         """
-        counter = Counter()
+        Write profiles (default: export() now), spilled ones included, to
+        path (JSON, replaced atomically), plus meta (e.g. the last event log
+        sequence it covers). Returns the profile count.
+        """
+        profiles = dict((self.export() if profiles is None else profiles).items())
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(f".{path.name}.tmp-{os.getpid()}")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"meta": meta or {}, "profiles": profiles}, f)
+        os.replace(tmp, path)
+        return len(profiles)
+
+    def load(self, path: Path) -> int:
+        """
+        Replace the store's contents with the snapshot at path (its meta ends up
+        in snapshot_meta). Returns the profile count.
+        """
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+
+        self.clear()
+        self.snapshot_meta = data.get("meta", {})
+        profiles = data.get("profiles", {})
+        for user_id, raw in profiles.items():
+            i = self._shard(user_id)
+            with self._locks[i]:
+                self._insert(i, user_id, UserProfile.from_dict(raw, self.max_history))
+        return len(profiles)
+
+    def start_snapshots(self, snapshot: Callable[[], Any], interval: float = SNAPSHOT_INTERVAL_SECONDS) -> None:
+        """Call snapshot() (which should end in save()) every interval seconds while there are new clicks."""
+        if self._snapshot_thread is not None and self._snapshot_thread.is_alive():
+            return
+        self._snapshot_stop.clear()
+        self._snapshot_thread = threading.Thread(
+            target=self._snapshot_loop, args=(snapshot, interval), name="profile-snapshots", daemon=True
+        )
+        self._snapshot_thread.start()
 
-        for rid in self.click_history:
-            if rid in restaurant_lookup:
-                cuisines = restaurant_lookup[rid].get("cuisines", [])
-                for c in cuisines:
-                    counter[c.lower()] += 1
+    def stop_snapshots(self) -> None:
+        self._snapshot_stop.set()
+        if self._snapshot_thread is not None:
+            self._snapshot_thread.join(timeout=5)
+            self._snapshot_thread = None
 
-        return counter
\ No newline at end of file
+    def _snapshot_loop(self, snapshot: Callable[[], Any], interval: float) -> None:
+        while not self._snapshot_stop.wait(interval):
+            if not self._dirty:
+                continue
+            try:
+                snapshot()
+            except OSError as e:
+                print(f"Profile snapshot failed: {e}")
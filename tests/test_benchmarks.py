@@ -0,0 +1,47 @@
+import subprocess
+import sys
+from pathlib import Path
+
+from benchmarks.measure import compare, summarize
+from benchmarks.synthetic import generate_queries, generate_restaurants, generate_users, write_catalog
+from server.app import RecommendRequest
+from server.indexing.loader import load_restaurants
+
+
+def test_synthetic_catalog_is_deterministic_and_valid(tmp_path):
+    rows = list(generate_restaurants(300, seed=7))
+    assert rows == list(generate_restaurants(300, seed=7))
+    assert rows[:100] == list(generate_restaurants(100, seed=7))  # prefix-stable across sizes
+    assert rows != list(generate_restaurants(300, seed=8))
+
+    # the same rows through both file formats, and accepted by the repo's validator
+    ndjson = write_catalog(tmp_path / "r.ndjson.gz", 300, seed=7)
+    array = write_catalog(tmp_path / "r.json", 300, seed=7)
+    assert load_restaurants(ndjson) == rows and load_restaurants(array) == rows
+
+    script = Path(__file__).resolve().parents[1] / "scripts" / "validate_restaurants.py"
+    result = subprocess.run([sys.executable, str(script), str(array)], capture_output=True, text=True)
+    assert result.returncode == 0, result.stdout
+    assert "WARNING" not in result.stdout
+
+
+def test_synthetic_users_and_queries():
+    ids = {r["id"] for r in generate_restaurants(50)}
+    users = generate_users(20, 50)
+    assert all(u["clicks"] and set(u["clicks"]) <= ids for u in users)
+
+    for body in generate_queries(100, user_ids=[u["user_id"] for u in users]):
+        RecommendRequest(**body)  # every body is a valid request
+
+
+def test_compare_flags_regressions_beyond_tolerance():
+    assert summarize([3.0, 1.0, 2.0, 4.0]) == {"n": 4, "mean": 2.5, "p50": 2.0, "p90": 4.0, "p99": 4.0, "max": 4.0}
+
+    baseline = {"sizes": {"1000": {"build_s": 1.0, "recommend_http_ms": {"p50": 2.0, "p99": 5.0}}}}
+    current = {"sizes": {
+        "1000": {"build_s": 1.1, "recommend_http_ms": {"p50": 3.0, "p99": 5.0}},
+        "5000": {"build_s": 9.0},
+    }}
+    lines, regressions = compare(current, baseline, tolerance=0.2)
+    assert regressions == ["1000 POST /recommend p50"]
+    assert "5000: not in baseline" in lines
@@ -0,0 +1,104 @@
+import numpy as np
+from fastapi.testclient import TestClient
+
+import server.app as appmod
+from benchmarks.synthetic import generate_restaurants
+from server.indexing.candidates import CandidateIndex, merge_scores
+from server.indexing.incremental import delete_restaurant, upsert_restaurant
+from server.indexing.index_store import fit_index_stream
+from server.indexing.snapshot import IndexSnapshot
+from server.scoring import W_TFIDF
+
+client = TestClient(appmod.app)
+
+
+def _ids(body):
+    response = client.post("/recommend", json=body)
+    assert response.status_code == 200
+    return [r["id"] for r in response.json()]
+
+
+def test_lexical_scores_match_the_dense_product():
+    snap = appmod.ensure_index_ready()
+    retrieval = CandidateIndex(snap.tfidf_matrix, snap.signals)
+    query = snap.vectorizer.transform(["spicy ramen noodles"])
+
+    rows, scores = retrieval.lexical(query)
+    dense = (snap.tfidf_matrix @ query.T).toarray().ravel()
+    assert np.array_equal(rows, np.flatnonzero(dense))
+    assert np.allclose(scores, dense[rows])
+    assert len(retrieval.lexical(snap.vectorizer.transform(["zzzz"]))[0]) == 0
+
+    # the budget keeps the best estimated rows, in row order
+    picked = retrieval.select(rows, scores, 3)
+    assert len(picked) == 3 and np.all(np.diff(picked) > 0)
+    estimate = W_TFIDF * scores + retrieval.prior[rows]
+    assert estimate[picked].min() >= np.delete(estimate, picked).max()
+
+    popular = retrieval.popular(5)
+    assert len(popular) == 5 and np.all(np.diff(popular) > 0)
+
+    merged, merged_scores = merge_scores(np.array([1, 4]), np.array([0.5, 0.25]), np.array([2, 4]), np.array([1.0, 1.0]))
+    assert merged.tolist() == [1, 2, 4] and merged_scores.tolist() == [0.5, 1.0, 1.25]
+
+
+def test_edits_carry_the_postings_over(monkeypatch):
+    restaurants = list(generate_restaurants(420, seed=9))
+    snap = IndexSnapshot(*fit_index_stream(restaurants[:400]))
+    snap.candidates.postings
+
+    def copied(*args, **kwargs):
+        raise AssertionError("an edit rebuilt the postings")
+
+    monkeypatch.setattr(CandidateIndex, "__init__", copied)
+    for i, r in enumerate(restaurants[400:]):
+        snap = IndexSnapshot(*upsert_restaurant(snap.index, snap.restaurants, r), source="edit", previous=snap)
+        gone = restaurants[i * 7]["id"]
+        snap = IndexSnapshot(*delete_restaurant(snap.index, snap.restaurants, gone), source="edit", previous=snap)
+    carried = snap.candidates
+    monkeypatch.undo()
+
+    fresh = CandidateIndex(snap.tfidf_matrix, snap.signals)
+    for text in ("spicy ramen noodles", restaurants[410]["name"], "zzzz"):
+        query = snap.vectorizer.transform([text])
+        rows, scores = carried.lexical(query)
+        dense = (snap.tfidf_matrix @ query.T).toarray().ravel()
+        assert np.array_equal(rows, np.flatnonzero(dense)) and np.allclose(scores, dense[rows])
+    for n in (1, 10, 100, 1000):
+        assert carried.popular(n).tolist() == fresh.popular(n).tolist()
+
+
+def test_two_stage_matches_exhaustive_when_every_row_is_a_candidate(monkeypatch):
+    bodies = [
+        {"query": "ramen", "top_k": 5},
+        {"query": "coffee", "top_k": 5, "dietary_required": ["vegan"]},
+        {"query": "burgers", "top_k": 5, "max_distance_miles": 2.0},
+        {"query": "pizza", "top_k": 3, "user_location": {"lat": 40.4443, "lng": -79.9532}},
+        {"query": "", "halal": True, "top_k": 10, "fields": ["id", "score", "why"]},
+    ]
+    appmod.result_cache.clear()
+    exhaustive = [client.post("/recommend", json=body).json() for body in bodies]
+
+    # the popular set covers the whole (small) catalog: stage one drops nothing,
+    # so filters, distances and scores must come out exactly as exhaustive ranking's
+    monkeypatch.setattr(appmod, "CANDIDATE_BUDGET", 1)
+    monkeypatch.setattr(appmod, "POPULAR_CANDIDATES", 10_000)
+    appmod.result_cache.clear()
+    assert client.post("/recommend/batch", json={"requests": bodies}).json()["results"] == exhaustive
+    appmod.result_cache.clear()
+    assert [client.post("/recommend", json=body).json() for body in bodies] == exhaustive
+    appmod.result_cache.clear()
+
+
+def test_tiny_budget_bounds_the_scored_rows(monkeypatch):
+    monkeypatch.setattr(appmod, "CANDIDATE_BUDGET", 2)
+    monkeypatch.setattr(appmod, "POPULAR_CANDIDATES", 0)
+    appmod.result_cache.clear()
+    assert len(_ids({"query": "ramen", "top_k": 10})) <= 2
+    # nothing matches: only the popular rows can be ranked
+    assert _ids({"query": "zzzz", "top_k": 10}) == []
+
+    monkeypatch.setattr(appmod, "POPULAR_CANDIDATES", 4)
+    appmod.result_cache.clear()
+    assert len(_ids({"query": "zzzz", "top_k": 10})) == 4
+    appmod.result_cache.clear()
@@ -0,0 +1,55 @@
+import numpy as np
+import pytest
+
+from server.indexing.catalog import IdLookup, RestaurantCatalog
+from server.indexing.loader import load_restaurants
+from server.app import DATA_PATH
+
+ODD_ROWS = [
+    # ints in number fields, a null, a missing field and a field outside the schema
+    {"id": "a", "name": "Café ☕", "rating": 4, "lat": 40.7, "phone": None, "cuisines": ["Cafe"], "wifi": True},
+    # values that do not fit their column are kept as they were
+    {"id": 7, "lat": "40.1", "price_level": True, "cuisines": ["Thai", 3], "categories": None},
+    {},
+    {"id": "d", "menu_text": "", "dietary_tags": [], "review_count": 2 ** 60},
+]
+
+
+def test_rows_read_back_exactly_as_loaded():
+    restaurants = load_restaurants(DATA_PATH) + ODD_ROWS
+    catalog = RestaurantCatalog.from_records(restaurants)
+
+    assert len(catalog) == len(restaurants)
+    for view, r in zip(catalog, restaurants):
+        assert view == r and view.to_dict() == r
+        for key, value in r.items():
+            assert view.get(key) == value and type(view[key]) is type(value)
+    assert catalog[-1].get("name", "n/a") == "n/a"
+    assert "phone" in catalog[-4] and "phone" not in catalog[-1]
+    with pytest.raises(KeyError):
+        catalog[-2]["id"]
+    with pytest.raises(IndexError):
+        catalog[len(catalog)]
+
+
+def test_number_columns_are_vectorized_with_nan_for_missing():
+    catalog = RestaurantCatalog.from_records(ODD_ROWS)
+    lat = catalog.numbers("lat")
+    assert lat[0] == 40.7 and np.isnan(lat[1:]).all()
+
+
+def test_take_and_appended_return_new_catalogs():
+    restaurants = load_restaurants(DATA_PATH)[:5] + ODD_ROWS
+    catalog = RestaurantCatalog.from_records(restaurants)
+
+    rows = [6, 0, 0, 3]
+    taken = catalog.take(rows)
+    assert list(taken) == [restaurants[i] for i in rows]
+
+    extra = {"id": "new", "cuisines": ["Brand New Cuisine", "Cafe"], "menu_text": "x"}
+    grown = taken.appended([extra])
+    assert list(grown) == [restaurants[i] for i in rows] + [extra]
+    assert len(taken) == len(rows)  # unchanged
+
+    lookup = IdLookup(grown, {"new": 4})
+    assert lookup["new"] == extra and lookup.get("gone") is None and "new" in lookup
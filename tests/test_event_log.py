@@ -0,0 +1,116 @@
+import threading
+
+from fastapi.testclient import TestClient
+
+import server.app as appmod
+from server.event_log import EventLog
+from server.user_profile import ProfileStore
+
+
+def _clicks(n, start=0):
+    return [(f"u{i % 3}", "click", f"r{i}", ["Thai"]) for i in range(start, start + n)]
+
+
+def test_group_commit_and_replay(tmp_path):
+    log = EventLog(tmp_path, fsync=False)
+    log.append(_clicks(5))
+    assert log.append(_clicks(5, 5)) == 10
+    assert log.flush(timeout=5)
+    log.close()
+
+    reopened = EventLog(tmp_path, fsync=False)
+    assert reopened.last_seq == 10
+    assert [r[0] for r in reopened.replay(after_seq=7)] == [8, 9, 10]
+    reopened.close()
+
+
+def test_segments_roll_and_checkpoint_drops_covered_ones(tmp_path):
+    log = EventLog(tmp_path, fsync=False, commit_interval=0, max_segment_bytes=200)
+    for i in range(10):
+        log.append(_clicks(2, 2 * i))
+        log.flush(timeout=5)
+    assert len(log.segments()) > 2
+
+    seq = log.checkpoint()
+    log.append(_clicks(1, 100))
+    log.flush(timeout=5)
+    log.drop_through(seq)
+
+    assert [r[0] for r in log.replay(0)] == [seq + 1]
+    log.close()
+
+
+def test_torn_tail_is_skipped(tmp_path):
+    log = EventLog(tmp_path, fsync=False)
+    log.append(_clicks(3))
+    log.close()
+    with open(log.segments()[-1], "a", encoding="utf-8") as f:
+        f.write('[4,"u1","cli')  # crash mid-write
+
+    reopened = EventLog(tmp_path, fsync=False)
+    assert reopened.last_seq == 3
+    reopened.append(_clicks(1, 3))
+    reopened.close()
+    assert [r[0] for r in EventLog(tmp_path, fsync=False).replay(0)] == [1, 2, 3, 4]
+
+
+def test_snapshot_plus_tail_rebuilds_profiles(tmp_path, monkeypatch):
+    monkeypatch.setattr(appmod, "PROFILES_PATH", tmp_path / "profiles.json")
+    monkeypatch.setattr(appmod, "EVENT_LOG_DIR", tmp_path / "events")
+    monkeypatch.setattr(appmod, "USER_PROFILES", ProfileStore())
+    monkeypatch.setattr(appmod, "click_log", None)
+
+    appmod.load_profiles()
+    appmod.apply_feedback([appmod.FeedbackEvent("u1", "click", "a", ["Thai"])])
+    appmod.snapshot_profiles()
+    appmod.apply_feedback([appmod.FeedbackEvent("u1", "click", "b", ["Mexican"])])
+    appmod.click_log.close()
+
+    # "restart"
+    monkeypatch.setattr(appmod, "USER_PROFILES", ProfileStore())
+    monkeypatch.setattr(appmod, "click_log", None)
+    appmod.load_profiles()
+    profile = appmod.USER_PROFILES.get("u1")
+    assert list(profile.click_history) == ["a", "b"]
+    assert profile.cuisine_click_counts() == {"thai": 1, "mexican": 1}
+    appmod.click_log.close()
+
+
+def test_clicks_do_not_wait_for_a_profile_save(tmp_path, monkeypatch):
+    monkeypatch.setattr(appmod, "PROFILES_PATH", tmp_path / "profiles.json")
+    monkeypatch.setattr(appmod, "EVENT_LOG_DIR", tmp_path / "events")
+    monkeypatch.setattr(appmod, "USER_PROFILES", ProfileStore())
+    monkeypatch.setattr(appmod, "click_log", None)
+    appmod.load_profiles()
+    client = TestClient(appmod.app)
+    rid = appmod.ensure_index_ready().restaurants[0]["id"]
+    assert client.post("/click", json={"user_id": "u1", "restaurant_id": rid}).status_code == 200
+
+    saving, release = threading.Event(), threading.Event()
+    save = appmod.USER_PROFILES.save
+
+    def slow_save(*args, **kwargs):
+        saving.set()
+        release.wait(10)
+        return save(*args, **kwargs)
+
+    monkeypatch.setattr(appmod.USER_PROFILES, "save", slow_save)
+    snapshot = threading.Thread(target=appmod.snapshot_profiles)
+    snapshot.start()
+    try:
+        assert saving.wait(10)
+        response = client.post("/click", json={"user_id": "u1", "restaurant_id": rid})
+        assert response.status_code == 200 and response.json()["click_history_count"] == 2
+        assert snapshot.is_alive()
+    finally:
+        release.set()
+        snapshot.join(10)
+
+    # the snapshot holds the first click; the second is in the log after it
+    monkeypatch.setattr(appmod, "USER_PROFILES", ProfileStore())
+    appmod.click_log.close()
+    monkeypatch.setattr(appmod, "click_log", None)
+    appmod.load_profiles()
+    assert list(appmod.USER_PROFILES.get("u1").click_history) == [rid, rid]
+    assert appmod.USER_PROFILES.snapshot_meta["event_seq"] == 1
+    appmod.click_log.close()
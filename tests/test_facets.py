@@ -0,0 +1,88 @@
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+
+import server.app as appmod
+from server.app import app
+from server.indexing.facets import FacetIndex, intersect_sorted
+
+CATALOG = [
+    {"dietary_tags": ["halal", "vegan"], "price_level": 1, "cuisines": ["Thai"], "categories": ["Cafe, Healthy"]},
+    {"dietary_tags": ["halal"], "price_level": 2, "cuisines": ["Burgers"], "categories": ["Fast Food"]},
+    {"dietary_tags": ["vegan", "Halal"], "price_level": 3, "cuisines": ["thai"]},
+    {"dietary_tags": ["vegetarian"], "price_level": 1},
+    {"dietary_tags": ["halal", "vegan"], "price_level": 1, "cuisines": ["Mexican"]},
+]
+
+
+def test_match_intersects_postings():
+    facets = FacetIndex(CATALOG)
+    assert facets.match() is None
+    assert facets.match(dietary_required=["halal", "vegan"]).tolist() == [0, 2, 4]
+    assert facets.match(dietary_required=["halal", "vegan"], price_max=1).tolist() == [0, 4]
+    assert facets.match(price_max=2, cuisines=["THAI", "burgers"]).tolist() == [0, 1]
+    assert facets.match(categories=["healthy"]).tolist() == [0]
+    assert facets.match(dietary_required=["kosher"]).tolist() == []
+
+
+def test_appended_rows_extend_the_postings():
+    facets = FacetIndex(CATALOG[:3])
+    grown = facets.appended(CATALOG, 3)
+    fresh = FacetIndex(CATALOG)
+    for field, by_value in fresh.postings.items():
+        assert {v: rows.tolist() for v, rows in grown.postings[field].items()} == {
+            v: rows.tolist() for v, rows in by_value.items()
+        }
+    # the index it grew from is unchanged
+    assert facets.rows("dietary_tags", "halal").tolist() == [0, 1, 2]
+
+
+@pytest.fixture
+def restore_catalog():
+    yield
+    TestClient(app).post("/refresh", params={"wait": True})
+
+
+def test_edits_do_not_rebuild_the_facets(restore_catalog, monkeypatch):
+    client = TestClient(app)
+    appmod.ensure_index_ready()
+
+    def rebuilt(self, restaurants):
+        raise AssertionError("an edit rebuilt the facet postings")
+
+    monkeypatch.setattr(FacetIndex, "__init__", rebuilt)
+    place = {
+        "name": "Facet Test Kitchen", "dietary_tags": ["kosher"], "rating": 4.0, "price_level": 1,
+        "address": "1 Test Way, Irvine, CA", "lat": 33.6410, "lng": -117.8440,
+        "hours_text": "Mon–Sun 11am–10pm", "source": "manual",
+    }
+    assert client.put("/restaurants/facet_test_place", json=place).status_code == 200
+    found = client.post("/recommend", json={"top_k": 50, "dietary_required": ["kosher"], "price_max": 1}).json()
+    assert [r["id"] for r in found] == ["facet_test_place"]
+    assert client.delete("/restaurants/facet_test_place").status_code == 200
+
+
+def test_intersect_sorted():
+    rng = np.random.default_rng(0)
+    a = np.unique(rng.integers(0, 1000, 50))
+    b = np.unique(rng.integers(0, 1000, 400))
+    assert intersect_sorted(a, b).tolist() == sorted(set(a.tolist()) & set(b.tolist()))
+
+
+def test_recommend_dietary_and_price_filters():
+    client = TestClient(app)
+    r = client.post("/recommend", json={"top_k": 50, "dietary_required": ["vegetarian"], "price_max": 1})
+    assert r.status_code == 200
+    results = r.json()
+    assert results
+    for item in results:
+        assert "vegetarian" in item["dietary_tags"]
+        assert item["price_level"] <= 1
+
+    r = client.post("/recommend", json={"top_k": 50, "halal": True, "dietary_required": ["vegan"]})
+    assert r.status_code == 200
+    for item in r.json():
+        assert {"halal", "vegan"} <= set(item["dietary_tags"])
+
+    r = client.post("/recommend", json={"top_k": 5, "price_max": 5})
+    assert r.status_code == 422
@@ -0,0 +1,60 @@
+import threading
+import time
+
+from fastapi.testclient import TestClient
+
+import server.app as appmod
+from server.feedback_queue import FeedbackEvent, FeedbackQueue
+
+
+def test_queue_drops_when_full_and_applies_in_batches():
+    release = threading.Event()
+    applied = []
+
+    def apply(batch):
+        release.wait(5)
+        applied.append(len(batch))
+
+    q = FeedbackQueue(apply, max_size=3, apply_batch=10)
+    first = q.offer([FeedbackEvent("u", "click", "r0")])
+    # the consumer holds the first event while blocked, so 3 more fit
+    while q.stats()["queue_depth"]:
+        time.sleep(0.001)
+    accepted = q.offer([FeedbackEvent("u", "click", f"r{i}") for i in range(1, 6)])
+    release.set()
+    q.join()
+
+    assert first == 1 and accepted == 3
+    stats = q.stats()
+    assert stats["dropped"] == 2
+    assert stats["applied"] == 4
+    assert sum(applied) == 4 and max(applied) == 3
+
+
+def test_feedback_batch_endpoint():
+    client = TestClient(appmod.app)
+    appmod.USER_PROFILES.clear()
+
+    r = client.post("/feedback/batch", json={
+        "user_id": "u-batch",
+        "events": [
+            {"restaurant_id": "in_n_out_burger"},
+            {"restaurant_id": "in_n_out_burger", "type": "impression"},
+            {"restaurant_id": "moongoat_coffee", "user_id": "u-other"},
+            {"restaurant_id": "nope"},
+        ],
+    })
+    assert r.status_code == 200
+    body = r.json()
+    assert body["accepted"] == 3 and body["dropped"] == 0
+    assert [x["index"] for x in body["rejected"]] == [3]
+
+    appmod.feedback_queue.join()
+    profile = appmod.USER_PROFILES.get("u-batch")
+    assert list(profile.click_history) == ["in_n_out_burger"]
+    assert profile.impression_count == 1
+    assert list(appmod.USER_PROFILES.get("u-other").click_history) == ["moongoat_coffee"]
+
+    r = client.post("/feedback/batch", json={"events": [{"restaurant_id": "x", "type": "like"}]})
+    assert r.status_code == 422
+    appmod.USER_PROFILES.clear()
@@ -0,0 +1,54 @@
+import numpy as np
+import pytest
+
+from server.hours import HoursParseError, compile_schedule, parse_hours, week_minute
+from server.scoring import SignalColumns
+
+MON, TUE, FRI, SAT, SUN = 0, 1, 4, 5, 6
+
+
+def _open(text, day, hour, minute=0):
+    signals = SignalColumns.build([{"hours_text": text}])
+    open_now, closing_soon = signals.open_at(week_minute(day, hour, minute))
+    return bool(open_now[0]), bool(closing_soon[0])
+
+
+def test_after_midnight_spans_roll_into_next_day():
+    text = "Sun-Thu 10:30am-1am, Fri-Sat 10:30am-1:30am"
+    assert _open(text, MON, 0, 30) == (True, True)    # Sunday's span, closes at 1am
+    assert _open(text, MON, 1, 0) == (False, False)
+    assert _open(text, SAT, 1, 15) == (True, True)    # Friday's span runs to 1:30am
+    assert _open(text, MON, 10, 15) == (False, False)
+    assert _open(text, MON, 10, 30) == (True, False)
+    # Saturday's span ends Sunday 1:30am
+    assert _open(text, SUN, 1, 0) == (True, True)
+
+
+def test_closed_days_and_split_shifts():
+    text = "Tue–Thu 11am–2pm, 5pm–12am; Fri–Sat 11am–3:30am; Sun 11am–12am; Mon Closed"
+    assert _open(text, MON, 12) == (False, False)
+    assert _open(text, TUE, 15) == (False, False)
+    assert _open(text, TUE, 13, 45) == (True, True)
+    assert _open(text, TUE, 23) == (True, False)
+    # Sunday until midnight wraps to Monday 00:00 of the next week
+    assert _open(text, SUN, 23, 45) == (True, True)
+
+
+def test_week_wraps_around():
+    intervals = parse_hours("Sun 10pm-2am")
+    assert intervals == [(week_minute(SUN, 22, 0), week_minute(SUN, 22, 0) + 4 * 60)]
+    bits = np.frombuffer(compile_schedule(intervals), dtype=np.uint8)
+    assert int(np.unpackbits(bits).sum()) == 16  # four hours of 15-minute slots
+
+
+@pytest.mark.parametrize("text", ["Daily (varies)", "", "11am-9pm", "Mon-Fri", "Mon 25pm-3am"])
+def test_unparseable_hours(text):
+    with pytest.raises(HoursParseError):
+        parse_hours(text)
+
+
+def test_unknown_hours_fall_back_to_heuristic():
+    signals = SignalColumns.build([{"hours_text": "Daily (varies)"}, {"hours_text": "Mon Closed"}])
+    open_now, _ = signals.open_at(week_minute(MON, 12, 0))
+    assert signals.hours_known.tolist() == [False, True]
+    assert signals.open_scores(open_now).tolist() == [0.5, 0.0]
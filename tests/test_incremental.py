@@ -0,0 +1,108 @@
+import copy
+
+import pytest
+from fastapi.testclient import TestClient
+
+import server.app as appmod
+from server.indexing.incremental import compact, consistency_report, delete_restaurant, upsert_restaurant
+from server.indexing.index_store import fit_index, smooth_idf
+from server.indexing.loader import load_restaurants
+from server.indexing.segments import SegmentedMatrix, as_csr
+
+client = TestClient(appmod.app)
+
+NEW_PLACE = {
+    "id": "test_ramen_bar",
+    "name": "Test Ramen Bar",
+    "dietary_tags": ["vegetarian"],
+    "rating": 4.3,
+    "price_level": 2,
+    "address": "1 Test Way, Irvine, CA",
+    "lat": 33.6410,
+    "lng": -117.8440,
+    "hours_text": "Mon–Sun 11am–10pm",
+    "source": "manual",
+    "menu_text": "Tonkotsu ramen, shoyu ramen, gyoza and karaage",
+    "cuisines": ["Japanese"],
+    "categories": ["Restaurant"],
+}
+
+
+@pytest.fixture
+def restore_catalog():
+    yield
+    client.post("/refresh", params={"wait": True})
+
+
+def test_edits_then_compact_match_full_refit():
+    restaurants = load_restaurants(appmod.DATA_PATH)
+    index = fit_index(restaurants)
+
+    edited = copy.deepcopy(restaurants[0])
+    edited["menu_text"] = "Now serving matcha lattes and croissants all day"
+
+    index, restaurants = upsert_restaurant(index, restaurants, NEW_PLACE)
+    index, restaurants = upsert_restaurant(index, restaurants, edited)
+    index, restaurants = delete_restaurant(index, restaurants, restaurants[1]["id"])
+
+    # document frequencies are exact even before compaction
+    assert consistency_report(index, restaurants)["df_match"]
+
+    index, restaurants = compact(index, restaurants)
+    report = consistency_report(index, restaurants)
+    assert report["terms_match"] and report["df_match"]
+    assert report["max_abs_diff"] < 1e-12
+    assert index.tfidf_matrix.shape[0] == len(restaurants) == index.live_count
+
+
+def test_new_terms_get_the_idf_of_a_refit():
+    restaurants = load_restaurants(appmod.DATA_PATH)
+    index = fit_index(restaurants)
+    # a new restaurant, and an existing one replaced: both bring a new term
+    index, catalog = upsert_restaurant(index, restaurants, dict(NEW_PLACE, menu_text="zephyrine ramen"))
+    replaced = dict(restaurants[0], menu_text="quillbread and coffee")
+    index, catalog = upsert_restaurant(index, catalog, replaced)
+
+    refit = fit_index(restaurants[1:] + [dict(NEW_PLACE, menu_text="zephyrine ramen"), replaced])
+    for term in ("zephyrine", "quillbread"):
+        col = index.vectorizer.vocabulary[term]
+        assert index.vectorizer.idf_[col] == smooth_idf(index.df[col:col + 1], index.live_count)[0]
+        assert abs(index.vectorizer.idf_[col] - refit.vectorizer.idf_[refit.vectorizer.vocabulary[term]]) < 1e-12
+
+
+def test_edits_append_without_copying_the_built_index():
+    restaurants = load_restaurants(appmod.DATA_PATH)
+    built = fit_index(restaurants)
+
+    index, catalog = upsert_restaurant(built, restaurants, NEW_PLACE)
+    index, catalog = upsert_restaurant(index, catalog, dict(NEW_PLACE, id="second_place"))
+    index, catalog = delete_restaurant(index, catalog, restaurants[2]["id"])
+
+    # the built matrices are the base segment as they are; new rows sit in the delta
+    assert isinstance(index.tfidf_matrix, SegmentedMatrix) and index.tfidf_matrix.base is built.tfidf_matrix
+    assert index.tf_matrix.base is built.tf_matrix and index.tfidf_matrix.delta.shape[0] == 2
+    assert len(built.signals.rating) == len(restaurants) and len(index.signals.rating) == len(restaurants) + 2
+    assert index.id_to_index["second_place"] == len(restaurants) + 1 and restaurants[2]["id"] not in index.id_to_index
+    assert catalog[len(restaurants)]["name"] == NEW_PLACE["name"]
+
+    query = index.vectorizer.transform(["tonkotsu ramen"])
+    assert abs(index.tfidf_matrix @ query.T - as_csr(index.tfidf_matrix) @ query.T).max() == 0
+
+    compacted, _ = compact(index, catalog)
+    assert not isinstance(compacted.tfidf_matrix, SegmentedMatrix) and isinstance(compacted.id_to_index, dict)
+
+
+def test_put_and_delete_endpoints(restore_catalog):
+    r = client.put(f"/restaurants/{NEW_PLACE['id']}", json=NEW_PLACE)
+    assert r.status_code == 200 and r.json()["created"] is True
+
+    top = client.post("/recommend", json={"query": "tonkotsu ramen", "top_k": 1}).json()
+    assert top[0]["id"] == NEW_PLACE["id"]
+
+    assert client.delete(f"/restaurants/{NEW_PLACE['id']}").status_code == 200
+    assert client.delete(f"/restaurants/{NEW_PLACE['id']}").status_code == 404
+
+    after = client.post("/recommend", json={"query": "tonkotsu ramen", "top_k": 50}).json()
+    assert NEW_PLACE["id"] not in [x["id"] for x in after]
+
+    assert client.put("/restaurants/other_id", json=NEW_PLACE).status_code == 400
@@ -0,0 +1,25 @@
+import numpy as np
+
+from server.indexing.index_store import data_file_hash, fit_index, load_index, save_index
+from server.indexing.loader import load_restaurants
+from server.app import DATA_PATH
+
+
+def test_saved_index_round_trips_and_is_keyed_by_hash(tmp_path):
+    restaurants = load_restaurants(DATA_PATH)
+    data_hash = data_file_hash(DATA_PATH)
+
+    built = fit_index(restaurants, data_hash)
+    save_index(built, tmp_path)
+
+    loaded = load_index(tmp_path, data_hash)
+    assert loaded is not None
+    assert loaded.id_to_index == built.id_to_index
+    assert (loaded.tfidf_matrix != built.tfidf_matrix).nnz == 0
+    assert np.array_equal(loaded.signals.distance, built.signals.distance)
+
+    q = "spicy ramen halal"
+    assert (loaded.vectorizer.transform([q]) != built.vectorizer.transform([q])).nnz == 0
+
+    # a different data hash never picks up this artifact
+    assert load_index(tmp_path, "0" * 64) is None
@@ -0,0 +1,118 @@
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+
+import server.app as appmod
+from benchmarks.synthetic import generate_queries, generate_restaurants
+from server.indexing.index_store import STOP_WORDS, fit_index_stream
+from server.indexing.inverted import InvertedIndex
+from server.scoring import top_k_indices
+
+client = TestClient(appmod.app)
+
+
+def _inverted(restaurants):
+    index, catalog = fit_index_stream(restaurants)
+    return InvertedIndex.build(catalog, index.vectorizer.vocabulary, STOP_WORDS)
+
+
+@pytest.fixture
+def restore_catalog():
+    yield
+    client.post("/refresh", params={"wait": True})
+
+
+def test_top_k_matches_exhaustive_bm25():
+    inv = _inverted(list(generate_restaurants(3000, seed=5)))
+    queries = {body.get("query") or "food" for body in generate_queries(200, seed=5)}
+    queries |= {"vegan tacos near campus", "bubble tea boba", "spicy korean fried chicken", "zzzz"}
+
+    for text in sorted(queries):
+        full = inv.similarity(text)
+        assert full.max() <= 1.0 + 1e-9
+        for k in (1, 10, 50):
+            expected = top_k_indices(full, np.flatnonzero(full), k)
+            rows, scores = inv.top(text, k)
+            assert rows.tolist() == sorted(expected.tolist()), (text, k)
+            assert np.allclose(scores, full[rows])
+            assert np.allclose(inv.score_rows(text, rows), full[rows])
+
+    # one-word queries only score the postings that can still make the top k
+    for text in ("food", "pizza", "shawarma"):
+        stats = {}
+        inv.top(text, 10, stats)
+        assert stats["scored_postings"] < stats["postings"] / 10, (text, stats)
+
+
+def test_appended_rows_are_scored_like_indexed_ones():
+    index, catalog = fit_index_stream(list(generate_restaurants(3000, seed=6)))
+    vocabulary = index.vectorizer.vocabulary
+    inv = InvertedIndex.build([catalog[i] for i in range(2900)], vocabulary, STOP_WORDS)
+    inv = inv.appended(catalog.take(np.arange(2950)), 2900, vocabulary).appended(catalog, 2950, vocabulary)
+    assert inv.n_rows == 3000 and inv.n_indexed == 2900
+
+    for text in ("food", "vegan tacos near campus", "spicy korean fried chicken", catalog[2990]["name"]):
+        full = inv.similarity(text)
+        assert full.max() <= 1.0 + 1e-9
+        for k in (1, 10, 50):
+            rows, scores = inv.top(text, k)
+            assert rows.tolist() == sorted(top_k_indices(full, np.flatnonzero(full), k).tolist()), (text, k)
+            assert np.allclose(scores, full[rows])
+            assert np.allclose(inv.score_rows(text, rows), full[rows])
+    assert 2990 in inv.top(catalog[2990]["name"], 3)[0]
+
+
+def test_edits_do_not_rebuild_the_index(restore_catalog, monkeypatch):
+    monkeypatch.setattr(appmod, "RANKING_ENGINE", "bm25")
+    appmod.ensure_index_ready().bm25
+
+    def rebuilt(*args, **kwargs):
+        raise AssertionError("an edit rebuilt the BM25 index")
+
+    monkeypatch.setattr(InvertedIndex, "build", rebuilt)
+    place = {
+        "name": "Quokkaburger Test Stand", "dietary_tags": [], "rating": 4.0, "price_level": 1,
+        "address": "1 Test Way, Irvine, CA", "lat": 33.6410, "lng": -117.8440,
+        "hours_text": "Mon–Sun 11am–10pm", "source": "manual",
+    }
+    assert client.put("/restaurants/bm25_test_place", json=place).status_code == 200
+    appmod.result_cache.clear()
+    top = client.post("/recommend", json={"query": "quokkaburger", "top_k": 3}).json()
+    assert top[0]["id"] == "bm25_test_place"
+    appmod.result_cache.clear()
+
+
+def test_field_boosts_rank_name_matches_first():
+    base = {"cuisines": ["Cafe"], "categories": ["Restaurant"], "dietary_tags": [], "price_level": 2}
+    inv = _inverted([
+        {**base, "id": "menu", "name": "Corner Spot", "menu_text": "dumpling soup and noodles"},
+        {**base, "id": "name", "name": "Dumpling House", "menu_text": "steamed buns and noodles"},
+        {**base, "id": "none", "name": "Burger Stop", "menu_text": "burgers and fries"},
+    ])
+    scores = inv.similarity("dumpling")
+    assert scores[1] > scores[0] > 0 and scores[2] == 0
+
+
+def test_bm25_engine_serves_recommend(monkeypatch):
+    monkeypatch.setattr(appmod, "RANKING_ENGINE", "bm25")
+    bodies = [
+        {"query": "coffee", "top_k": 5, "fields": ["id", "score", "score_components", "why"]},
+        {"query": "burgers", "top_k": 5, "max_distance_miles": 2.0},
+        {"query": "", "halal": True, "top_k": 10},
+    ]
+    appmod.result_cache.clear()
+    exhaustive = [client.post("/recommend", json=body).json() for body in bodies]
+    assert exhaustive[0][0]["score_components"]["tfidf"] > 0
+    assert "query match: coffee" in exhaustive[0][0]["why"]
+    scores = [r["score"] for r in exhaustive[0]]
+    assert scores == sorted(scores, reverse=True)
+
+    appmod.result_cache.clear()
+    assert client.post("/recommend/batch", json={"requests": bodies}).json()["results"] == exhaustive
+
+    # two-stage with every row popular: BM25 top-k plus directly scored rows, same results
+    monkeypatch.setattr(appmod, "CANDIDATE_BUDGET", 1)
+    monkeypatch.setattr(appmod, "POPULAR_CANDIDATES", 10_000)
+    appmod.result_cache.clear()
+    assert [client.post("/recommend", json=body).json() for body in bodies] == exhaustive
+    appmod.result_cache.clear()
@@ -0,0 +1,63 @@
+import gzip
+import json
+
+import numpy as np
+import pytest
+
+from server.indexing.index_store import fit_index, fit_index_stream
+from server.indexing.loader import iter_restaurants, load_restaurants
+from server.app import DATA_PATH
+
+
+def _ndjson(restaurants):
+    return "".join(json.dumps(r) + "\n" for r in restaurants)
+
+
+def test_every_catalog_format_loads_the_same_records(tmp_path):
+    restaurants = load_restaurants(DATA_PATH)
+
+    as_list = tmp_path / "list.json"
+    as_list.write_text(json.dumps(restaurants), encoding="utf-8")
+    as_object = tmp_path / "object.json"
+    as_object.write_text(json.dumps({"restaurants": restaurants}, indent=2), encoding="utf-8")
+    as_ndjson = tmp_path / "catalog.ndjson"
+    as_ndjson.write_text("\n" + _ndjson(restaurants).replace("\n", "\n\n", 3), encoding="utf-8")
+    as_gzip = tmp_path / "catalog.ndjson.gz"
+    with gzip.open(as_gzip, "wt", encoding="utf-8") as f:
+        f.write(_ndjson(restaurants))
+    list_gzip = tmp_path / "list.json.gz"
+    with gzip.open(list_gzip, "wt", encoding="utf-8") as f:
+        json.dump(restaurants, f)
+
+    for path in (as_list, as_object, as_ndjson, as_gzip, list_gzip):
+        assert load_restaurants(path) == restaurants, path.name
+
+
+def test_ndjson_errors_name_the_line(tmp_path):
+    path = tmp_path / "catalog.ndjson"
+    path.write_text('{"id": "a"}\n{"id": "b"}\n{"id": \n', encoding="utf-8")
+
+    stream = iter_restaurants(path)
+    assert next(stream) == {"id": "a"}
+    assert next(stream) == {"id": "b"}
+    with pytest.raises(RuntimeError, match="line 3"):
+        next(stream)
+
+    path.write_text('{"id": "a"}\n[1, 2]\n', encoding="utf-8")
+    with pytest.raises(RuntimeError, match="line 2 is not an object"):
+        load_restaurants(path)
+
+
+def test_streamed_fit_matches_fit_on_a_list(tmp_path):
+    restaurants = load_restaurants(DATA_PATH)
+    path = tmp_path / "catalog.ndjson"
+    path.write_text(_ndjson(restaurants), encoding="utf-8")
+
+    built = fit_index(restaurants)
+    streamed, records = fit_index_stream(iter_restaurants(path))
+
+    assert list(records) == restaurants
+    assert streamed.id_to_index == built.id_to_index
+    assert (streamed.tfidf_matrix != built.tfidf_matrix).nnz == 0
+    for name in built.signals.ROW_COLUMNS:
+        assert np.array_equal(getattr(streamed.signals, name), getattr(built.signals, name), equal_nan=True)
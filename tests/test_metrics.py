@@ -0,0 +1,49 @@
+from fastapi.testclient import TestClient
+
+import server.app as appmod
+from server.metrics import Histogram, MetricsRegistry, StageTimer, gauge
+
+client = TestClient(appmod.app)
+
+
+def test_histogram_renders_cumulative_buckets():
+    registry = MetricsRegistry()
+    h = registry.histogram("latency_seconds", "Latency.", (0.1, 1.0), ("endpoint",))
+    h.observe_many([(("a",), 0.05), (("a",), 0.1), (("a",), 5.0)])
+    registry.collector(lambda: [gauge("things", "Things.", 3, {"kind": "x"}), gauge("things", "Things.", 4)])
+
+    lines = registry.render().splitlines()
+    assert 'latency_seconds_bucket{endpoint="a",le="0.1"} 2' in lines
+    assert 'latency_seconds_bucket{endpoint="a",le="1"} 2' in lines
+    assert 'latency_seconds_bucket{endpoint="a",le="+Inf"} 3' in lines
+    assert 'latency_seconds_count{endpoint="a"} 3' in lines
+    # one header per family even when it is yielded twice
+    assert lines.count("# TYPE things gauge") == 1
+    assert 'things{kind="x"} 3' in lines and "things 4" in lines
+
+
+def test_stage_timer_excludes_added_time_from_the_next_lap():
+    timer = StageTimer()
+    timer.add("matmul", 5.0)
+    timer.lap("wait")
+    h = Histogram("h", "h", (1.0,), ("endpoint", "stage"))
+    timer.finish(h, "recommend")
+    assert timer.stages["matmul"] == 5.0 and timer.stages["wait"] < 1.0
+    assert set(timer.stages) == {"matmul", "wait", "total"}
+
+
+def test_metrics_endpoint_and_server_timing_header(monkeypatch):
+    monkeypatch.setattr(appmod, "SERVER_TIMING", True)
+    response = client.post("/recommend", json={"query": "ramen noodles", "top_k": 3})
+    assert response.status_code == 200
+    stages = {part.split(";")[0] for part in response.headers["Server-Timing"].split(", ")}
+    assert {"cache", "filter", "vectorize", "score", "top_k", "total"} <= stages
+
+    monkeypatch.setattr(appmod, "SERVER_TIMING", False)
+    assert "Server-Timing" not in client.post("/recommend", json={"query": "ramen"}).headers
+
+    text = client.get("/metrics").text
+    assert 'recommender_stage_seconds_count{endpoint="recommend",stage="total"}' in text
+    assert "recommender_candidates_count" in text
+    assert "recommender_index_documents 50" in text.splitlines()
+    assert 'recommender_cache_hits_total{cache="results"}' in text
@@ -1,9 +1,20 @@
 import json
+
+import pytest
 from fastapi.testclient import TestClient
 
 import server.app as appmod
 
 
+@pytest.fixture(autouse=True)
+def restore_catalog():
+    data_path = appmod.DATA_PATH
+    yield
+    appmod.DATA_PATH = data_path
+    appmod.USER_PROFILES.clear()
+    TestClient(appmod.app).post("/refresh", params={"wait": True})
+
+
 def test_personalization_clicks_boost_mexican(tmp_path):
     restaurants = [
         {
@@ -46,7 +57,7 @@ def test_personalization_clicks_boost_mexican(tmp_path):
     client = TestClient(appmod.app)
     appmod.USER_PROFILES.clear()
 
-    refresh = client.post("/refresh")
+    refresh = client.post("/refresh", params={"wait": True})
     assert refresh.status_code == 200
 
     user_id = "u1"
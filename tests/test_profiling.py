@@ -0,0 +1,61 @@
+import threading
+import time
+
+from fastapi.testclient import TestClient
+
+import server.app as appmod
+from server.profiling import RequestProfiler
+
+client = TestClient(appmod.app)
+
+
+def test_only_the_next_n_calls_are_profiled():
+    profiler = RequestProfiler()
+    calls = []
+    work = profiler.profiled(lambda x: calls.append(x) or x * 2)
+
+    assert work(1) == 2 and profiler.session is None  # inactive: plain call
+
+    session = profiler.start(2)
+    assert [work(i) for i in range(4)] == [0, 2, 4, 6]
+    assert session.done.is_set() and session.completed == 2
+    profiler.finish(session)
+    assert "<lambda>" in session.pstats_text()
+    assert profiler.session is None
+
+
+def test_sampler_collects_collapsed_stacks():
+    profiler = RequestProfiler()
+
+    def slow_leaf():
+        time.sleep(0.05)
+
+    session = profiler.start(1, mode="sample", interval=0.002)
+    profiler.profiled(slow_leaf)()
+    profiler.finish(session)
+    stacks = session.collapsed().splitlines()
+    assert stacks and all(line.split(" (")[0] == "slow_leaf" for line in stacks)
+    assert session.samples > 0
+
+
+def test_profile_endpoint_covers_live_requests():
+    result = {}
+    thread = threading.Thread(
+        target=lambda: result.update(r=client.post("/debug/profile", params={"requests": 3, "timeout": 10}))
+    )
+    thread.start()
+    while appmod.profiler.session is None:
+        time.sleep(0.01)
+
+    # a second session is refused while one is running
+    assert client.post("/debug/profile", params={"requests": 1}).status_code == 409
+
+    for i in range(3):
+        appmod.result_cache.clear()
+        assert client.post("/recommend", json={"query": f"noodles {i}"}).status_code == 200
+    thread.join(timeout=10)
+
+    response = result["r"]
+    assert response.status_code == 200
+    assert response.headers["X-Profile-Profiled"] == "3"
+    assert "rank_restaurants" in response.text
@@ -0,0 +1,120 @@
+import json
+
+import numpy as np
+from fastapi.testclient import TestClient
+
+import server.app as appmod
+from server.indexing.spelling import SpellIndex, edit_distance
+from server.query_processing import PhraseMatcher, expand_query, load_synonyms
+
+client = TestClient(appmod.app)
+
+VOCABULARY = {term: i for i, term in enumerate(
+    ["pizza", "pita", "shawarma", "chai", "coffee", "noodles", "ramen", "tea", "10oz"]
+)}
+
+
+def _spelling(**kwargs):
+    df = np.array([40, 5, 3, 2, 30, 8, 6, 9, 1])
+    return SpellIndex.build(VOCABULARY, df, **kwargs)
+
+
+def test_edit_distance_counts_swaps_and_stops_at_the_limit():
+    assert edit_distance("piza", "pizza", 2) == 1
+    assert edit_distance("cofee", "coffee", 2) == 1
+    assert edit_distance("raemn", "ramen", 2) == 1
+    assert edit_distance("shawarrma", "shawarma", 2) == 1
+    assert edit_distance("noodles", "ramen", 2) == 3
+
+
+def test_spelling_corrects_to_the_closest_frequent_term():
+    spelling = _spelling()
+    assert spelling.correct("piza") == "pizza"  # pita is as close, but rarer
+    assert spelling.correct("shawarrma") == "shawarma"
+    assert spelling.correct("noodels") == "noodles"
+    assert spelling.correct("ramne") == "ramen"
+
+    # known words, short words, other first letters and far-off words stay as they are
+    assert spelling.correct("pizza") is None
+    assert spelling.correct("tee") is None
+    assert spelling.correct("thai") is None
+    assert spelling.correct("burrito") is None
+    # one edit for words under six letters
+    assert spelling.correct("pzzz") is None
+    assert "10oz" not in spelling.terms
+
+    # repeats come from the cache
+    spelling.correct("piza")
+    assert spelling.stats()["hits"] >= 1
+
+
+def test_edits_extend_the_spelling_index(monkeypatch):
+    spelling = _spelling()
+    spelling.correct("piza")
+
+    def rebuilt(*args, **kwargs):
+        raise AssertionError("an edit rebuilt the spelling index")
+
+    monkeypatch.setattr(SpellIndex, "build", rebuilt)
+    vocabulary = {**VOCABULARY, "dumpling": 9}
+    # the last pizza place is gone and a dumpling house came in
+    edited = spelling.appended(vocabulary, np.array([0, 5, 3, 2, 30, 8, 6, 9, 1, 2]))
+    assert edited.correct("dumplng") == "dumpling"
+    assert edited.correct("piza") == "pita" and edited.stats()["hits"] == 0
+    assert len(edited) == len(spelling)
+    # ... and back
+    assert edited.appended(vocabulary, np.array([40, 5, 3, 2, 30, 8, 6, 9, 1, 2])).correct("piza") == "pizza"
+    assert spelling.correct("dumplng") is None
+
+
+def test_phrases_match_longest_first_and_keep_the_builtin_expansions():
+    assert expand_query("boba") == ("bubble tea boba", {})
+    assert expand_query("Veg BBQ") == ("vegetarian veg barbecue bbq", {})
+
+    phrases = PhraseMatcher({"bubble tea": ["boba"], "bubble": "foam", "mac and cheese": "macaroni"})
+    assert expand_query("bubble-tea near me", phrases) == ("boba bubble tea near me", {})
+    assert expand_query("bubble wrap", phrases) == ("foam bubble wrap", {})
+    assert expand_query("mac and cheese", phrases)[0] == "macaroni mac and cheese"
+    assert expand_query("mac and", phrases)[0] == "mac and"
+
+    # corrected words can complete a phrase; phrase words are never corrected
+    spelling = _spelling()
+    assert expand_query("pita shawarrma", PhraseMatcher({"shawarma": "gyro"}), spelling) == (
+        "pita gyro shawarma", {"shawarrma": "shawarma"}
+    )
+    assert expand_query("piza", PhraseMatcher({"piza": "pie"}), spelling) == ("pie piza", {})
+
+
+def test_synonyms_file_loads_as_phrase_lists(tmp_path):
+    path = tmp_path / "synonyms.json"
+    path.write_text(json.dumps({"boba": "bubble tea", "hot pot": ["hotpot", "shabu"]}))
+    assert load_synonyms(path) == {"boba": ["bubble tea"], "hot pot": ["hotpot", "shabu"]}
+    assert load_synonyms(appmod.REPO_ROOT / "data" / "synonyms.json")["boba"] == ["bubble tea"]
+
+
+def test_recommend_reports_corrections(monkeypatch):
+    appmod.result_cache.clear()
+    response = client.post("/recommend", json={"query": "piza", "top_k": 5})
+    assert response.headers["X-Query-Corrections"] == "piza=pizza"
+    assert response.json() == client.post("/recommend", json={"query": "pizza", "top_k": 5}).json()
+    assert "X-Query-Corrections" not in client.post("/recommend", json={"query": "pizza"}).headers
+    batch = client.post("/recommend/batch", json={"requests": [{"query": "shawarrma"}, {"query": "coffee"}]}).json()
+    assert batch["corrections"] == [{"shawarrma": "shawarma"}, {}]
+
+    # cached results carry their corrections: a hit does no query processing
+    def no_query_processing(snap, req):
+        raise AssertionError("cache hit expanded the query")
+
+    monkeypatch.setattr(appmod, "build_query_text", no_query_processing)
+    again = client.post("/recommend", json={"query": "piza", "top_k": 5})
+    assert again.headers["X-Query-Corrections"] == "piza=pizza"
+    assert again.json() == response.json()
+    assert client.post("/recommend/batch", json={"requests": [{"query": "coffee"}, {"query": "shawarrma"}]}).json()[
+        "corrections"
+    ] == [{}, {"shawarrma": "shawarma"}]
+    monkeypatch.undo()
+
+    monkeypatch.setattr(appmod, "SPELL_CORRECTION", False)
+    appmod.result_cache.clear()
+    assert "X-Query-Corrections" not in client.post("/recommend", json={"query": "piza"}).headers
+    appmod.result_cache.clear()
@@ -0,0 +1,61 @@
+import threading
+import time
+
+import numpy as np
+
+from server.indexing.index_store import fit_index
+from server.indexing.loader import load_restaurants
+from server.query_vectors import QueryBatcher, QueryVectorCache
+from server.app import DATA_PATH
+
+
+class SlowVectorizer:
+    """Wraps a vectorizer so a batch is still running when the other threads arrive."""
+
+    def __init__(self, inner):
+        self.inner = inner
+
+    def transform(self, texts):
+        time.sleep(0.05)
+        return self.inner.transform(texts)
+
+
+def test_concurrent_queries_are_batched_and_exact():
+    index = fit_index(load_restaurants(DATA_PATH))
+    vectorizer = SlowVectorizer(index.vectorizer)
+    batcher = QueryBatcher(QueryVectorCache())
+
+    queries = ["pizza", "sushi", "burgers", "boba tea", "halal", "pizza", "coffee", "tacos"]
+    results = [None] * len(queries)
+
+    def run(i):
+        results[i] = batcher.similarity(index.tfidf_matrix, vectorizer, queries[i])
+
+    threads = [threading.Thread(target=run, args=(i,)) for i in range(len(queries))]
+    threads[0].start()
+    time.sleep(0.01)
+    for t in threads[1:]:
+        t.start()
+    for t in threads:
+        t.join()
+
+    for q, got in zip(queries, results):
+        expected = (index.tfidf_matrix @ index.vectorizer.transform([q]).T).toarray().ravel()
+        assert np.array_equal(got, expected)
+
+    stats = batcher.stats()
+    assert stats["queries"] == len(queries)
+    assert stats["batches"] < len(queries)
+
+
+def test_vector_cache_resets_for_new_vectorizer():
+    index = fit_index(load_restaurants(DATA_PATH))
+    cache = QueryVectorCache()
+
+    cache.vectors(index.vectorizer, ["pizza", "sushi"])
+    cache.vectors(index.vectorizer, ["pizza"])
+    assert cache.stats()["hits"] == 1
+
+    other = fit_index(load_restaurants(DATA_PATH)[:10])
+    cache.vectors(other.vectorizer, ["pizza"])
+    assert cache.stats()["hits"] == 1 and cache.stats()["size"] == 1
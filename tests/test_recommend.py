@@ -65,7 +65,10 @@ def test_query_changes_top_result():
     assert top1 != top2
 
 #Test # 4: Time-of-day affects ranking
-def test_open_score_affects_ranking_when_closed_exists():
+def test_open_score_affects_ranking_when_closed_exists(monkeypatch):
+    # open is computed from the weekly schedule: pin the clock to Monday noon
+    monkeypatch.setattr("server.app.get_minute_of_week", lambda: 12 * 60)
+
     response = client.post("/recommend", json={
         "query": "food",
         "halal": False
@@ -81,4 +84,61 @@ def test_open_score_affects_ranking_when_closed_exists():
 
     closed_items = [r for r in results if "closed" in (r.get("hours_text") or "").lower()]
     if closed_items:
-        assert all(r["score_components"]["open"] == 0.0 for r in closed_items)
\ No newline at end of file
+        assert all(r["score_components"]["open"] == 0.0 for r in closed_items)
+
+#test 5: Batch Endpoint Matches Single Requests
+def test_recommend_batch_matches_single_requests(monkeypatch):
+    from server import app as appmod
+    monkeypatch.setattr("server.app.get_minute_of_week", lambda: 12 * 60)
+
+    requests = [
+        {"query": "burgers", "top_k": 5},
+        {"query": "", "halal": True, "top_k": 3},
+        {"query": "coffee", "user_location": {"lat": 40.74, "lng": -74.0}, "max_distance_miles": 5},
+        {"query": "pizza", "price_max": 2, "cuisines_optional": ["italian"]},
+        {"query": "burgers", "top_k": 5},
+    ]
+
+    appmod.result_cache.clear()
+    response = client.post("/recommend/batch", json={"requests": requests})
+    assert response.status_code == 200
+    batch = response.json()["results"]
+    assert len(batch) == len(requests)
+
+    appmod.result_cache.clear()
+    for req, got in zip(requests, batch):
+        single = client.post("/recommend", json=req)
+        assert single.status_code == 200
+        assert got == single.json()
+
+
+def test_recommend_batch_rejects_empty_batch():
+    response = client.post("/recommend/batch", json={"requests": []})
+    assert response.status_code == 422
+
+
+#test 6: Compact View And Field Projection
+def test_compact_view_and_fields_shape_results():
+    full = client.post("/recommend", json={"query": "burgers", "top_k": 3}).json()
+    compact = client.post("/recommend", json={"query": "burgers", "top_k": 3, "view": "compact"}).json()
+
+    assert [r["id"] for r in compact] == [r["id"] for r in full]
+    for c, f in zip(compact, full):
+        assert "menu_text" not in c and "score_components" not in c
+        assert c == {k: f[k] for k in c}
+
+    picked = client.post("/recommend", json={"query": "burgers", "top_k": 3, "fields": ["name", "score"]}).json()
+    assert picked == [{"name": f["name"], "score": f["score"]} for f in full]
+
+    bad = client.post("/recommend", json={"query": "burgers", "fields": ["password"]})
+    assert bad.status_code == 422
+
+
+def test_stdlib_encoder_matches_orjson_output(monkeypatch):
+    import json
+    from server import json_encoding
+
+    value = {"name": "Café ☕", "rating": 4.25, "tags": ["a", None], "n": 2 ** 70}
+    fast = json_encoding.dumps(value)
+    monkeypatch.setattr(json_encoding, "orjson", None)
+    assert json.loads(json_encoding.dumps(value)) == json.loads(fast) == value
@@ -0,0 +1,69 @@
+import json
+
+from fastapi.testclient import TestClient
+
+import server.app as appmod
+from server.result_cache import ResultCache
+
+client = TestClient(appmod.app)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_lru_ttl_and_version_invalidation():
+    clock = FakeClock()
+    cache = ResultCache(max_entries=2, ttl_seconds=10, clock=clock)
+
+    cache.put("a", 1, "A")
+    cache.put("b", 1, "B")
+    assert cache.get("a", 1) == "A"  # a is now most recent
+    cache.put("c", 1, "C")  # evicts b
+    assert cache.get("b", 1) is None
+    assert cache.get("a", 1) == "A" and cache.get("c", 1) == "C"
+
+    clock.now = 11
+    assert cache.get("a", 1) is None  # expired
+
+    cache.put("d", 1, "D")
+    assert cache.get("d", 2) is None  # newer index version drops everything
+    assert len(cache) == 0
+
+    stats = cache.stats()
+    assert stats["evictions"] == 1 and stats["expirations"] == 1 and stats["invalidations"] == 1
+
+
+def test_recommend_hits_cache_and_feedback_invalidates():
+    body = {"query": "  Burgers ", "top_k": 3}
+    first = client.post("/recommend", json=body).json()
+
+    before = appmod.result_cache.stats()["hits"]
+    again = client.post("/recommend", json={"query": "burgers", "top_k": 3}).json()
+    assert again == first
+    assert appmod.result_cache.stats()["hits"] == before + 1
+
+    assert client.post("/feedback", json={"restaurant_id": first[0]["id"]}).status_code == 200
+    misses = appmod.result_cache.stats()["misses"]
+    client.post("/recommend", json=body)
+    assert appmod.result_cache.stats()["misses"] == misses + 1
+
+
+def test_warm_up_from_query_log(tmp_path):
+    log = tmp_path / "query_log.jsonl"
+    lines = [{"query": "pizza", "top_k": 2}] * 3 + [{"query": "sushi"}, "not json", {"top_k": 500}]
+    # same query, different filters: separate cache entries, so both are warmed
+    lines += [{"query": "Pizza ", "top_k": 2, "price_max": 1, "dietary_required": ["vegan"]}] * 2
+    log.write_text("\n".join(json.dumps(x) if isinstance(x, dict) else x for x in lines), encoding="utf-8")
+
+    appmod.result_cache.clear()
+    assert appmod.warm_result_cache(log) == 3
+
+    hits = appmod.result_cache.stats()["hits"]
+    client.post("/recommend", json={"query": "PIZZA", "top_k": 2})
+    client.post("/recommend", json={"query": "pizza", "top_k": 2, "price_max": 1, "dietary_required": ["Vegan"]})
+    assert appmod.result_cache.stats()["hits"] == hits + 2
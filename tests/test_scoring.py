@@ -0,0 +1,21 @@
+import numpy as np
+
+from server.scoring import top_k_indices
+
+
+def test_top_k_matches_stable_full_sort():
+    rng = np.random.default_rng(0)
+    # coarse scores so there are plenty of ties at the cut-off
+    scores = rng.integers(0, 5, size=200).astype(float)
+    candidates = np.flatnonzero(rng.random(200) < 0.7)
+
+    expected = sorted(candidates.tolist(), key=lambda i: scores[i], reverse=True)
+
+    for k in (1, 3, 10, 50, len(candidates), len(candidates) + 5):
+        got = top_k_indices(scores, candidates, k).tolist()
+        assert got == expected[:k]
+
+
+def test_top_k_empty_candidates():
+    scores = np.array([0.3, 0.1])
+    assert top_k_indices(scores, np.array([], dtype=np.int64), 5).tolist() == []
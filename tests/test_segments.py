@@ -0,0 +1,50 @@
+import numpy as np
+from scipy import sparse
+
+from server.indexing.segments import OverlayMap, SegmentedMatrix, append_matrix_rows, append_rows
+
+
+def test_append_rows_grows_in_place_and_copies_older_views():
+    a = append_rows(np.arange(3.0), [3.0])
+    b = append_rows(a, [4.0])
+    assert b.base is a.base and list(a) == [0, 1, 2, 3]
+    # a is no longer the newest view of its buffer, so appending to it again copies
+    c = append_rows(a, [9.0])
+    assert c.base is not a.base
+    assert list(b) == [0, 1, 2, 3, 4] and list(c) == [0, 1, 2, 3, 9]
+
+    rows = append_rows(np.zeros((2, 3), dtype=np.int8), np.ones((1, 3), dtype=np.int8))
+    assert rows.shape == (3, 3) and rows.dtype == np.int8 and not rows.flags.writeable
+
+
+def test_segmented_matrix_behaves_like_the_merged_matrix():
+    base = sparse.random(30, 40, density=0.2, format="csr", random_state=1)
+    matrix, merged = base, base
+    for i in range(5):
+        # every appended row brings 2 new columns
+        row = sparse.random(1, 42 + 2 * i, density=0.3, format="csr", random_state=10 + i)
+        matrix = append_matrix_rows(matrix, row)
+        merged = sparse.vstack(
+            [sparse.csr_matrix((merged.data, merged.indices, merged.indptr), shape=(merged.shape[0], row.shape[1])), row],
+            format="csr",
+        )
+    assert isinstance(matrix, SegmentedMatrix) and matrix.base is base
+    assert matrix.shape == merged.shape and matrix.nnz == merged.nnz
+    assert (matrix.tocsr() != merged).nnz == 0
+
+    queries = sparse.random(3, merged.shape[1], density=0.3, format="csr", random_state=5)
+    assert abs(matrix @ queries.T - merged @ queries.T).max() == 0
+    weights = np.arange(merged.shape[1], dtype=np.float64)
+    assert np.array_equal(matrix @ weights, merged @ weights)
+
+    rows = np.array([32, 3, 30, 0, 34, 34])
+    assert (matrix[rows] != merged[rows]).nnz == 0
+    assert (matrix[31] != merged[31]).nnz == 0 and (matrix[-1] != merged[-1]).nnz == 0
+
+
+def test_overlay_map_applies_changes_without_touching_the_base():
+    base = {"a": 0, "b": 1}
+    ids = OverlayMap(base).updated("c", 2).updated("a", None).updated("b", 3)
+    assert dict(ids) == {"b": 3, "c": 2} and len(ids) == 2
+    assert "a" not in ids and ids.get("a") is None and ids["c"] == 2
+    assert base == {"a": 0, "b": 1}
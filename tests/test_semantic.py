@@ -0,0 +1,66 @@
+import numpy as np
+
+from server.indexing.incremental import compact, delete_restaurant, upsert_restaurant
+from server.indexing.index_store import ensure_semantic, fit_index_stream, load_index, load_or_fit_index, save_index
+from server.indexing.loader import load_restaurants
+from server.app import DATA_PATH
+
+
+def _index(lsa_dims=32, lsa_quantize=False):
+    index, catalog = fit_index_stream(load_restaurants(DATA_PATH), data_hash="abc123")
+    return ensure_semantic(index, lsa_dims, lsa_quantize), catalog
+
+
+def _row(catalog, name):
+    return next(i for i, r in enumerate(catalog) if r["name"] == name)
+
+
+def test_lsa_scores_related_terms_tfidf_misses():
+    index, catalog = _index()
+    semantic = index.semantic
+    assert semantic.dims == 32 and semantic.vectors.dtype == np.float32
+    assert np.allclose(np.linalg.norm(semantic.vectors, axis=1), 1.0, atol=1e-5)
+
+    query = index.vectorizer.transform(["ramen"])
+    lexical = (index.tfidf_matrix @ query.T).toarray().ravel()
+    blended = semantic.blend(lexical, query, weight=0.3, top_n=10)
+
+    noodles = _row(catalog, "Noodle St.")
+    assert lexical[noodles] == 0 and blended[noodles] > 0
+    assert np.count_nonzero(blended > (1 - 0.3) * lexical) <= 10  # only the top N are lifted
+    # unknown words have no projection: scores stay purely lexical
+    unknown = index.vectorizer.transform(["zzzz"])
+    assert semantic.blend(lexical, unknown, 0.3, 10) is lexical
+
+
+def test_quantized_vectors_track_float_scores():
+    exact, _ = _index()
+    small, _ = _index(lsa_quantize=True)
+    assert small.semantic.codes.dtype == np.int8 and small.semantic.vectors is None
+
+    q = exact.semantic.project(exact.vectorizer.transform(["coffee espresso"]))[0]
+    assert np.abs(exact.semantic.scores(q) - small.semantic.scores(q)).max() < 0.02
+
+
+def test_lsa_vectors_persist_and_follow_edits(tmp_path):
+    index, catalog = _index(lsa_quantize=True)
+    save_index(index, tmp_path)
+
+    loaded = load_index(tmp_path, "abc123")
+    assert isinstance(loaded.semantic.codes, np.memmap)
+    assert np.array_equal(loaded.semantic.codes, index.semantic.codes)
+
+    # same settings: the mapped vectors are used as they are; other settings refit or drop them
+    kept, _ = load_or_fit_index(catalog, "abc123", tmp_path, lsa_dims=32, lsa_quantize=True)
+    assert isinstance(kept.semantic.codes, np.memmap)
+    assert load_or_fit_index(catalog, "abc123", tmp_path)[0].semantic is None
+    assert load_or_fit_index(catalog, "abc123", tmp_path, lsa_dims=16)[0].semantic.dims == 16
+
+    new = {"id": "ramen_place", "name": "Ramen Place", "menu_text": "tonkotsu ramen and noodles"}
+    index, catalog = upsert_restaurant(index, catalog, new)
+    index, catalog = delete_restaurant(index, catalog, catalog[0]["id"])
+    assert len(index.semantic) == index.tfidf_matrix.shape[0] == len(catalog)
+
+    index, catalog = compact(index, catalog)
+    assert len(index.semantic) == index.tfidf_matrix.shape[0] == len(catalog)
+    assert index.semantic.components.shape[1] == index.tfidf_matrix.shape[1]
@@ -0,0 +1,52 @@
+import json
+
+import numpy as np
+
+from server.indexing.loader import load_restaurants
+from server.indexing.shared import KEEP_VERSIONS, publish_shared, read_header
+from server.indexing.snapshot import IndexManager, build_snapshot
+from server.app import DATA_PATH
+
+
+def is_mapped(array) -> bool:
+    while array is not None and not isinstance(array, np.memmap):
+        array = array.base
+    return array is not None
+
+
+def test_workers_attach_to_published_versions(tmp_path):
+    restaurants = load_restaurants(DATA_PATH)
+    data_path = tmp_path / "restaurants.json"
+    data_path.write_text(json.dumps(restaurants), encoding="utf-8")
+    shared_dir = tmp_path / "shared"
+
+    built = build_snapshot(data_path, None, version=1)
+    assert publish_shared(built.index, built.restaurants, shared_dir)["version"] == 1
+
+    worker = IndexManager(data_path=lambda: data_path, index_dir=lambda: None, shared_dir=lambda: shared_dir)
+    snap = worker.ensure_ready()
+
+    # same content, but backed by the shared files rather than private copies
+    assert list(snap.restaurants) == restaurants
+    assert snap.restaurants.payload(3, "detail") == built.restaurants.payload(3, "detail")
+    assert (snap.tfidf_matrix != built.tfidf_matrix).nnz == 0
+    assert is_mapped(snap.tfidf_matrix.data)
+    assert is_mapped(snap.signals.distance)
+
+    # unchanged header: nothing to attach
+    build = worker.request_rebuild()
+    assert worker.wait(build["build_id"], timeout=10)["status"] == "skipped"
+    assert worker.current is snap
+
+    for n in (10, 5, 3):
+        data_path.write_text(json.dumps(restaurants[:n]), encoding="utf-8")
+        smaller = build_snapshot(data_path, None, version=1)
+        publish_shared(smaller.index, smaller.restaurants, shared_dir)
+
+    assert read_header(shared_dir)["version"] == 4
+    assert len(list(shared_dir.glob("v*"))) == KEEP_VERSIONS
+
+    build = worker.request_rebuild()
+    assert worker.wait(build["build_id"], timeout=10)["status"] == "done"
+    assert worker.current.live_count == 3
+    assert list(worker.current.restaurants) == restaurants[:3]
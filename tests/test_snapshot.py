@@ -0,0 +1,109 @@
+import json
+import threading
+import time
+
+from server.indexing.incremental import upsert_restaurant
+from server.indexing.loader import load_restaurants
+from server.indexing.snapshot import IndexManager, IndexSnapshot
+from server.app import DATA_PATH
+
+
+def _write(path, restaurants):
+    path.write_text(json.dumps(restaurants), encoding="utf-8")
+
+
+def test_rebuild_publishes_new_snapshot_and_watcher_picks_up_changes(tmp_path):
+    restaurants = load_restaurants(DATA_PATH)
+    data_path = tmp_path / "restaurants.json"
+    _write(data_path, restaurants[:10])
+
+    manager = IndexManager(data_path=lambda: data_path, index_dir=lambda: None)
+    first = manager.ensure_ready()
+    assert first.live_count == 10
+
+    # unchanged file: the build is a no-op and the snapshot stays the same object
+    build = manager.request_rebuild()
+    assert manager.wait(build["build_id"], timeout=10)["status"] == "skipped"
+    assert manager.current is first
+
+    _write(data_path, restaurants[:20])
+    build = manager.request_rebuild()
+    status = manager.wait(build["build_id"], timeout=10)
+    assert status["status"] == "done" and status["count"] == 20
+    assert manager.current.version > first.version
+    # old snapshot is untouched
+    assert first.live_count == 10 and len(first.restaurants) == 10
+
+    manager.start_watcher(interval=0.05)
+    try:
+        time.sleep(0.1)
+        _write(data_path, restaurants[:5])
+        deadline = time.monotonic() + 10
+        while manager.current.live_count != 5 and time.monotonic() < deadline:
+            time.sleep(0.02)
+        assert manager.current.live_count == 5
+    finally:
+        manager.stop_watcher()
+
+
+def test_failed_build_keeps_serving_snapshot(tmp_path):
+    data_path = tmp_path / "restaurants.json"
+    _write(data_path, load_restaurants(DATA_PATH)[:3])
+
+    manager = IndexManager(data_path=lambda: data_path, index_dir=lambda: None)
+    snap = manager.ensure_ready()
+
+    data_path.write_text("{not json", encoding="utf-8")
+    build = manager.request_rebuild()
+    status = manager.wait(build["build_id"], timeout=10)
+    assert status["status"] == "failed" and status["error"]
+    assert manager.current is snap
+
+
+def test_edit_during_rebuild_is_replayed_onto_it(tmp_path):
+    restaurants = load_restaurants(DATA_PATH)
+    data_path = tmp_path / "restaurants.json"
+    _write(data_path, restaurants[:10])
+
+    building, release = threading.Event(), threading.Event()
+
+    def prepare(snap):
+        # hold up the rebuild only (edits are prepared too)
+        if manager.current is not None and not building.is_set():
+            building.set()
+            release.wait(10)
+
+    manager = IndexManager(data_path=lambda: data_path, index_dir=lambda: None, prepare=prepare)
+    manager.ensure_ready()
+
+    _write(data_path, restaurants[:20])
+    build = manager.request_rebuild()
+    assert building.wait(10)
+    # the rebuild has read the file; this edit lands before it publishes
+    added = dict(restaurants[30], id="added_during_rebuild")
+    edited = manager.edit(lambda snap: IndexSnapshot(*upsert_restaurant(snap.index, snap.restaurants, added)))
+    assert edited.live_count == 11
+    release.set()
+
+    status = manager.wait(build["build_id"], timeout=10)
+    assert status["status"] == "done" and status["count"] == 21
+    assert "added_during_rebuild" in manager.current.id_to_index
+    assert manager.current.version > edited.version
+
+
+def test_edits_are_prepared_before_they_are_published(tmp_path):
+    restaurants = load_restaurants(DATA_PATH)
+    data_path = tmp_path / "restaurants.json"
+    _write(data_path, restaurants[:10])
+
+    prepared = []
+
+    def prepare(snap):
+        assert manager.current is not snap
+        prepared.append(snap)
+
+    manager = IndexManager(data_path=lambda: data_path, index_dir=lambda: None, prepare=prepare)
+    manager.ensure_ready()
+    added = dict(restaurants[30], id="added")
+    edited = manager.edit(lambda snap: IndexSnapshot(*upsert_restaurant(snap.index, snap.restaurants, added), previous=snap))
+    assert prepared[-1] is edited and manager.current is edited
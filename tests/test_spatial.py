@@ -0,0 +1,62 @@
+import numpy as np
+from fastapi.testclient import TestClient
+
+from server.app import app
+from server.indexing.spatial import GridIndex
+from server.scoring import haversine_miles
+
+
+def test_grid_within_matches_brute_force():
+    rng = np.random.default_rng(0)
+    lat = 33.64 + rng.normal(0, 0.05, size=500)
+    lng = -117.84 + rng.normal(0, 0.05, size=500)
+    lat[::17] = np.nan  # rows without coordinates are never returned
+    grid = GridIndex(lat, lng)
+
+    for radius in (0.1, 0.5, 1.5, 5.0):
+        rows, miles = grid.within(33.65, -117.83, radius)
+        expected = [
+            i for i in range(500)
+            if not np.isnan(lat[i]) and haversine_miles(33.65, -117.83, lat[i], lng[i]) <= radius
+        ]
+        assert rows.tolist() == expected
+        assert np.all(miles <= radius)
+
+
+def test_appended_rows_are_found_like_built_ones():
+    rng = np.random.default_rng(1)
+    lat = 33.64 + rng.normal(0, 0.05, size=600)
+    lng = -117.84 + rng.normal(0, 0.05, size=600)
+    lat[::13] = np.nan
+    grid = GridIndex(lat[:500], lng[:500]).appended(lat[:550], lng[:550], 500).appended(lat, lng, 550)
+
+    assert len(grid) == len(GridIndex(lat, lng))
+    for radius in (0.1, 0.5, 1.5, 500.0):
+        rows, miles = grid.within(33.65, -117.83, radius)
+        expected_rows, expected_miles = GridIndex(lat, lng).within(33.65, -117.83, radius)
+        assert rows.tolist() == expected_rows.tolist()
+        assert np.allclose(miles, expected_miles)
+
+
+def test_recommend_radius_and_user_location():
+    client = TestClient(app)
+
+    r = client.post("/recommend", json={"query": "food", "top_k": 50, "max_distance_miles": 0.5})
+    assert r.status_code == 200
+    for item in r.json():
+        assert haversine_miles(33.6405, -117.8443, item["lat"], item["lng"]) <= 0.5
+
+    # far away from every restaurant: nothing within a mile
+    r = client.post(
+        "/recommend",
+        json={"top_k": 5, "user_location": {"lat": 40.0, "lng": -74.0}, "max_distance_miles": 1},
+    )
+    assert r.status_code == 200
+    assert r.json() == []
+
+    r = client.post("/recommend", json={"top_k": 5, "user_location": {"lat": 40.0, "lng": -74.0}})
+    assert r.status_code == 200
+    assert all(item["score_components"]["distance"] == 0.0 for item in r.json())
+
+    r = client.post("/recommend", json={"top_k": 5, "max_distance_miles": 0})
+    assert r.status_code == 422
@@ -0,0 +1,132 @@
+import pytest
+from fastapi.testclient import TestClient
+
+import server.app as appmod
+from benchmarks.synthetic import generate_restaurants
+from server.indexing.incremental import delete_restaurant, upsert_restaurant
+from server.indexing.index_store import fit_index_stream
+from server.indexing.snapshot import IndexSnapshot
+from server.indexing.suggest import SuggestIndex, normalize
+
+client = TestClient(appmod.app)
+
+
+def _suggest(restaurants):
+    index, catalog = fit_index_stream(restaurants)
+    return IndexSnapshot(index, catalog, version=1).suggest
+
+
+def _place(rid, name, reviews, cuisines, menu="salads, see menu"):
+    return {
+        "id": rid, "name": name, "rating": 4.0, "review_count": reviews, "price_level": 2,
+        "address": "1 Test Way, Irvine, CA", "lat": 33.6410, "lng": -117.8440,
+        "hours_text": "Mon–Sun 11am–10pm", "source": "manual",
+        "cuisines": cuisines, "categories": ["Restaurant"], "dietary_tags": [], "menu_text": menu,
+    }
+
+
+@pytest.fixture
+def restore_catalog():
+    yield
+    client.post("/refresh", params={"wait": True})
+
+
+def test_prefixes_rank_by_popularity():
+    index = _suggest([
+        _place("a", "Dumpling House", 900, ["Chinese"], "noodles, see menu"),
+        _place("b", "Dumpling Corner", 10, ["Chinese"], "noodles, see menu"),
+        _place("c", "Pizza Place", 50, ["Italian"], "pizza, see menu"),
+        _place("d", "Noodle Bar", 5, ["Chinese"], "noodles, see menu"),
+    ] + [_place(f"e{i}", f"Salad Stop {i}", 1, ["American"]) for i in range(3)])
+    texts = lambda prefix: [s["text"] for s in index.suggest(prefix)]
+
+    assert texts("dump") == ["Dumpling House", "Dumpling Corner"]
+    assert index.suggest("dump")[0] == {"text": "Dumpling House", "kind": "restaurant", "id": "a"}
+    # later words of a name match too; prefixes are normalized like the keys
+    assert texts("hou") == ["Dumpling House"]
+    assert texts("  DUMPLING-c") == ["Dumpling Corner"]
+    # a cuisine reaches several restaurants, so it beats each of them
+    assert texts("c")[0] == "chinese"
+    # terms need MIN_TERM_DOCS restaurants, and not most of them ("menu")
+    assert texts("no") == ["noodles", "Noodle Bar"]
+    assert "pizza" not in texts("piz") and texts("men") == []
+    assert texts("zzz") == [] and len(index.suggest("", 2)) == 2
+
+
+def test_answers_match_a_full_sort_of_the_matching_keys():
+    index = _suggest(list(generate_restaurants(2000, seed=3)))
+    for prefix in ["", "c", "ko", "kor", "golden g", "pizza", "campus house", "sal"]:
+        for limit in (1, 5, 20):
+            key = normalize(prefix)
+            ranked = sorted(
+                (-index.key_weights[k], k) for k in range(len(index.keys)) if index.keys[k].startswith(key)
+            )
+            expected = []
+            for _, k in ranked:
+                entry = int(index.key_entries[k])
+                if entry not in expected:
+                    expected.append(entry)
+            got = [(s["text"], s["kind"]) for s in index.suggest(prefix, limit)]
+            assert got == [(index.texts[i], index.kinds[i]) for i in expected[:limit]], (prefix, limit)
+
+
+def test_tombstoned_restaurants_are_not_suggested():
+    index, catalog = fit_index_stream([_place("a", "Gone Grill", 100, ["Thai"]), _place("b", "Kept Cafe", 1, ["Thai"])])
+    index.signals.live[0] = False
+    assert [s["text"] for s in SuggestIndex.build(
+        catalog, index.signals, IndexSnapshot(index, catalog, version=1).facets, index.tf_matrix,
+        index.vectorizer.vocabulary,
+    ).suggest("g")] == []
+
+
+def test_edits_update_the_index_without_rebuilding_it(monkeypatch):
+    index, catalog = fit_index_stream([
+        _place("a", "Gone Grill", 100, ["Thai"]),
+        _place("b", "Twin Diner", 5, ["Diner"]),
+        _place("c", "Twin Diner", 500, ["Diner"]),
+        _place("d", "Kept Cafe", 1, ["Thai"]),
+    ])
+    snap = IndexSnapshot(index, catalog, version=1)
+    snap.suggest
+
+    def rebuilt(*args, **kwargs):
+        raise AssertionError("an edit rebuilt the suggest index")
+
+    monkeypatch.setattr(SuggestIndex, "build", rebuilt)
+
+    def edited(index_and_catalog):
+        return IndexSnapshot(*index_and_catalog, source="edit", previous=snap)
+
+    suggested = lambda prefix: [(s["text"], s.get("id")) for s in snap.suggest.suggest(prefix)]
+    snap = edited(delete_restaurant(snap.index, snap.restaurants, "a"))
+    assert suggested("gone") == [] and suggested("tha") == [("thai", None)]
+    # the name passes to the other restaurant carrying it
+    snap = edited(delete_restaurant(snap.index, snap.restaurants, "c"))
+    assert suggested("twin") == [("Twin Diner", "b")]
+    snap = edited(upsert_restaurant(snap.index, snap.restaurants, _place("e", "Zebra Noodle", 50, ["Ethiopian"])))
+    assert suggested("zeb") == suggested("noodle") == [("Zebra Noodle", "e")]
+    assert suggested("eth") == [("ethiopian", None)]
+    # a more popular restaurant of the same name takes it over
+    snap = edited(upsert_restaurant(snap.index, snap.restaurants, _place("f", "Twin Diner", 900, ["Diner"])))
+    assert suggested("twin") == [("Twin Diner", "f")]
+    snap = edited(delete_restaurant(snap.index, snap.restaurants, "f"))
+    assert suggested("twin") == [("Twin Diner", "b")]
+    # the last Thai place goes, and the cuisine with it
+    snap = edited(delete_restaurant(snap.index, snap.restaurants, "d"))
+    assert suggested("tha") == [] and suggested("kept") == []
+    assert len(snap.suggest) == len([s for s in snap.suggest.suggest("", 20)])
+
+
+def test_suggest_endpoint_follows_catalog_edits(restore_catalog):
+    response = client.get("/suggest", params={"q": "in-n", "limit": 3})
+    assert response.status_code == 200
+    assert response.json()[0]["id"] == "in_n_out_burger"
+    assert client.get("/suggest", params={"q": "x", "limit": 0}).status_code == 422
+
+    place = _place("suggest_test_place", "Zanzibar Test Kitchen", 10, ["Fusion"])
+    assert client.put(f"/restaurants/{place['id']}", json=place).status_code == 200
+    assert client.get("/suggest", params={"q": "zanz"}).json() == [
+        {"text": "Zanzibar Test Kitchen", "kind": "restaurant", "id": "suggest_test_place"}
+    ]
+    assert client.delete(f"/restaurants/{place['id']}").status_code == 200
+    assert client.get("/suggest", params={"q": "zanz"}).json() == []
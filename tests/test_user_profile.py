@@ -0,0 +1,87 @@
+import threading
+
+import server.user_profile as user_profile
+from server.user_profile import ProfileStore, UserProfile
+
+
+def test_counts_follow_capped_history():
+    profile = UserProfile(max_history=3)
+    for rid, cuisines in [("a", ["Thai"]), ("b", ["Mexican"]), ("c", ["thai", "Vegan"]), ("d", ["Mexican"])]:
+        profile.record_click(rid, cuisines)
+
+    assert list(profile.click_history) == ["b", "c", "d"]
+    assert profile.cuisine_click_counts() == {"mexican": 2, "thai": 1, "vegan": 1}
+
+
+def test_versions_never_repeat_after_eviction():
+    store = ProfileStore(max_profiles=1, shards=1)
+    first = store.record_click("u1", "a", ["thai"]).version
+    store.get_or_create("u2")  # evicts u1
+    assert "u1" not in store and store.evictions == 1
+    assert store.get_or_create("u1").version != first
+
+
+def test_lru_eviction_keeps_recent_users():
+    store = ProfileStore(max_profiles=2, shards=1)
+    store.get_or_create("u1")
+    store.get_or_create("u2")
+    store.get("u1")  # u2 is now least recently used
+    store.get_or_create("u3")
+    assert "u1" in store and "u3" in store and "u2" not in store
+
+
+def test_evicted_users_come_back_from_the_spill(monkeypatch):
+    monkeypatch.setattr(user_profile, "SPILL_COMPACT_MIN_BYTES", 0)  # compact on every reload
+    store = ProfileStore(max_profiles=1, shards=1)
+    store.record_click("u1", "a", ["Thai"])
+    store.record_click("u2", "b", ["Mexican"])  # spills u1
+    store.record_click("u1", "c", ["Thai"])  # reloads u1, spills u2
+    assert store.stats()["spilled"] == 1 and store.evictions == 2
+    assert list(store.get("u2").click_history) == ["b"]
+    assert list(store.get("u1").click_history) == ["a", "c"]
+    assert store.get("u1").cuisine_click_counts() == {"thai": 2}
+
+
+def test_save_includes_spilled_users(tmp_path):
+    store = ProfileStore(max_profiles=1, shards=1)
+    store.record_click("u1", "a", ["Thai"])
+    store.record_click("u2", "b", [])
+    profiles = store.export()
+    store.record_click("u3", "c", [])  # spills u2 after the export
+    path = tmp_path / "profiles.json"
+    assert store.save(path, profiles=profiles) == 2
+
+    restored = ProfileStore()
+    assert restored.load(path) == 2
+    assert list(restored.get("u1").click_history) == ["a"]
+    assert list(restored.get("u2").click_history) == ["b"]
+
+
+def test_concurrent_clicks_are_all_counted():
+    store = ProfileStore(max_profiles=8, shards=4)
+
+    def click(t):
+        for n in range(500):
+            store.record_click(f"u{t}-{n % 10}", "a", [])
+
+    threads = [threading.Thread(target=click, args=(t,)) for t in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert store._dirty == 8 * 500
+    assert len(store) + store.stats()["spilled"] == 80
+
+
+def test_save_and_load_round_trip(tmp_path):
+    store = ProfileStore()
+    store.record_click("u1", "a", ["Thai"])
+    store.record_click("u1", "b", ["Mexican", "Thai"])
+    store.record_click("u2", "c", [])
+    path = tmp_path / "profiles.json"
+    assert store.save(path) == 2
+
+    restored = ProfileStore()
+    assert restored.load(path) == 2
+    assert list(restored.get("u1").click_history) == ["a", "b"]
+    assert restored.get("u1").cuisine_click_counts() == {"thai": 2, "mexican": 1}